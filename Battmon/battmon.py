@@ -16,10 +16,21 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
-# local imports
-from values import help_and_values_parser
-from monitor import battery_monitor
+import sys
 
 if __name__ == '__main__':
-    bt = battery_monitor.Monitor(**vars(help_and_values_parser.args))
-    bt.run_main_loop()
+    # subcommands have own arguments, monitor arguments are parsed as soon as parser module is imported
+    if sys.argv[1:2] == ['stats']:
+        # local imports
+        from values import history_stats
+        history_stats.main(sys.argv[2:])
+    elif sys.argv[1:2] == ['status']:
+        # local imports
+        from monitor import status_server
+        status_server.main(sys.argv[2:])
+    else:
+        # local imports
+        from values import help_and_values_parser
+        from monitor import battery_monitor
+        bt = battery_monitor.Monitor(**vars(help_and_values_parser.args))
+        bt.run_main_loop()
@@ -0,0 +1,2 @@
+__author__ = 'nictki'
+__email__ = 'nictki@gmail.com'
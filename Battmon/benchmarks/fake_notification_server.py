@@ -0,0 +1,168 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Fake session bus with notification server, to see Battmon notifications without desktop or real bus.
+# It answers Hello and org.freedesktop.Notifications.Notify, prints every notification and whether it
+# replaced previous one. Run from Battmon directory:
+#
+#   python -m benchmarks.fake_notification_server /tmp/fake-bus
+#   DBUS_SESSION_BUS_ADDRESS=unix:path=/tmp/fake-bus ./battmon.py -f -d -pp /tmp/power_supply
+
+import argparse
+import os
+import socket
+import threading
+
+# local imports
+from notifications import dbus_message, notifier
+
+GUID = b'0123456789abcdef0123456789abcdef'
+
+
+# notification received by fake server
+class Notification(object):
+    __slots__ = ('id', 'replaced', 'app_name', 'summary', 'body', 'timeout')
+
+    def __init__(self, notification_id, replaced, app_name, summary, body, timeout):
+        self.id = notification_id
+        self.replaced = replaced
+        self.app_name = app_name
+        self.summary = summary
+        self.body = body
+        self.timeout = timeout
+
+    def __repr__(self):
+        return '#%s%s %s: %r %r (%s ms)' % (self.id, ' (replaced)' if self.replaced else '', self.app_name,
+                                            self.summary, self.body, self.timeout)
+
+
+# bus listening on Unix socket, every client in its own thread
+class FakeNotificationServer(object):
+    def __init__(self, path, verbose=False):
+        self.__path = path
+        self.__verbose = verbose
+        self.__lock = threading.Lock()
+        self.__last_id = 0
+        self.__clients = 0
+        self.notifications = []
+        if os.path.exists(path):
+            os.remove(path)
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__socket.bind(path)
+        self.__socket.listen(8)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def serve_forever(self):
+        while True:
+            try:
+                client, address = self.__socket.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self.__serve_client, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    # answer authentication lines until BEGIN, read byte by byte, so first message stays in socket
+    def __authenticate(self, client):
+        line = b''
+        while True:
+            byte = client.recv(1)
+            if not byte:
+                return False
+            line += byte
+            if not line.endswith(b'\r\n'):
+                continue
+            command = line.lstrip(b'\0')
+            line = b''
+            if command.startswith(b'BEGIN'):
+                return True
+            if command.startswith(b'AUTH'):
+                client.sendall(b'OK ' + GUID + b'\r\n')
+            else:
+                client.sendall(b'ERROR\r\n')
+
+    def __serve_client(self, client):
+        with self.__lock:
+            self.__clients += 1
+            name = ':1.%d' % self.__clients
+        serial = 0
+        try:
+            if not self.__authenticate(client):
+                return
+            while True:
+                message = dbus_message.read_message(client)
+                serial += 1
+                for reply in self.__handle(message, name, serial):
+                    client.sendall(reply.encode())
+        except (socket.error, dbus_message.DBusError):
+            pass
+        finally:
+            client.close()
+
+    # replies to method call, Hello is followed by NameAcquired signal like on real bus
+    def __handle(self, message, name, serial):
+        member = message.fields.get(dbus_message.MEMBER)
+        reply_fields = {dbus_message.REPLY_SERIAL: message.serial, dbus_message.DESTINATION: name}
+        if member == 'Hello':
+            reply_fields[dbus_message.SIGNATURE] = 's'
+            signal_fields = {dbus_message.PATH: '/org/freedesktop/DBus',
+                             dbus_message.INTERFACE: 'org.freedesktop.DBus', dbus_message.MEMBER: 'NameAcquired',
+                             dbus_message.DESTINATION: name, dbus_message.SIGNATURE: 's'}
+            return [dbus_message.Message(dbus_message.METHOD_RETURN, serial, reply_fields, (name,)),
+                    dbus_message.Message(dbus_message.SIGNAL, serial + 1000000, signal_fields, (name,))]
+        if member == 'Notify' and message.fields.get(dbus_message.SIGNATURE) == notifier.NOTIFY_SIGNATURE:
+            app_name, replaces_id, icon, summary, body, actions, hints, timeout = message.body
+            with self.__lock:
+                replaced = 0 < replaces_id <= self.__last_id
+                if not replaced:
+                    self.__last_id += 1
+                notification = Notification(replaces_id if replaced else self.__last_id, replaced, app_name, summary,
+                                            body, timeout)
+                self.notifications.append(notification)
+            if self.__verbose:
+                print(notification)
+            reply_fields[dbus_message.SIGNATURE] = 'u'
+            return [dbus_message.Message(dbus_message.METHOD_RETURN, serial, reply_fields, (notification.id,))]
+        reply_fields[dbus_message.ERROR_NAME] = 'org.freedesktop.DBus.Error.UnknownMethod'
+        reply_fields[dbus_message.SIGNATURE] = 's'
+        return [dbus_message.Message(dbus_message.ERROR, serial, reply_fields, ('unknown method %s' % member,))]
+
+    def close(self):
+        self.__socket.close()
+        os.remove(self.__path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="fake session bus printing Battmon notifications")
+    ap.add_argument("path", help="socket path, use DBUS_SESSION_BUS_ADDRESS=unix:path=<path> for Battmon")
+    args = ap.parse_args()
+
+    server = FakeNotificationServer(args.path, verbose=True)
+    print("Listening on unix:path=%s" % args.path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
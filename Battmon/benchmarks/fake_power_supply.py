@@ -0,0 +1,113 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Build synthetic /sys/class/power_supply trees, to run Battmon without real hardware.
+# Run from Battmon directory:
+#
+#   python -m benchmarks.fake_power_supply /tmp/power_supply -b 2 -u charge -m power_now
+#   ./battmon.py -f -d -pp /tmp/power_supply
+
+import argparse
+import os
+
+# values of every fake battery when full
+ENERGY_FULL = 50000000
+VOLTAGE = 11400000
+CHARGE_FULL = ENERGY_FULL * 1000000 // VOLTAGE
+POWER = 10000000
+
+# supported battery units
+UNITS = ('energy', 'charge')
+
+
+# write device attributes as separate files and all of them together as 'uevent'
+def write_device(path, values):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    uevent = ['POWER_SUPPLY_NAME=%s' % os.path.basename(path)]
+    for name in sorted(values):
+        # write in place, so open attribute files see new values like in sysfs
+        with open(os.path.join(path, name), 'w') as attribute:
+            attribute.write('%s\n' % values[name])
+        uevent.append('POWER_SUPPLY_%s=%s' % (name.upper(), values[name]))
+    with open(os.path.join(path, 'uevent'), 'w') as attribute:
+        attribute.write('\n'.join(uevent) + '\n')
+
+
+# attributes of battery with given capacity in percent and power draw in uW
+def battery_values(units='energy', capacity=80, power=POWER, status='Discharging', missing=()):
+    values = {'type': 'Battery',
+              'present': 1,
+              'status': status,
+              'capacity': capacity,
+              'voltage_now': VOLTAGE,
+              'voltage_min_design': VOLTAGE}
+    if units == 'energy':
+        values.update({'energy_now': ENERGY_FULL * capacity // 100,
+                       'energy_full': ENERGY_FULL,
+                       'energy_full_design': ENERGY_FULL,
+                       'power_now': power})
+    else:
+        values.update({'charge_now': CHARGE_FULL * capacity // 100,
+                       'charge_full': CHARGE_FULL,
+                       'charge_full_design': CHARGE_FULL,
+                       'current_now': power * 1000000 // VOLTAGE})
+    for name in missing:
+        values.pop(name, None)
+    return values
+
+
+# create tree with ac-adapter, batteries BAT0..BATn and peripheral batteries, return battery names
+def create_tree(root, batteries=1, units='energy', missing=(), ac_online=False, peripherals=0):
+    write_device(os.path.join(root, 'AC'), {'type': 'Mains', 'online': int(ac_online)})
+    names = []
+    for i in range(batteries):
+        names.append('BAT%d' % i)
+        write_device(os.path.join(root, names[-1]),
+                     battery_values(units, status='Charging' if ac_online else 'Discharging', missing=missing))
+    for i in range(peripherals):
+        write_device(os.path.join(root, 'hid-battery%d' % i),
+                     {'type': 'Battery', 'scope': 'Device', 'present': 1, 'status': 'Discharging', 'capacity': 70})
+    return names
+
+
+# change values of existing battery
+def update_battery(root, name, units='energy', capacity=80, power=POWER, status='Discharging', missing=()):
+    write_device(os.path.join(root, name), battery_values(units, capacity, power, status, missing))
+
+
+# plug or unplug ac-adapter
+def set_ac_online(root, online):
+    write_device(os.path.join(root, 'AC'), {'type': 'Mains', 'online': int(online)})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="create fake power supply tree for Battmon")
+    ap.add_argument("root", help="directory for power supply devices")
+    ap.add_argument("-b", "--batteries", type=int, default=1, help="number of batteries")
+    ap.add_argument("-u", "--units", choices=UNITS, default='energy', help="battery units")
+    ap.add_argument("-m", "--missing", nargs="*", default=[], metavar="<ATTRIBUTE>",
+                    help="battery attributes which should be left out")
+    ap.add_argument("-a", "--ac-online", action="store_true", help="ac-adapter is plugged")
+    ap.add_argument("-p", "--peripherals", type=int, default=0, help="number of peripheral batteries")
+    args = ap.parse_args()
+
+    names = create_tree(args.root, args.batteries, args.units, args.missing, args.ac_online, args.peripherals)
+    print("created %s in %s" % (', '.join(names + ['AC']), args.root))
+
+
+if __name__ == '__main__':
+    main()
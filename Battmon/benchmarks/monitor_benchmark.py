@@ -0,0 +1,303 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Benchmark what Battmon itself costs in every run mode. Every configuration runs Monitor in its own process
+# against fake power supply tree, while battery follows scripted discharge curve: 30% -> 20% on battery,
+# ac plugged and charging back to 30%, ac unplugged and 30% -> 20% again. For every configuration
+# CPU time, context switches, RSS and spawned commands of the monitor process are measured, together with
+# how long it took to notice low level and ac changes. Run from Battmon directory:
+#
+#   python -m benchmarks.monitor_benchmark [-s 10] [-c default -c poll-30s] [-o report.json]
+#
+# Speed 1 runs the curve in real time (20 minutes per configuration), speed 10 in 2 minutes.
+# Power reported by fake battery follows the accelerated curve, so adaptive polling sees real rate.
+
+import argparse
+import json
+import os
+import platform
+import re
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# local imports
+from benchmarks import fake_power_supply
+from monitor import power_supply_events
+from values import internal_config, read_battery_values
+
+# name: (min poll interval, poll interval, ac changes are send as events, asyncio runtime)
+CONFIGS = [('poll-1s', 1, 1, False, False),
+           ('poll-5s', 5, 5, False, False),
+           ('poll-30s', 30, 30, False, False),
+           ('events-poll-30s', 30, 30, True, False),
+           ('default', internal_config.DEFAULT_MIN_POLL_INTERVAL, internal_config.DEFAULT_POLL_INTERVAL, True, False),
+           ('default-asyncio', internal_config.DEFAULT_MIN_POLL_INTERVAL, internal_config.DEFAULT_POLL_INTERVAL,
+            True, True)]
+
+# discharge curve in seconds of simulated time: (start, end, capacity at start, capacity at end, ac online)
+CURVE = [(0, 600, 30.0, 20.0, False),
+         (600, 900, 20.0, 30.0, True),
+         (900, 1200, 30.0, 20.0, False)]
+LOW_LEVEL = 23
+
+# how often fake battery is updated in real seconds
+UPDATE_INTERVAL = 0.1
+# state changes printed by monitor in debug mode
+STATE_CHANGE = re.compile(r'DEBUG: Battery state (\S+) -> (\S+)')
+SPAWN = 'BENCHMARK: spawn'
+
+
+# power supply events written to fifo by benchmark, one 'action name' per line
+class FifoEventSource(object):
+    def __init__(self, path):
+        # opened for writing too, so it doesn't see end of file when benchmark isn't writing
+        self.__fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+    def fileno(self):
+        return self.__fd
+
+    def wait(self, timeout):
+        if not select.select([self.__fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.__fd, 4096).decode('ascii')
+        return [power_supply_events.PowerSupplyEvent(*line.split()) for line in data.splitlines() if line]
+
+    def close(self):
+        os.close(self.__fd)
+
+
+# run monitor in this process, called in child process started by benchmark
+def run_child(config):
+    # local imports
+    from monitor import battery_monitor
+
+    # count spawned commands, process manager runs all of them
+    subprocess_popen = subprocess.Popen
+
+    def popen(*args, **kwargs):
+        print(SPAWN)
+        return subprocess_popen(*args, **kwargs)
+    subprocess.Popen = popen
+
+    monitor = battery_monitor.Monitor(debug=True, test=True, foreground=True, more_then_one_instance=True,
+                                      lock_command='true', disable_notifications=False, critical=False,
+                                      sound_file=internal_config.DEFAULT_SOUND_FILE_PATH, play_sound=True,
+                                      sound_volume=3, timeout=6, battery_update_timeout=1,
+                                      battery_low_value=LOW_LEVEL, battery_critical_value=7, battery_minimal_value=3,
+                                      minimal_battery_level_command='hibernate', set_no_battery_remainder=0,
+                                      disable_startup_notifications=True, power_supply_path=config['path'],
+                                      history_records=0, poll_interval=config['poll_interval'],
+                                      min_poll_interval=config['min_poll_interval'],
+                                      asyncio_runtime=config['asyncio'], status_socket=config['path'] + '.sock',
+                                      event_source=FifoEventSource(config['fifo']))
+    monitor.run_main_loop()
+
+
+# capacity, power in uW and ac state at given simulated second
+def curve_at(sim_time, speed):
+    for start, end, capacity_start, capacity_end, ac_online in CURVE:
+        if start <= sim_time < end or end == CURVE[-1][1]:
+            progress = min(1.0, (sim_time - start) / float(end - start))
+            capacity = capacity_start + (capacity_end - capacity_start) * progress
+            # energy change per real hour
+            power = abs(capacity_end - capacity_start) / 100.0 * fake_power_supply.ENERGY_FULL / (end - start) \
+                * 3600 * speed
+            return capacity, int(power), ac_online
+
+
+def write_battery(path, capacity, power, ac_online):
+    values = fake_power_supply.battery_values('energy', int(capacity), power,
+                                              'Charging' if ac_online else 'Discharging')
+    values['energy_now'] = int(fake_power_supply.ENERGY_FULL * capacity / 100)
+    fake_power_supply.write_device(os.path.join(path, 'BAT0'), values)
+
+
+# cpu time, context switches and memory of process from /proc, per thread values are summed up over all
+# threads, e.g. executor threads of asyncio runtime
+def process_counters(pid):
+    with open('/proc/%d/stat' % pid) as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    counters = {'utime': int(fields[11]), 'stime': int(fields[12]), 'cpu_ns': 0,
+                'voluntary_ctxt_switches': 0, 'nonvoluntary_ctxt_switches': 0}
+    with open('/proc/%d/status' % pid) as status:
+        for line in status:
+            name, value = line.split(':', 1)
+            if name in ('VmRSS', 'VmHWM'):
+                counters[name] = int(value.split()[0])
+    for task in os.listdir('/proc/%d/task' % pid):
+        # nanoseconds on cpu, much finer than user and system time in clock ticks
+        with open('/proc/%d/task/%s/schedstat' % (pid, task)) as schedstat:
+            counters['cpu_ns'] += int(schedstat.read().split()[0])
+        with open('/proc/%d/task/%s/status' % (pid, task)) as status:
+            for line in status:
+                name, value = line.split(':', 1)
+                if name in ('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches'):
+                    counters[name] += int(value.split()[0])
+    return counters
+
+
+# read monitor output with time of every line
+def collect_output(stream, lines):
+    for line in iter(stream.readline, ''):
+        lines.append((read_battery_values.monotonic(), line.rstrip('\n')))
+
+
+# first state change to given state after given time, seconds from that time
+def latency(lines, since, state):
+    for line_time, line in lines:
+        match = STATE_CHANGE.search(line)
+        if line_time >= since and match and match.group(2) == state:
+            return line_time - since
+    return None
+
+
+# run one configuration, return its measurements
+def run_config(config, speed, workdir):
+    name, min_poll_interval, poll_interval, events, asyncio_runtime = config
+    path = os.path.join(workdir, name)
+    fifo = os.path.join(workdir, name + '.events')
+    fake_power_supply.create_tree(path, 1)
+    capacity, power, ac_online = curve_at(0, speed)
+    write_battery(path, capacity, power, ac_online)
+    os.mkfifo(fifo)
+    events_fd = os.open(fifo, os.O_RDWR | os.O_NONBLOCK)
+
+    child_config = {'path': path, 'fifo': fifo, 'poll_interval': poll_interval,
+                    'min_poll_interval': min_poll_interval, 'asyncio': asyncio_runtime}
+    start = read_battery_values.monotonic()
+    child = subprocess.Popen([sys.executable, '-u', '-m', 'benchmarks.monitor_benchmark', '--child',
+                              json.dumps(child_config)], cwd=internal_config.PROGRAM_PATH,
+                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    lines = []
+    reader = threading.Thread(target=collect_output, args=(child.stdout, lines))
+    reader.daemon = True
+    reader.start()
+
+    try:
+        # startup ends with first battery state
+        while not any(STATE_CHANGE.search(line) for line_time, line in lines):
+            if child.poll() is not None or read_battery_values.monotonic() - start > 60:
+                raise RuntimeError("monitor didn't start:\n%s" % '\n'.join(line for t, line in lines))
+            time.sleep(0.01)
+        startup = read_battery_values.monotonic() - start
+        spawns_before = sum(1 for t, line in lines if line == SPAWN)
+        before = process_counters(child.pid)
+
+        # play discharge curve, remember when monitor should notice low level and ac changes
+        expected = []
+        scenario_start = read_battery_values.monotonic()
+        duration = CURVE[-1][1] / float(speed)
+        low = False
+        while True:
+            now = read_battery_values.monotonic()
+            if now - scenario_start >= duration:
+                break
+            capacity, power, online = curve_at((now - scenario_start) * speed, speed)
+            write_battery(path, capacity, power, online)
+            if online != ac_online:
+                fake_power_supply.set_ac_online(path, online)
+                expected.append(('ac_plug' if online else 'ac_unplug', now, 'CHARGING' if online else 'DISCHARGING_OK'))
+                if events:
+                    os.write(events_fd, b'change AC\n')
+                ac_online = online
+                low = False
+            if not online and not low and int(capacity) <= LOW_LEVEL:
+                expected.append(('low', now, 'LOW'))
+                low = True
+            time.sleep(UPDATE_INTERVAL)
+
+        after = process_counters(child.pid)
+        spawns = sum(1 for t, line in lines if line == SPAWN) - spawns_before
+    finally:
+        child.terminate()
+        child.wait()
+        os.close(events_fd)
+
+    ticks = float(os.sysconf('SC_CLK_TCK'))
+    return {'config': name,
+            'min_poll_interval': min_poll_interval,
+            'poll_interval': poll_interval,
+            'events': events,
+            'asyncio': asyncio_runtime,
+            'scenario_seconds': duration,
+            'startup_seconds': startup,
+            'cpu_seconds': (after['cpu_ns'] - before['cpu_ns']) / 1e9,
+            'cpu_user_seconds': (after['utime'] - before['utime']) / ticks,
+            'cpu_system_seconds': (after['stime'] - before['stime']) / ticks,
+            'voluntary_context_switches': after['voluntary_ctxt_switches'] - before['voluntary_ctxt_switches'],
+            'involuntary_context_switches': (after['nonvoluntary_ctxt_switches'] -
+                                             before['nonvoluntary_ctxt_switches']),
+            'rss_kb': after['VmRSS'],
+            'max_rss_kb': after['VmHWM'],
+            'spawned_commands': spawns,
+            'detection_latency_seconds': [{'change': change, 'latency': latency(lines, since, state)}
+                                          for change, since, state in expected]}
+
+
+def print_results(results):
+    print("%-18s %8s %8s %10s %8s %7s %s" % ('config', 'cpu ms', 'vol cs', 'invol cs', 'rss kB', 'spawns',
+                                             'detection latency s'))
+    for r in results:
+        latencies = ', '.join('%s %s' % (d['change'], '-' if d['latency'] is None else '%.2f' % d['latency'])
+                              for d in r['detection_latency_seconds'])
+        print("%-18s %8.1f %8s %10s %8s %7s %s" % (r['config'], r['cpu_seconds'] * 1000,
+                                                   r['voluntary_context_switches'],
+                                                   r['involuntary_context_switches'], r['max_rss_kb'],
+                                                   r['spawned_commands'], latencies))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="benchmark Battmon monitor overhead in every run mode")
+    ap.add_argument("-s", "--speed", type=float, default=10, help="how many times faster battery discharges")
+    ap.add_argument("-c", "--config", action="append", choices=[c[0] for c in CONFIGS],
+                    help="run only given configurations")
+    ap.add_argument("-o", "--output", metavar="<PATH>", help="write json report to this file")
+    ap.add_argument("-j", "--json", action="store_true", help="print json report instead of table")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='battmon-monitor-')
+    try:
+        results = [run_config(config, args.speed, workdir) for config in CONFIGS
+                   if not args.config or config[0] in args.config]
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {'version': internal_config.VERSION,
+              'python': platform.python_version(),
+              'speed': args.speed,
+              'curve': CURVE,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == '__main__':
+    main()
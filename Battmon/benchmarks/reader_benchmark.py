@@ -0,0 +1,220 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Benchmark BatteryValues.snapshot(), the hottest path of Battmon, with every sysfs reader:
+# samples per second, syscalls per sample and bytes allocated per sample.
+# Run from Battmon directory, against real devices or against generated fake trees:
+#
+#   python -m benchmarks.reader_benchmark [-p /sys/class/power_supply] [-n 10000]
+#   python -m benchmarks.reader_benchmark --fake [--json]
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# local imports
+from benchmarks import fake_power_supply
+from values import read_battery_values, sysfs_reader
+
+# fake trees used with --fake: (name, batteries, units, missing attributes, peripherals)
+FAKE_TREES = [('1 battery, energy', 1, 'energy', (), 0),
+              ('1 battery, charge', 1, 'charge', (), 0),
+              ('1 battery, no power_now', 1, 'energy', ('power_now',), 0),
+              ('1 battery, capacity only', 1, 'energy', ('energy_now', 'energy_full', 'power_now'), 0),
+              ('2 batteries, energy', 2, 'energy', (), 0),
+              ('8 batteries, charge', 8, 'charge', (), 0),
+              ('1 battery, 16 peripherals', 1, 'energy', (), 16),
+              ('64 batteries, energy', 64, 'energy', (), 0)]
+
+
+# reader which opens, reads and closes every attribute, like Battmon did before, only for comparison
+class OpenReadReader(object):
+    def read_device(self, device_path, names):
+        values = {}
+        for name in names:
+            try:
+                with open(device_path + name) as value:
+                    values[name] = value.read().strip()
+            except IOError:
+                values[name] = ''
+        return values
+
+    def read(self, path):
+        with open(path) as value:
+            return value.read().strip()
+
+    def attributes(self, device_path):
+        return set(os.listdir(device_path))
+
+    def close(self):
+        pass
+
+
+sysfs_reader.READERS['open/read/close'] = OpenReadReader
+
+
+# count open and close calls made through python, reads are counted by kernel
+class OpenCloseCounter(object):
+    def __init__(self):
+        self.opens = 0
+        self.closes = 0
+        self.__os_open = os.open
+        self.__os_close = os.close
+        self.__open = builtins.open
+
+    def __os_open_counted(self, *args, **kwargs):
+        self.opens += 1
+        return self.__os_open(*args, **kwargs)
+
+    def __os_close_counted(self, *args, **kwargs):
+        self.closes += 1
+        return self.__os_close(*args, **kwargs)
+
+    # file object opened by open() is closed by 'with' block, so count both
+    def __open_counted(self, *args, **kwargs):
+        self.opens += 1
+        self.closes += 1
+        return self.__open(*args, **kwargs)
+
+    def __enter__(self):
+        os.open = self.__os_open_counted
+        os.close = self.__os_close_counted
+        builtins.open = self.__open_counted
+        return self
+
+    def __exit__(self, *exc_info):
+        os.open = self.__os_open
+        os.close = self.__os_close
+        builtins.open = self.__open
+
+
+# number of read syscalls made by this process so far
+def read_syscalls():
+    with open('/proc/self/io') as io:
+        for line in io:
+            if line.startswith('syscr:'):
+                return int(line.split()[1])
+    return 0
+
+
+# bytes allocated while taking one sample, None when tracemalloc isn't available
+def allocated_bytes(battery_values):
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        return None
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        battery_values.snapshot()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+# measure snapshots taken with one reader
+def measure(power_supply_path, reader, samples):
+    # devices are searched only once, like between two hotplug events
+    battery_values = read_battery_values.BatteryValues(0, reader, power_supply_path)
+    # warm up, so persistent readers have their files already open
+    battery_values.snapshot()
+
+    seconds = timeit.timeit(battery_values.snapshot, number=samples)
+
+    # reading /proc/self/io costs read syscalls too
+    io_overhead = read_syscalls()
+    io_overhead = read_syscalls() - io_overhead
+    reads = read_syscalls()
+    with OpenCloseCounter() as counter:
+        for i in range(samples):
+            battery_values.snapshot()
+    reads = read_syscalls() - reads - io_overhead
+
+    return {'reader': reader,
+            'samples_per_second': samples / seconds,
+            'usec_per_sample': seconds * 1e6 / samples,
+            'opens_per_sample': float(counter.opens) / samples,
+            'reads_per_sample': float(reads) / samples,
+            'closes_per_sample': float(counter.closes) / samples,
+            'syscalls_per_sample': float(counter.opens + reads + counter.closes) / samples,
+            'allocated_bytes_per_sample': allocated_bytes(battery_values)}
+
+
+# measure every reader on one tree
+def measure_tree(name, power_supply_path, samples):
+    results = []
+    for reader in sorted(sysfs_reader.READERS):
+        result = measure(power_supply_path, reader, samples)
+        result['tree'] = name
+        results.append(result)
+    return results
+
+
+def print_results(results):
+    print("%-28s %-16s %12s %10s %10s %12s" % ('tree', 'reader', 'samples/s', 'us/sample', 'syscalls',
+                                               'alloc bytes'))
+    for r in results:
+        allocated = r['allocated_bytes_per_sample']
+        print("%-28s %-16s %12.0f %10.2f %10.2f %12s" % (r['tree'], r['reader'], r['samples_per_second'],
+                                                         r['usec_per_sample'], r['syscalls_per_sample'],
+                                                         '-' if allocated is None else allocated))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="benchmark sysfs readers used by Battmon")
+    ap.add_argument("-p", "--power-supply-path", default="/sys/class/power_supply",
+                    help="directory with power supply devices")
+    ap.add_argument("-f", "--fake", action="store_true", help="benchmark generated fake trees instead")
+    ap.add_argument("-n", "--samples", type=int, default=10000, help="number of samples per reader")
+    ap.add_argument("-j", "--json", action="store_true", help="print results as json")
+    args = ap.parse_args()
+
+    results = []
+    if args.fake:
+        for name, batteries, units, missing, peripherals in FAKE_TREES:
+            root = tempfile.mkdtemp(prefix='battmon-power-supply-')
+            try:
+                fake_power_supply.create_tree(root, batteries, units, missing, peripherals=peripherals)
+                results += measure_tree(name, root, args.samples)
+            finally:
+                shutil.rmtree(root)
+    else:
+        if not read_battery_values.BatteryValues(0, power_supply_path=args.power_supply_path).battery_names():
+            print("No battery found in %s" % args.power_supply_path)
+            sys.exit(1)
+        results = measure_tree(args.power_supply_path, args.power_supply_path, args.samples)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Benchmark Battmon startup, as it's started from .xinitrc at every login. Every run starts new python process,
+# which imports Battmon and creates Monitor against fake power supply tree, then exits before main loop.
+# Cold runs start without program cache, so every program is searched, warm runs reuse cache written by
+# previous run. Files stay in page cache in both, dropping it needs root. Run from Battmon directory:
+#
+#   python -m benchmarks.startup_benchmark [-r 10] [--json]
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# local imports
+from benchmarks import fake_power_supply
+from values import internal_config, read_battery_values
+
+MODES = ('cold', 'warm')
+
+
+# create monitor in this process, called in child process started by benchmark
+def run_child(config):
+    # count file checks and spawned commands
+    counters = {'stat_calls': 0, 'spawns': 0}
+    os_stat = os.stat
+    subprocess_popen = subprocess.Popen
+
+    def stat(*args, **kwargs):
+        counters['stat_calls'] += 1
+        return os_stat(*args, **kwargs)
+
+    def popen(*args, **kwargs):
+        counters['spawns'] += 1
+        return subprocess_popen(*args, **kwargs)
+    os.stat = stat
+    subprocess.Popen = popen
+
+    start = read_battery_values.monotonic()
+    # local imports
+    from monitor import battery_monitor
+    imported = read_battery_values.monotonic()
+    battery_monitor.Monitor(debug=False, test=True, foreground=True, more_then_one_instance=True,
+                            lock_command='', disable_notifications=False, critical=False,
+                            sound_file=internal_config.DEFAULT_SOUND_FILE_PATH, play_sound=True, sound_volume=3,
+                            timeout=6, battery_update_timeout=1, battery_low_value=23, battery_critical_value=7,
+                            battery_minimal_value=3, minimal_battery_level_command='hibernate',
+                            set_no_battery_remainder=0, disable_startup_notifications=True,
+                            power_supply_path=config['path'], history_records=0, status_socket='')
+    created = read_battery_values.monotonic()
+    counters.update({'imports_ms': (imported - start) * 1000, 'init_ms': (created - imported) * 1000})
+    print(json.dumps(counters))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+# run one startup, wall time of the whole process together with counters reported by it
+def run_once(path, cache_path):
+    env = dict(os.environ, XDG_CACHE_HOME=os.path.dirname(os.path.dirname(cache_path)))
+    start = read_battery_values.monotonic()
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.startup_benchmark', '--child',
+                                      json.dumps({'path': path})], cwd=internal_config.PROGRAM_PATH, env=env)
+    wall = (read_battery_values.monotonic() - start) * 1000
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    result['wall_ms'] = wall
+    return result
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure(mode, path, cache_path, repeats):
+    runs = []
+    if mode == 'warm':
+        run_once(path, cache_path)
+    for i in range(repeats):
+        if mode == 'cold' and os.path.exists(cache_path):
+            os.remove(cache_path)
+        runs.append(run_once(path, cache_path))
+    return dict((name, median([run[name] for run in runs])) for name in runs[0])
+
+
+def print_results(results):
+    print("%-6s %9s %11s %9s %11s %7s" % ('mode', 'wall ms', 'imports ms', 'init ms', 'stat calls', 'spawns'))
+    for mode in MODES:
+        r = results[mode]
+        print("%-6s %9.1f %11.1f %9.1f %11d %7d" % (mode, r['wall_ms'], r['imports_ms'], r['init_ms'],
+                                                    r['stat_calls'], r['spawns']))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="benchmark Battmon startup with cold and warm program cache")
+    ap.add_argument("-r", "--repeats", type=int, default=10, help="median of this number of runs")
+    ap.add_argument("--json", action="store_true", help="print results as json")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='battmon-startup-')
+    try:
+        path = os.path.join(workdir, 'power_supply')
+        fake_power_supply.create_tree(path)
+        cache_path = os.path.join(workdir, 'cache', 'battmon', 'programs.json')
+        results = dict((mode, measure(mode, path, cache_path, args.repeats)) for mode in MODES)
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Benchmark 'battmon stats' on generated history of 1 Hz samples: 3 hours on battery, 90 minutes charging,
+# battery wears out by 1% a month. Run from Battmon directory:
+#
+#   python -m benchmarks.stats_benchmark [-d 90] [-k history-file] [--json]
+
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+# local imports
+from benchmarks import fake_power_supply
+from values import history_stats, sample_history
+
+DISCHARGE_TIME = 3 * 60 * 60
+CHARGE_TIME = 90 * 60
+POWER = 8000000
+START_TIME = 1700000000.0
+
+
+# write history file of given days of 1 Hz samples, with numpy it takes seconds instead of minutes
+def create_history(path, days):
+    count = days * history_stats.DAY
+    history = sample_history.SampleHistory(path, count)
+    history.close()
+
+    numpy = history_stats.numpy
+    if numpy is None:
+        raise SystemExit("Error: numpy is needed to generate history")
+    t = numpy.arange(count, dtype=numpy.float64)
+    cycle = DISCHARGE_TIME + CHARGE_TIME
+    phase = t % cycle
+    discharging = phase < DISCHARGE_TIME
+    energy_full = (fake_power_supply.ENERGY_FULL * (1 - 0.01 * t / (30 * history_stats.DAY))).astype(numpy.int64)
+    used = numpy.where(discharging, phase / DISCHARGE_TIME, 1 - (phase - DISCHARGE_TIME) / CHARGE_TIME) * 0.9
+    # power draw varies every minute and jumps up every 10 minutes
+    power = POWER + (t % 60) * 20000 + numpy.where(t % 600 < 30, 3 * POWER, 0)
+
+    records = numpy.zeros(count, dtype=history_stats.record_dtype())
+    records['time'] = START_TIME + t
+    records['energy_now'] = (energy_full * (1 - used)).astype(numpy.int64)
+    records['energy_full'] = energy_full
+    records['energy_full_design'] = fake_power_supply.ENERGY_FULL
+    records['power_now'] = power.astype(numpy.int64)
+    records['cycle_count'] = (t // cycle).astype(numpy.uint16)
+    records['status'] = numpy.where(discharging, history_stats.DISCHARGING, sample_history.STATUS_CODES['Charging'])
+    records['ac_online'] = ~discharging
+
+    with open(path, 'r+b') as history_file:
+        header = sample_history.HEADER.pack(sample_history.MAGIC, sample_history.VERSION,
+                                            sample_history.RECORD.size, count, 0, count)
+        history_file.write(header)
+        history_file.seek(sample_history.HEADER_SIZE)
+        history_file.write(records.tobytes())
+
+
+# seconds to load and compute statistics, best of given repeats
+def measure(path, use_numpy, repeats):
+    def run():
+        columns = history_stats.load_columns(sample_history.load_buffers(path), use_numpy)
+        return history_stats.history_stats(columns, use_numpy)
+    return min(timeit.repeat(run, number=1, repeat=repeats))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="benchmark battery history statistics")
+    ap.add_argument("-d", "--days", type=int, default=90, help="days of 1 Hz samples")
+    ap.add_argument("-r", "--repeats", type=int, default=3, help="best of this number of runs")
+    ap.add_argument("-k", "--keep", metavar="<PATH>", help="write history to this file and keep it")
+    ap.add_argument("--arrays", action="store_true", help="measure also loading without numpy, which is slow")
+    ap.add_argument("--json", action="store_true", help="print results as json")
+    args = ap.parse_args()
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(prefix='battmon-history-'), 'history')
+    try:
+        create_history(path, args.days)
+        results = {'days': args.days,
+                   'samples': args.days * history_stats.DAY,
+                   'file_size': os.path.getsize(path),
+                   'numpy_seconds': measure(path, True, args.repeats)}
+        if args.arrays:
+            results['arrays_seconds'] = measure(path, False, 1)
+    finally:
+        if not args.keep:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("%(days)s days, %(samples)s samples, %(file_size)s bytes" % results)
+        print("numpy:  %.3f s" % results['numpy_seconds'])
+        if 'arrays_seconds' in results:
+            print("arrays: %.3f s" % results['arrays_seconds'])
+
+
+if __name__ == '__main__':
+    main()
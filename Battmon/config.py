@@ -11,6 +11,34 @@ SCREEN_LOCK_COMMAND = 'xlock -lockdelay 0'
 # how oft update battery values in seconds
 BATTERY_UPDATE_INTERVAL = 6
 
+# longest and shortest time between battery checks in seconds, battery is checked more often
+# when it comes closer to low, critical or minimal level, ac plug and battery changes wake Battmon up anyway,
+# when kernel uevents aren't available, battery is checked every second
+POLL_INTERVAL = internal_config.DEFAULT_POLL_INTERVAL
+MIN_POLL_INTERVAL = internal_config.DEFAULT_MIN_POLL_INTERVAL
+
+# run battery checks, notifications and minimal level countdown as asyncio tasks, needs python 3
+ASYNCIO_RUNTIME = False
+
+# how oft search for new power supply devices in seconds, 0 means only on SIGHUP or when device is gone
+DEVICE_DISCOVERY_TTL = internal_config.DEFAULT_DEVICE_DISCOVERY_TTL
+
+# how read battery values: 'attribute' reads every value from its own file, 'uevent' reads all at once
+SYSFS_READER = internal_config.DEFAULT_SYSFS_READER
+
+# file with battery samples kept between restarts and how many samples it holds, 48 bytes each, 0 disables it
+HISTORY_PATH = internal_config.DEFAULT_HISTORY_PATH
+HISTORY_RECORDS = internal_config.DEFAULT_HISTORY_RECORDS
+
+# socket serving battery status to status bars and 'battmon status', empty disables it
+STATUS_SOCKET_PATH = internal_config.DEFAULT_STATUS_SOCKET_PATH
+
+# write battery block of tiling wm bar to this path, '-' is stdout, empty disables it,
+# format fields are the same as 'battmon status' ones, protocol is 'plain' or 'i3bar' (also swaybar)
+BAR_OUTPUT = ''
+BAR_FORMAT = internal_config.DEFAULT_BAR_FORMAT
+BAR_PROTOCOL = internal_config.DEFAULT_BAR_PROTOCOL
+
 # battery low, critical and minimal values in percent
 BATTERY_LOW_LEVEL_VALUE = 23
 BATTERY_CRITICAL_LEVEL_VALUE = 7
@@ -0,0 +1,174 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import asyncio
+
+# local imports
+from values import read_battery_values
+from monitor import state_machine
+
+
+# battery sampling, 'no battery' remainder and minimal level countdown as tasks on one event loop, notifications
+# are queued to notification worker and countdown commands run in executor, so slow one never delays noticing
+# plugged ac
+class AsyncRuntime(object):
+    def __init__(self, battery_values, event_source, handle_events, battery_state_machine, next_interval, notify,
+                 countdown_steps, no_battery_remainder, sample_interval, on_wakeup, publish, debug):
+        self.__battery_values = battery_values
+        self.__event_source = event_source
+        self.__handle_events = handle_events
+        self.__state_machine = battery_state_machine
+        self.__next_interval = next_interval
+        self.__notify = notify
+        self.__countdown_steps = countdown_steps
+        self.__no_battery_remainder = no_battery_remainder
+        self.__sample_interval = sample_interval
+        self.__on_wakeup = on_wakeup
+        self.__publish = publish
+        self.__debug = debug
+
+        self.__loop = None
+        self.__wakeup = None
+        self.__countdown = None
+        self.__remainder = None
+
+        # when and why sampling task was woken up last time, to measure countdown abort latency
+        self.__woken = 0.0
+        self.__woken_by = ''
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.__main(loop))
+        finally:
+            loop.close()
+
+    async def __main(self, loop):
+        self.__loop = loop
+        self.__wakeup = asyncio.Event()
+
+        # polling event source has nothing to watch, sampling task wakes up only after poll interval
+        fileno = getattr(self.__event_source, 'fileno', None)
+        if fileno is not None:
+            loop.add_reader(fileno(), self.__read_events)
+        try:
+            await self.__sample()
+        finally:
+            if fileno is not None:
+                loop.remove_reader(fileno())
+            for task in (self.__countdown, self.__remainder):
+                if task is not None:
+                    task.cancel()
+
+    # event source is readable, wake up sampling task
+    def __read_events(self):
+        events = self.__event_source.wait(0)
+        if events and not self.__wakeup.is_set():
+            self.__woken = read_battery_values.monotonic()
+            self.__woken_by = 'power supply event'
+        self.__handle_events(events)
+        if events:
+            self.__wakeup.set()
+
+    # wait for power supply event or timeout in seconds
+    async def __wait(self, timeout):
+        self.__wakeup.clear()
+        try:
+            await asyncio.wait_for(self.__wakeup.wait(), timeout)
+            self.__on_wakeup(True)
+        except asyncio.TimeoutError:
+            self.__woken = read_battery_values.monotonic()
+            self.__woken_by = 'battery check'
+            self.__on_wakeup(False)
+
+    # stop task if it's still running
+    def __cancel(self, task, name):
+        if task is not None and not task.done():
+            if self.__debug:
+                print("DEBUG: Cancelled %s" % name)
+            task.cancel()
+
+    # read battery, queue notifications and start or stop countdown and remainder on state changes
+    async def __sample(self):
+        state = None
+        while True:
+            battery = self.__battery_values.snapshot()
+            new_state, actions = self.__state_machine.transition(state, battery)
+            if self.__debug and new_state != state:
+                print("DEBUG: Battery state %s -> %s" % (state, new_state))
+            state = new_state
+            self.__publish(state, battery)
+
+            for action in actions:
+                if action != state_machine.COUNTDOWN_ACTION:
+                    self.__notify(action, battery)
+            # countdown starts on entering minimal level and again when it's over and battery stays there
+            if state != state_machine.COUNTDOWN_STATE:
+                self.__cancel(self.__countdown, 'minimal level countdown')
+            elif self.__countdown is None or self.__countdown.done():
+                self.__countdown = self.__loop.create_task(self.__minimal_level_countdown())
+
+            # send 'no battery' notification again after remainder time
+            if state == state_machine.NO_BATTERY and battery.ac_online and self.__no_battery_remainder > 0:
+                if 'no_battery' in actions or self.__remainder is None or self.__remainder.done():
+                    self.__cancel(self.__remainder, "'no battery' remainder")
+                    self.__remainder = self.__loop.create_task(self.__no_battery_remainder_loop())
+            else:
+                self.__cancel(self.__remainder, "'no battery' remainder")
+
+            await self.__wait(self.__next_interval(battery))
+
+    async def __no_battery_remainder_loop(self):
+        while True:
+            await asyncio.sleep(self.__no_battery_remainder)
+            self.__notify('no_battery', self.__battery_values.snapshot())
+
+    # countdown stopped, print how long it took since ac plugged was noticed
+    def __print_abort_latency(self, woken, woken_by):
+        if self.__debug:
+            print("DEBUG: Minimal level countdown aborted %.3f ms after %s"
+                  % ((read_battery_values.monotonic() - woken) * 1000, woken_by))
+
+    # wait given seconds, check battery at least every sample interval, None when battery stops discharging
+    async def __countdown_wait(self, seconds):
+        deadline = read_battery_values.monotonic() + seconds
+        woken = read_battery_values.monotonic()
+        woken_by = 'countdown timer'
+        while True:
+            battery = self.__battery_values.snapshot()
+            if self.__state_machine.classify(battery) != state_machine.MINIMAL:
+                self.__print_abort_latency(woken, woken_by)
+                return None
+            now = read_battery_values.monotonic()
+            if now >= deadline:
+                return battery
+            await asyncio.sleep(min(deadline - now, self.__sample_interval))
+            woken = read_battery_values.monotonic()
+            woken_by = 'battery check'
+
+    # run countdown steps, sampling task cancels it as soon as ac gets plugged
+    async def __minimal_level_countdown(self):
+        try:
+            for delay, step in self.__countdown_steps():
+                battery = await self.__countdown_wait(delay)
+                if battery is None:
+                    break
+                if step is not None:
+                    await self.__loop.run_in_executor(None, step, battery)
+        except asyncio.CancelledError:
+            self.__print_abort_latency(self.__woken, self.__woken_by)
+            raise
@@ -16,13 +16,16 @@ Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
 from ctypes import cdll, c_char_p
 import os
-import subprocess
+import shlex
+import signal
+import socket
 import sys
-import time
 
 # local imports
-from values import read_battery_values, internal_config
-from notifications import battery_notifications
+from values import read_battery_values, internal_config, instrumentation, program_paths, sample_history
+from monitor import instance_guard, poll_scheduler, power_supply_events, process_manager, state_machine, \
+    status_bar, status_server
+from notifications import battery_notifications, dispatcher, notifier, sound_engine
 
 
 # set name for this program, thus works 'killall Battmon'
@@ -35,23 +38,16 @@ def set_proc_name(name):
         libc.prctl(15, name, 0, 0, 0)
 
 
-# check if given program is running
-def check_if_running(name):
-    output = str(subprocess.check_output(['ps', '-A']))
-    # check if process is running
-    if name in output:
-        return True
-    else:
-        return False
-
-
 # main class
 class Monitor(object):
     def __init__(self, debug=None, test=None, foreground=None, more_then_one_instance=None, lock_command=None,
                  disable_notifications=None, critical=None, sound_file=None, play_sound=None, sound_volume=None,
                  timeout=None, battery_update_timeout=None, battery_low_value=None, battery_critical_value=None,
                  battery_minimal_value=None, minimal_battery_level_command=None, set_no_battery_remainder=None,
-                 disable_startup_notifications=None):
+                 disable_startup_notifications=None, device_discovery_ttl=None, sysfs_reader=None,
+                 power_supply_path=None, history_path=None, history_records=None, poll_interval=None,
+                 min_poll_interval=None, asyncio_runtime=None, stats=None, status_socket=None, bar_output=None,
+                 bar_format=None, bar_protocol=None, event_source=None):
 
         # parameters
         self.__debug = debug
@@ -66,6 +62,20 @@ class Monitor(object):
         self.__sound_volume = sound_volume
         self.__timeout = timeout * 1000
         self.__battery_update_timeout = battery_update_timeout
+        self.__device_discovery_ttl = device_discovery_ttl
+        self.__sysfs_reader = sysfs_reader
+        self.__power_supply_path = power_supply_path
+        self.__history_path = history_path
+        self.__history_records = history_records
+        self.__poll_interval = poll_interval
+        self.__min_poll_interval = min_poll_interval
+        self.__event_source = event_source
+        self.__asyncio_runtime = asyncio_runtime
+        self.__stats = stats
+        self.__status_socket = status_socket
+        self.__bar_output_path = bar_output
+        self.__bar_format = bar_format
+        self.__bar_protocol = bar_protocol
         self.__battery_low_value = battery_low_value
         self.__battery_critical_value = battery_critical_value
         self.__battery_minimal_value = battery_minimal_value
@@ -73,28 +83,97 @@ class Monitor(object):
         self.__set_no_battery_remainder = set_no_battery_remainder
         self.__disable_startup_notifications = disable_startup_notifications
 
-        # external programs
+        # external programs, searched once and cached until their directories change
+        self.__programs = program_paths.ProgramPaths()
         self.__current_program_path = ''
         self.__found_notify_send_command = ''
+        self.__notifier = None
         self.__sound_player = ''
-        self.__sound_command = ''
+        self.__sound_command = None
+        self.__sound_engine = None
+        # sound commands of (volume, sound file), built once
+        self.__sound_commands = {}
 
         # minimal battery command in short for notifying . eg 'HIBERNATE'
         self.__short_minimal_battery_command = ''
 
-        # initialize BatteryValues class instance
-        self.__battery_values = read_battery_values.BatteryValues()
-
-        # check if we can send notifications via notify-send
+        # battery block for tiling wm bar, bar starts Battmon and reads its stdout, so it stays in foreground, runs
+        # as its own instance instead of handing over to running Battmon and prints everything else to stderr
+        self.__bar_output = None
+        if self.__bar_output_path:
+            if self.__bar_format is None:
+                self.__bar_format = internal_config.DEFAULT_BAR_FORMAT
+            if self.__bar_protocol is None:
+                self.__bar_protocol = internal_config.DEFAULT_BAR_PROTOCOL
+            self.__bar_output = status_bar.BarOutput(self.__bar_output_path, self.__bar_format, self.__bar_protocol)
+            if self.__bar_output_path == '-':
+                self.__foreground = True
+
+        # count sysfs reads, spawned commands and wakeups only when asked, otherwise nothing is wrapped
+        self.__instrumentation = None
+        if self.__stats:
+            self.__instrumentation = instrumentation.Instrumentation()
+
+        # every command is run by process manager, which reaps it and kills it after timeout
+        self.__processes = process_manager.ProcessManager(instrumentation=self.__instrumentation, debug=self.__debug)
+
+        # BatteryValues arguments, it's created after check if Battmon is already running
+        if self.__device_discovery_ttl is None:
+            self.__device_discovery_ttl = internal_config.DEFAULT_DEVICE_DISCOVERY_TTL
+        if self.__sysfs_reader is None:
+            self.__sysfs_reader = internal_config.DEFAULT_SYSFS_READER
+        if self.__power_supply_path is None:
+            self.__power_supply_path = internal_config.POWER_SUPPLY_PATH
+
+        # wake up on kernel power supply events, poll every second regardless of -pi and -mi only when they aren't
+        # available
+        if self.__event_source is None:
+            self.__event_source = power_supply_events.create_event_source()
+        if self.__poll_interval is None:
+            self.__poll_interval = internal_config.DEFAULT_POLL_INTERVAL
+        if self.__min_poll_interval is None:
+            self.__min_poll_interval = internal_config.DEFAULT_MIN_POLL_INTERVAL
+        if isinstance(self.__event_source, power_supply_events.PollingEventSource):
+            self.__poll_interval = internal_config.POLLING_FALLBACK_INTERVAL
+        self.__min_poll_interval = min(self.__min_poll_interval, self.__poll_interval)
+
+        # battery state and actions on its changes
+        self.__state_machine = state_machine.BatteryStateMachine(self.__battery_low_value,
+                                                                 self.__battery_critical_value,
+                                                                 self.__battery_minimal_value)
+
+        # check battery more often, when it comes closer to low, critical or minimal level
+        self.__poll_scheduler = poll_scheduler.PollScheduler((self.__battery_low_value, self.__battery_critical_value,
+                                                              self.__battery_minimal_value),
+                                                             self.__min_poll_interval, self.__poll_interval)
+
+        # check if we can send notifications over session bus or via notify-send
         self.__check_notify_send()
         # check play command and if file sounds are in PATH's
         self.__check_play()
         self.__set_sound_file_and_volume()
+        self.__load_sounds()
 
-        # check if program already running otherwise set name
-        if not self.__more_then_one_instance:
+        # check if program already running otherwise set name, running one gets arguments of this one. Battmon
+        # in foreground, e.g. bar reading its stdout or debug session, isn't handed over to running one, which
+        # writes to its own stdout, it runs as its own instance
+        self.__instance_guard = None
+        if not (self.__more_then_one_instance or self.__foreground or self.__debug):
             self.__check_if_battmon_already_running()
 
+        # history file is locked by running Battmon, so it's opened only when this one keeps running
+        if self.__history_path is None:
+            self.__history_path = internal_config.DEFAULT_HISTORY_PATH
+        if self.__history_records is None:
+            self.__history_records = internal_config.DEFAULT_HISTORY_RECORDS
+        self.__history = sample_history.open_history(self.__history_path, self.__history_records)
+        self.__battery_values = read_battery_values.BatteryValues(self.__device_discovery_ttl, self.__sysfs_reader,
+                                                                  self.__power_supply_path, self.__history,
+                                                                  self.__instrumentation)
+
+        # search for battery and ac-adapter again on SIGHUP, e.g. send from udev rule on hotplug
+        signal.signal(signal.SIGHUP, self.__devices_changed)
+
         # set Battmon process name
         set_proc_name(internal_config.PROGRAM_NAME)
 
@@ -112,18 +191,41 @@ class Monitor(object):
         # set lock and min battery command
         self.__set_lock_command()
         self.__set_minimal_battery_level_command()
+        self.__programs.save()
 
         # initialize notification
         self.notification = battery_notifications.BatteryNotifications(self.__disable_notifications,
-                                                                       self.__found_notify_send_command,
+                                                                       self.__notifier,
                                                                        self.__show_only_critical, self.__play_sound,
-                                                                       self.__sound_command, self.__timeout)
+                                                                       self.__play, self.__timeout)
+        # notifications are sent by worker thread, bursts of them are coalesced and rate limited
+        self.__dispatcher = dispatcher.NotificationDispatcher(self.__send_notification,
+                                                              critical=battery_notifications.CRITICAL_ACTIONS,
+                                                              category=battery_notifications.notification_category,
+                                                              debug=self.__debug)
 
         # fork in background
         if not self.__foreground:
             if os.fork() != 0:
                 sys.exit(0)
 
+        # serve battery status to status bars, its thread is started after fork, so it runs in daemon
+        if self.__status_socket is None:
+            self.__status_socket = internal_config.DEFAULT_STATUS_SOCKET_PATH
+        self.__status_server = status_server.open_status_server(self.__status_socket)
+
+        # Battmon started later hands its arguments over to this one
+        if self.__instance_guard is not None:
+            self.__instance_guard.start(self.__restart)
+
+        # print counters on SIGUSR1, once everything they're taken from is set up
+        if self.__instrumentation is not None:
+            signal.signal(signal.SIGUSR1, self.__print_stats)
+
+        # remove status socket and write history back on SIGTERM and Ctrl-C, so no stale socket is left
+        signal.signal(signal.SIGTERM, self.__terminate)
+        signal.signal(signal.SIGINT, self.__terminate)
+
         # debug
         if self.__debug:
             print("\n**********************")
@@ -131,7 +233,29 @@ class Monitor(object):
             print("**********************\n")
             self.__print_debug_info()
 
-        self.__SOUND_VOLUME = self.__sound_volume
+    # power supply devices were added or removed
+    def __devices_changed(self, signum, frame):
+        if self.__debug:
+            print("DEBUG: Got signal %s, searching for battery and ac-adapter again" % signum)
+        self.__battery_values.invalidate_devices()
+
+    # clean up and exit on termination signal
+    def __terminate(self, signum, frame):
+        if self.__debug:
+            print("DEBUG: Got signal %s, exiting" % signum)
+        if self.__status_server is not None:
+            self.__status_server.close()
+            self.__status_server = None
+        if self.__history is not None:
+            self.__history.flush()
+        sys.exit(0)
+
+    # print what Battmon itself costs
+    def __print_stats(self, signum=None, frame=None):
+        print("STATS: %s" % self.__instrumentation.summary())
+        print("STATS: %s" % self.__dispatcher.summary())
+        print("STATS: %s" % self.__processes.summary())
+        sys.stdout.flush()
 
     def __print_debug_info(self):
         print("- Battmon version: %s" % internal_config.VERSION)
@@ -146,9 +270,27 @@ class Monitor(object):
         print("- play sounds: %s" % self.__play_sound)
         print("- sound file path: '%s'" % self.__sound_file)
         print("- sound volume level: %s" % self.__sound_volume)
-        print("- sound command: '%s'" % self.__sound_command)
+        print("- sound command: '%s'" % (' '.join(self.__sound_command) if self.__sound_command else 'Not found'))
+        print("- in process sound engine: %s" % (self.__sound_engine is not None))
+        print("- program paths: %s from cache, %s searched" % (self.__programs.cache_hits, self.__programs.searches))
         print("- notification timeout: %ssec" % int(self.__timeout / 1000))
         print("- battery update timeout: %ssec" % self.__battery_update_timeout)
+        print("- device discovery ttl: %ssec" % self.__device_discovery_ttl)
+        print("- sysfs reader: '%s'" % self.__sysfs_reader)
+        print("- power supply path: '%s'" % self.__power_supply_path)
+        print("- history: '%s', %s records%s" % (self.__history_path, self.__history_records,
+                                                 '' if self.__history is not None else ', disabled'))
+        print("- event source: %s" % type(self.__event_source).__name__)
+        polling = isinstance(self.__event_source, power_supply_events.PollingEventSource)
+        print("- poll interval: %s-%ssec%s" % (self.__min_poll_interval, self.__poll_interval,
+                                               ', without uevents -pi and -mi are ignored' if polling else ''))
+        print("- asyncio runtime: %s" % self.__asyncio_runtime)
+        print("- stats: %s" % self.__stats)
+        print("- bar output: '%s', %s '%s'" % (self.__bar_output_path or 'disabled', self.__bar_protocol,
+                                               self.__bar_format))
+        print("- status socket: '%s'%s" % (self.__status_socket,
+                                           '' if self.__status_server is not None else ', disabled'))
+        print("- batteries: %s" % (', '.join(self.__battery_values.battery_names()) or 'not found'))
         print("- battery low level value: %s%%" % self.__battery_low_value)
         print("- battery critical level value: %s%%" % self.__battery_critical_value)
         print("- battery hibernate level value: %s%%" % self.__battery_minimal_value)
@@ -157,81 +299,120 @@ class Monitor(object):
         print("- disable startup notifications: %s\n" % self.__disable_startup_notifications)
 
     # check if in path
-    def __check_in_path(self, program_name, path=internal_config.EXTRA_PROGRAMS_PATH):
-        try:
-            for p in path:
-                if os.path.isfile(p + program_name):
-                    self.__current_program_path = (p + program_name)
-                    return True
-            else:
-                return False
-        except OSError as ose:
-            print("Error: " + str(ose))
+    def __check_in_path(self, program_name):
+        program_path = self.__programs.find(program_name)
+        if program_path is None:
+            return False
+        self.__current_program_path = program_path
+        return True
 
-    # check if Battmon is already running
+    # check if Battmon is already running, send it arguments of this one, it restarts with them when they differ
     def __check_if_battmon_already_running(self):
-        if check_if_running(internal_config.PROGRAM_NAME):
-            if self.__play_sound:
-                os.popen(self.__sound_command)
+        guard = instance_guard.InstanceGuard()
+        try:
+            if guard.acquire():
+                self.__instance_guard = guard
+                return
+        except socket.error as se:
+            print("Error: can't check if Battmon is already running: %s" % se)
+            return
+        if instance_guard.send_arguments(sys.argv[1:], os.getcwd()) == instance_guard.RESTARTING:
             if self.__found_notify_send_command:
-                notify_send_string = '''notify-send "BATTMON IS ALREADY RUNNING" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-                sys.exit(1)
+                self.__notifier.notify("BATTMON RESTARTS", "with new arguments", self.__timeout)
             else:
-                print("BATTMON IS ALREADY RUNNING")
-                sys.exit(1)
+                print("BATTMON RESTARTS WITH NEW ARGUMENTS")
+            sys.exit(0)
+        if self.__play_sound:
+            self.__play()
+        if self.__found_notify_send_command:
+            self.__notifier.notify("BATTMON IS ALREADY RUNNING", "", self.__timeout)
+            sys.exit(1)
+        else:
+            print("BATTMON IS ALREADY RUNNING")
+            sys.exit(1)
 
-    # check for notify-send command
+    # other Battmon sent different arguments, called from instance guard thread
+    def __restart(self, argv, cwd):
+        if self.__debug:
+            print("DEBUG: Restarting with arguments: %s" % ' '.join(argv))
+        if self.__status_server is not None:
+            self.__status_server.close()
+        instance_guard.restart(argv, cwd)
+
+    # notifications over session bus, notify-send is used and looked for only when there's no bus
     def __check_notify_send(self):
-        if self.__check_in_path('notify-send'):
+        self.__notifier = notifier.create_notifier(lambda: self.__programs.find('notify-send'),
+                                                   self.__processes.spawn)
+        if self.__notifier is not None:
             self.__found_notify_send_command = True
         else:
             self.__found_notify_send_command = False
             print("DEPENDENCY MISSING:\nYou have to install libnotify to have notifications.")
 
-    # check if we have sound player
+    # check if we have sound player, paplay is used only with running pulseaudio server, when there's other one
     def __check_play(self):
         for i in internal_config.DEFAULT_PLAYER_COMMAND:
             if self.__check_in_path(i):
                 self.__sound_player = self.__current_program_path
+                if i != 'paplay' or sound_engine.pulse_server_running():
+                    break
 
         # if none ware found in path, send notification about it
         if self.__sound_player == '' and self.__found_notify_send_command:
-            self.__sound_command = "Not found"
+            self.__sound_command = None
             self.__play_sound = False
-            notify_send_string = '''notify-send "DEPENDENCY MISSING\n" \
-                                    "You have to install sox or pulseaudio to play sounds" %s %s''' \
-                                 % ('-t ' + str(30 * 1000), '-a ' + internal_config.PROGRAM_NAME)
-            os.popen(notify_send_string)
-        elif not self.__found_notify_send_command:
-            self.__sound_command = "Not found"
+            self.__notifier.notify("DEPENDENCY MISSING", "You have to install sox or pulseaudio to play sounds",
+                                   30 * 1000)
+        elif self.__sound_player == '':
+            self.__sound_command = None
             self.__play_sound = False
             print("DEPENDENCY MISSING:\n You have to install sox or pulseaudio to play sounds.\n")
 
+    # command playing sound file at given volume level
+    def __get_sound_command(self, volume, sound_file):
+        if self.__sound_player.find('paplay') > -1:
+            __pa_volume = volume * int(3855)
+            return [self.__sound_player, '--volume', str(__pa_volume), sound_file]
+        elif self.__sound_player.find('play') > -1:
+            return [self.__sound_player, '-V1', '-q', '-v%s' % volume, sound_file]
+        return None
+
     # check if sound files exist
     def __set_sound_file_and_volume(self):
         if os.path.exists(self.__sound_file):
-            if self.__sound_player.find('paplay') > -1 and os.popen('pidof pulseaudio'):
-                __pa_volume = self.__sound_volume * int(3855)
-                self.__sound_command = '%s --volume %s %s' % (self.__sound_player, __pa_volume, self.__sound_file)
-            elif self.__sound_player.find('play') > -1:
-                self.__sound_command = '%s -V1 -q -v%s %s' \
-                                       % (self.__sound_player, self.__sound_volume, self.__sound_file)
+            self.__sound_command = self.__get_sound_command(self.__sound_volume, self.__sound_file)
         else:
             if self.__found_notify_send_command:
                 # missing dependency notification will disappear after 30 seconds
                 message_string = ("Check if you have sound files exist:  \n %s\n"
                                   " If you've specified your own sound file path, "
                                   " please check if it was correctly") % self.__sound_file
-                notify_send_string = '''notify-send "DEPENDENCY MISSING\n" "%s" %s %s''' \
-                                     % (message_string, '-t ' + str(30 * 1000), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__notifier.notify("DEPENDENCY MISSING", message_string, 30 * 1000)
             if not self.__found_notify_send_command:
                 print("DEPENDENCY MISSING:\n Check if you have sound files in %s. \n"
                       "If you've specified your own sound file path, please check if it was correctly %s %s"
                       % self.__sound_file)
-            self.__sound_command = "Not found"
+            self.__sound_command = None
+
+    # decode sounds once, so beeps are written to running player instead of spawning sound command every time
+    def __load_sounds(self):
+        if self.__play_sound and self.__sound_command is not None:
+            sounds = [self.__sound_file]
+            if os.path.exists(internal_config.WARNING_SOUND_FILE_PATH):
+                sounds.append(internal_config.WARNING_SOUND_FILE_PATH)
+            self.__sound_engine = sound_engine.create_sound_engine(self.__sound_player, sounds, self.__processes)
+
+    # play sound file, given volume level or configured one, sound command is spawned only without sound engine
+    # or when its player can't play
+    def __play(self, volume=None, sound_file=None):
+        volume = self.__sound_volume if volume is None else volume
+        sound_file = self.__sound_file if sound_file is None else sound_file
+        if self.__sound_engine is not None and self.__sound_engine.play(sound_file, volume):
+            return
+        if (volume, sound_file) not in self.__sound_commands:
+            self.__sound_commands[(volume, sound_file)] = self.__get_sound_command(volume, sound_file)
+        if self.__sound_commands[(volume, sound_file)] is not None:
+            self.__processes.spawn(self.__sound_commands[(volume, sound_file)])
 
     # check for lock screen program
     def __set_lock_command(self):
@@ -244,11 +425,8 @@ class Monitor(object):
                 if self.__check_in_path(command):
                     self.__screenlock_command = command + ' ' + command_args
                     if self.__found_notify_send_command and not self.__disable_startup_notifications:
-                        notify_send_string = '''notify-send "Using '%s' to lock screen\n" "with args: %s" %s %s''' \
-                                             % (
-                                                 command, command_args, '-t ' + str(self.__timeout),
-                                                 '-a ' + internal_config.PROGRAM_NAME)
-                        os.popen(notify_send_string)
+                        self.__notifier.notify("Using '%s' to lock screen" % command, "with args: %s" % command_args,
+                                               self.__timeout)
                     elif not self.__disable_startup_notifications:
                         print("%s %s will be used to lock screen" % (command, command_args))
                     elif not self.__disable_startup_notifications and not self.__found_notify_send_command:
@@ -260,10 +438,7 @@ class Monitor(object):
                                       " you can specify your favorite screenlock\n"
                                       " program running battmon with -lp '[PATH] [ARGS]',\n"
                                       " otherwise your session won't be locked")
-                    notify_send_string = '''notify-send "DEPENDENCY MISSING\n" "%s" %s %s''' \
-                                         % (message_string, '-t ' + str(30 * 1000),
-                                            '-a ' + internal_config.PROGRAM_NAME)
-                    os.popen(notify_send_string)
+                    self.__notifier.notify("DEPENDENCY MISSING", message_string, 30 * 1000)
                 if not self.__found_notify_send_command:
                     print("DEPENDENCY MISSING:\n please check if you have installed any screenlock program, \
                             you can specify your favorite screen lock program \
@@ -274,10 +449,8 @@ class Monitor(object):
             command = lock_command_as_list[0]
             command_args = ' '.join(lock_command_as_list[1:len(lock_command_as_list)])
             if self.__found_notify_send_command and not self.__disable_startup_notifications:
-                notify_send_string = '''notify-send "Using '%s' to lock screen\n" "with args: %s" %s %s''' \
-                                     % (command, command_args, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__notifier.notify("Using '%s' to lock screen" % command, "with args: %s" % command_args,
+                                       self.__timeout)
             elif not self.__disable_startup_notifications:
                 print("%s %s will be used to lock screen" % (command, command_args))
             elif not self.__disable_startup_notifications and not self.__found_notify_send_command:
@@ -347,272 +520,228 @@ class Monitor(object):
                                   " or be sure that you can execute hibernate.sh and\n"
                                   " suspend.sh files in bin folder, \n"
                                   " otherwise your system will be SHUTDOWN on critical\n battery level")
-                notify_send_string = '''notify-send "MINIMAL BATTERY VALUE PROGRAM NOT FOUND\n" "%s" %s %s''' \
-                                     % (message_string, '-t ' + str(30 * 1000), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
+                self.__notifier.notify("MINIMAL BATTERY VALUE PROGRAM NOT FOUND", message_string, 30 * 1000)
             elif not self.__found_notify_send_command:
                 print('''MINIMAL BATTERY VALUE PROGRAM NOT FOUND\n
                       please check if you have installed pm-utils,\n
                       otherwise your system will be SHUTDOWN at critical battery level''')
 
         if self.__found_notify_send_command and not self.__disable_startup_notifications:
-            notify_send_string = '''notify-send "System will be: %s\n" "below minimal battery level" %s %s''' \
-                                 % (self.__short_minimal_battery_command, '-t ' + str(self.__timeout),
-                                    '-a ' + internal_config.PROGRAM_NAME)
-            os.popen(notify_send_string)
+            self.__notifier.notify("System will be: %s" % self.__short_minimal_battery_command,
+                                   "below minimal battery level", self.__timeout)
         elif not self.__disable_startup_notifications and not self.__found_notify_send_command:
             print("below minimal battery level system will be: %s" % self.__short_minimal_battery_command)
 
-    # check for battery update times
-    def __check_battery_update_times(self, name):
-        while self.__battery_values.battery_time() == 'Unknown':
+    # seconds notification waits in queue for time left, it's estimated from battery history, so notification
+    # waits only when there isn't any yet, minimal level one is sent at once, as countdown starts with it
+    def __time_left_delay(self, action, battery):
+        if action not in state_machine.TIME_LEFT_ACTIONS or action == 'minimal_battery_level':
+            return 0
+        if battery.battery_time() != 'Unknown':
+            return 0
+        if self.__debug:
+            print('''DEBUG: Battery value is '%s', '%s' notification is sent in %d sec'''
+                  % (str(battery.battery_time()), action, self.__battery_update_timeout))
+        return self.__battery_update_timeout
+
+    # fresh battery values for notification, which waited for time left, called from notification worker
+    def __check_battery_update_times(self, battery, name):
+        if battery.battery_time() != 'Unknown':
+            return battery
+        battery = self.__battery_values.snapshot()
+        if self.__debug and battery.battery_time() == 'Unknown':
+            print('''DEBUG: Battery value is still '%s', sending '%s' anyway''' % (str(battery.battery_time()), name))
+        return battery
+
+    # new battery state, serve it to status socket clients and write it to bar
+    def __publish(self, state, battery):
+        if self.__status_server is not None:
+            self.__status_server.publish(state, battery)
+        if self.__bar_output is not None:
+            self.__bar_output.publish(state, battery)
+
+    # time to next battery check
+    def __next_poll_interval(self, battery):
+        interval = self.__poll_scheduler.next_interval(battery)
+        if self.__debug:
+            print("DEBUG: Next battery check in %.1f sec" % interval)
+        return interval
+
+    # search for devices again when some were added or removed
+    def __handle_events(self, events):
+        for event in events:
             if self.__debug:
-                print('''DEBUG: Battery value is '%s', next check in %d sec'''
-                      % (str(self.__battery_values.battery_time()), self.__battery_update_timeout))
-            time.sleep(self.__battery_update_timeout)
-            if self.__battery_values.battery_time() == 'Unknown':
+                print("DEBUG: Power supply event: %s" % event)
+            if event.action in ('add', 'remove') or not event.name:
+                self.__battery_values.invalidate_devices()
+
+    # count wakeup, print summary of counters in debug mode from time to time
+    def __on_wakeup(self, by_event):
+        if self.__instrumentation is not None:
+            self.__instrumentation.wakeup(by_event)
+            if self.__debug and self.__instrumentation.report_due(internal_config.DEFAULT_STATS_INTERVAL):
+                self.__print_stats()
+
+    # wait for power supply event or poll interval
+    def __wait(self, timeout):
+        events = self.__event_source.wait(timeout)
+        self.__on_wakeup(bool(events))
+        self.__handle_events(events)
+        return events
+
+    # battery is below minimal level and discharging, any charger stops it, not only Mains ac
+    def __on_minimal_level(self, battery):
+        return battery.discharging and battery.capacity <= self.__battery_minimal_value
+
+    # beep louder then usual, warning sound when it's there
+    def __loud_sound(self, battery):
+        if self.__play_sound or not self.__test:
+            sound_file = internal_config.WARNING_SOUND_FILE_PATH
+            self.__play(internal_config.LOUD_SOUND_VOLUME,
+                        sound_file if os.path.exists(sound_file) else self.__sound_file)
+
+    def __sound(self, battery):
+        if self.__play_sound or not self.__test:
+            self.__play()
+
+    # last warning before system goes down
+    def __last_chance_notification(self, battery):
+        self.__play()
+        message_string = ("last chance to plug in AC cable...\n"
+                          " system will be %s in 10 seconds\n"
+                          " current capacity: %s%s\n"
+                          " time left: %s") % (self.__short_minimal_battery_command,
+                                               battery.capacity, '%', battery.battery_time())
+        if self.__notifier is not None:
+            self.__notifier.notify("!!! MINIMAL BATTERY LEVEL !!!", message_string, 10 * 1000,
+                                   battery_notifications.BATTERY_NOTIFICATION)
+
+    # lock screen and hibernate, they run until they exit and limit of running commands doesn't stop them
+    def __run_minimal_battery_level_command(self, battery):
+        if self.__screenlock_command:
+            self.__processes.spawn(shlex.split(self.__screenlock_command), None, True)
+        if self.__minimal_battery_level_command:
+            self.__processes.spawn(shlex.split(self.__minimal_battery_level_command), None, True)
+
+    def __test_minimal_battery_level_command(self, battery):
+        print("TEST: Hibernating... Program goes sleep for 10sek")
+
+    # minimal level countdown as (seconds to wait, step) pairs, countdown stops as soon as ac gets plugged while
+    # waiting, step None only waits
+    def __minimal_level_steps(self):
+        # the real thing, first warning, beep 5 times every two seconds, then last chance popup
+        if not self.__test:
+            return ([(2, self.__loud_sound)] * 5 +
+                    [(2, self.__last_chance_notification)] +
+                    [(15, self.__sound)] + [(5, self.__sound)] * 3 +
+                    [(1, self.__run_minimal_battery_level_command)])
+        # test block
+        else:
+            return ([(0, self.__loud_sound)] + [(2, self.__sound)] * 4 +
+                    [(2, self.__test_minimal_battery_level_command), (10, None)])
+
+    # wait given seconds during minimal level countdown, check battery on every power supply event and at least
+    # every min poll interval, return None as soon as ac gets plugged, otherwise fresh battery snapshot
+    def __countdown_wait(self, seconds):
+        deadline = read_battery_values.monotonic() + seconds
+        woken_by = 'countdown timer'
+        woken = read_battery_values.monotonic()
+        while True:
+            battery = self.__battery_values.snapshot()
+            now = read_battery_values.monotonic()
+            # ac plugged, then bye
+            if not self.__on_minimal_level(battery):
                 if self.__debug:
-                    print('''DEBUG: Battery value is still '%s', continuing anyway'''
-                          % str(self.__battery_values.battery_time()))
-                    print("DEBUG: Back to >>> %s <<<" % name)
+                    print("DEBUG: Minimal level countdown aborted %.3f ms after %s"
+                          % ((now - woken) * 1000, woken_by))
+                return None
+            if now >= deadline:
+                return battery
+            events = self.__wait(min(deadline - now, self.__min_poll_interval))
+            woken_by = 'power supply event' if events else 'battery check'
+            woken = read_battery_values.monotonic()
+
+    # lock screen and hibernate, suspend or shutdown, unless ac gets plugged before
+    def __minimal_level_command(self):
+        for delay, step in self.__minimal_level_steps():
+            battery = self.__countdown_wait(delay)
+            if battery is None:
                 break
-            else:
-                print("DEBUG: Back to >>> %s <<<" % name)
+            if step is not None:
+                step(battery)
+
+    # queue notification for action returned by state machine
+    def __notify(self, action, battery):
+        self.__dispatcher.submit(action, battery, self.__time_left_delay(action, battery))
+
+    # send notification, called from notification worker
+    def __send_notification(self, action, battery):
+        if action in state_machine.TIME_LEFT_ACTIONS:
+            battery = self.__check_battery_update_times(battery, action)
+        if action == 'minimal_battery_level':
+            self.notification.minimal_battery_level(battery.capacity, battery.battery_time(),
+                                                    self.__short_minimal_battery_command, (10 * 1000))
+        elif action in state_machine.TIME_LEFT_ACTIONS:
+            getattr(self.notification, action)(battery.capacity, battery.battery_time())
+        else:
+            getattr(self.notification, action)()
+
+    # run action returned by state machine
+    def __run_action(self, action, battery):
+        if self.__debug:
+            print("DEBUG: Action '%s' (%s() in MainRun class)" % (action, self.run_main_loop.__name__))
+        if action == state_machine.COUNTDOWN_ACTION:
+            # check once more if system should be hibernate
+            if self.__on_minimal_level(self.__battery_values.snapshot()):
+                self.__minimal_level_command()
+        else:
+            self.__notify(action, battery)
+
+    # run sampling, notifications, 'no battery' remainder and minimal level countdown as asyncio tasks
+    def __run_async_loop(self):
+        # asyncio needs python 3, so it's imported only in this mode
+        from monitor import async_runtime
+        runtime = async_runtime.AsyncRuntime(self.__battery_values, self.__event_source, self.__handle_events,
+                                             self.__state_machine, self.__next_poll_interval, self.__notify,
+                                             self.__minimal_level_steps, self.__set_no_battery_remainder * 60,
+                                             self.__min_poll_interval, self.__on_wakeup, self.__publish, self.__debug)
+        runtime.run()
 
     # start main loop
     def run_main_loop(self):
+        if self.__asyncio_runtime:
+            return self.__run_async_loop()
+
+        state = None
+        # time of next 'no battery' remainder
+        remainder_time = None
         while True:
-            # check if we have battery
-            while self.__battery_values.is_battery_present():
-                # check if battery is discharging to stay in normal battery level
-                if not self.__battery_values.is_ac_present() and self.__battery_values.is_battery_discharging():
-                    # discharging and battery level is greater then battery_low_value
-                    if (not self.__battery_values.is_ac_present()
-                        and self.__battery_values.battery_current_capacity() > self.__battery_low_value):
-                        if self.__debug:
-                            print("DEBUG: Discharging check (%s() in MainRun class)"
-                                  % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times("Discharging check (%s() in MainRun class)")
-                        self.notification.battery_discharging(self.__battery_values.battery_current_capacity(),
-                                                              self.__battery_values.battery_time())
-                        # have enough power and check if we should stay in save battery level loop
-                        while (not self.__battery_values.is_ac_present()
-                               and self.__battery_values.battery_current_capacity() > self.__battery_low_value):
-                            time.sleep(1)
-
-                    # low capacity level
-                    elif (not self.__battery_values.is_ac_present()
-                          and self.__battery_low_value >= self.__battery_values.battery_current_capacity()
-                            > self.__battery_critical_value):
-                        if self.__debug:
-                            print("DEBUG: Low level battery check (%s() in MainRun class)"
-                                  % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times("Low level battery check (%s() in MainRun class)"
-                                                          % self.run_main_loop.__name__)
-                        self.notification.low_capacity_level(self.__battery_values.battery_current_capacity(),
-                                                             self.__battery_values.battery_time())
-                        # battery have enough power and check if we should stay in low battery level loop
-                        while (not self.__battery_values.is_ac_present()
-                               and self.__battery_low_value >= self.__battery_values.battery_current_capacity()
-                                > self.__battery_critical_value):
-                            time.sleep(1)
-
-                    # critical capacity level
-                    elif (not self.__battery_values.is_ac_present()
-                          and self.__battery_critical_value >= self.__battery_values.battery_current_capacity()
-                            > self.__battery_minimal_value):
-                        if self.__debug:
-                            print("DEBUG: Critical battery level check (%s() in MainRun class)"
-                                  % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times("Critical battery level check (%s() in MainRun class)"
-                                                          % self.run_main_loop.__name__)
-                        self.notification.critical_battery_level(self.__battery_values.battery_current_capacity(),
-                                                                 self.__battery_values.battery_time())
-                        # battery have enough power and check if we should stay in critical battery level loop
-                        while (not self.__battery_values.is_ac_present()
-                               and self.__battery_critical_value >= self.__battery_values.battery_current_capacity()
-                                > self.__battery_minimal_value):
-                            time.sleep(1)
-
-                    # hibernate level
-                    elif (not self.__battery_values.is_ac_present()
-                          and self.__battery_values.battery_current_capacity() <= self.__battery_minimal_value):
-                        if self.__debug:
-                            print("DEBUG: Hibernate battery level check (%s() in MainRun class)"
-                                  % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times("Hibernate battery level check (%s() in MainRun class)"
-                                                          % self.run_main_loop.__name__)
-                        self.notification.minimal_battery_level(self.__battery_values.battery_current_capacity(),
-                                                                self.__battery_values.battery_time(),
-                                                                self.__short_minimal_battery_command,
-                                                                (10 * 1000))
-                        # check once more if system should be hibernate
-                        if (not self.__battery_values.is_ac_present()
-                            and self.__battery_values.battery_current_capacity() <= self.__battery_minimal_value):
-                            # the real thing
-                            if not self.__test:
-                                if (not self.__battery_values.is_ac_present()
-                                    and self.__battery_values.battery_current_capacity() <=
-                                        self.__battery_minimal_value):
-                                    # first warning, beep 5 times every two seconds, and display popup
-                                    for i in range(5):
-                                        # check if ac was plugged
-                                        if (not self.__battery_values.is_ac_present()
-                                            and self.__battery_values.battery_current_capacity()
-                                                <= self.__battery_minimal_value):
-                                            time.sleep(2)
-                                            self.__sound_volume = 10
-                                            self.__set_sound_file_and_volume()
-                                            os.popen(self.__sound_command)
-                                        # ac plugged, then bye
-                                        else:
-                                            break
-                                    # one more check if ac was plugged
-                                    if (not self.__battery_values.is_ac_present()
-                                        and self.__battery_values.battery_current_capacity()
-                                            <= self.__battery_minimal_value):
-                                        time.sleep(2)
-                                        os.popen(self.__sound_command)
-                                        message_string = ("last chance to plug in AC cable...\n"
-                                                          " system will be %s in 10 seconds\n"
-                                                          " current capacity: %s%s\n"
-                                                          " time left: %s") % (self.__short_minimal_battery_command,
-                                                                               self.__battery_values.battery_current_capacity(),
-                                                                               '%',
-                                                                               self.__battery_values.battery_time())
-
-                                        notify_send_string = '''notify-send "!!! MINIMAL BATTERY LEVEL !!!\n" \
-                                                                "%s" %s %s''' \
-                                                             % (message_string, '-t ' + str(10 * 1000),
-                                                                '-a ' + internal_config.PROGRAM_NAME)
-                                        os.popen(notify_send_string)
-                                        time.sleep(10)
-                                    # LAST CHECK before hibernating
-                                    if (not self.__battery_values.is_ac_present()
-                                        and self.__battery_values.battery_current_capacity()
-                                            <= self.__battery_minimal_value):
-                                        # lock screen and hibernate
-                                        for i in range(4):
-                                            time.sleep(5)
-                                            os.popen(self.__sound_command)
-                                        time.sleep(1)
-                                        os.popen(self.__screenlock_command)
-                                        os.popen(self.__minimal_battery_level_command)
-                                    else:
-                                        self.__sound_volume = self.__SOUND_VOLUME
-                                        self.__set_sound_file_and_volume()
-                                        break
-                            # test block
-                            elif self.__test:
-                                self.__sound_volume = 10
-                                self.__set_sound_file_and_volume()
-                                for i in range(5):
-                                    if self.__play_sound:
-                                        os.popen(self.__sound_command)
-                                    if (not self.__battery_values.is_ac_present()
-                                        and self.__battery_values.battery_current_capacity() <=
-                                            self.__battery_minimal_value):
-                                        time.sleep(2)
-                                print("TEST: Hibernating... Program goes sleep for 10sek")
-                                self.__sound_volume = self.__SOUND_VOLUME
-                                self.__set_sound_file_and_volume()
-                                time.sleep(10)
-                        else:
-                            pass
-
-                # check if we have ac connected and we've battery
-                if self.__battery_values.is_ac_present() and not self.__battery_values.is_battery_discharging():
-                    # full charged
-                    if (
-                                self.__battery_values.is_battery_fully_charged() and not
-                            self.__battery_values.is_battery_discharging()):
-                        if self.__debug:
-                            print("DEBUG: Full battery check (%s() in MainRun class)"
-                                  % self.run_main_loop.__name__)
-                        # notification
-                        # simulate self.__check_battery_update_times() behavior
-                        time.sleep(self.__battery_update_timeout)
-                        self.notification.full_battery()
-                        # battery fully charged loop
-                        while (self.__battery_values.is_ac_present()
-                               and self.__battery_values.is_battery_fully_charged()
-                               and not self.__battery_values.is_battery_discharging()):
-                            if not self.__battery_values.is_battery_present():
-                                self.notification.battery_removed()
-                                if self.__debug:
-                                    print("DEBUG: Battery removed !!! (%s() in MainRun class)"
-                                          % self.run_main_loop.__name__)
-                                time.sleep(self.__timeout / 1000)
-                                break
-                            else:
-                                time.sleep(1)
-
-                    # ac plugged and battery is charging
-                    if (self.__battery_values.is_ac_present()
-                        and not self.__battery_values.is_battery_fully_charged()
-                        and not self.__battery_values.is_battery_discharging()):
-                        if self.__debug:
-                            print("DEBUG: Charging check (%s() in MainRun class)"
-                                  % self.run_main_loop.__name__)
-                        # notification
-                        self.__check_battery_update_times("Charging check (%s() in MainRun class)"
-                                                          % self.run_main_loop.__name__)
-                        self.notification.battery_charging(self.__battery_values.battery_current_capacity(),
-                                                           self.__battery_values.battery_time())
-
-                        # battery charging loop
-                        while (self.__battery_values.is_ac_present()
-                               and not self.__battery_values.is_battery_fully_charged()
-                               and not self.__battery_values.is_battery_discharging()):
-                            if not self.__battery_values.is_battery_present():
-                                self.notification.battery_removed()
-                                if self.__debug:
-                                    print("DEBUG: Battery removed (%s() in MainRun class)"
-                                          % self.run_main_loop.__name__)
-                                time.sleep(self.__timeout / 1000)
-                                break
-                            else:
-                                time.sleep(1)
-
-            # check for no battery
-            if not self.__battery_values.is_battery_present() and self.__battery_values.is_ac_present():
-                # notification
-                self.notification.no_battery()
-                if self.__debug:
-                    print("DEBUG: No battery check (%s() in MainRun class)"
-                          % self.run_main_loop.__name__)
-                # no battery remainder loop counter
-                no_battery_counter = 1
-                # loop to deal with situation when we don't have battery
-                while not self.__battery_values.is_battery_present():
-                    if self.__set_no_battery_remainder > 0:
-                        remainder_time_in_sek = self.__set_no_battery_remainder * 60
-                        time.sleep(1)
-                        no_battery_counter += 1
-                        # check if battery was plugged
-                        if self.__battery_values.is_battery_present():
-                            self.notification.battery_plugged()
-                            if self.__debug:
-                                print("DEBUG: Battery plugged (%s() in MainRun class)"
-                                      % self.run_main_loop.__name__)
-                            time.sleep(self.__timeout / 1000)
-                            break
-                        # send no battery notifications and reset no_battery_counter
-                        if no_battery_counter == remainder_time_in_sek:
-                            self.notification.no_battery()
-                            no_battery_counter = 1
-                    else:
-                        # no action wait
-                        time.sleep(1)
-                        # check if battery was plugged
-                        if self.__battery_values.is_battery_present():
-                            self.notification.battery_plugged()
-                            if self.__debug:
-                                print("DEBUG: Battery plugged (%s() in MainRun class)"
-                                      % self.run_main_loop.__name__)
-                            time.sleep(self.__timeout / 1000)
-                            break
+            battery = self.__battery_values.snapshot()
+            new_state, actions = self.__state_machine.transition(state, battery)
+            if self.__debug and new_state != state:
+                print("DEBUG: Battery state %s -> %s" % (state, new_state))
+            state = new_state
+            self.__publish(state, battery)
+            for action in actions:
+                self.__run_action(action, battery)
+            # countdown takes a while and stops when ac gets plugged, so check battery again at once
+            if state == state_machine.COUNTDOWN_STATE:
+                if state_machine.COUNTDOWN_ACTION not in actions:
+                    self.__run_action(state_machine.COUNTDOWN_ACTION, battery)
+                continue
+
+            timeout = self.__next_poll_interval(battery)
+
+            # send 'no battery' notification again after remainder time
+            if state == state_machine.NO_BATTERY and battery.ac_online and self.__set_no_battery_remainder > 0:
+                now = read_battery_values.monotonic()
+                if 'no_battery' in actions or remainder_time is None:
+                    remainder_time = now + self.__set_no_battery_remainder * 60
+                elif now >= remainder_time:
+                    self.__run_action('no_battery', battery)
+                    remainder_time = now + self.__set_no_battery_remainder * 60
+                timeout = max(0, min(timeout, remainder_time - now))
+            else:
+                remainder_time = None
+
+            self.__wait(timeout)
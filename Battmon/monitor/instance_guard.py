@@ -0,0 +1,143 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Only one Battmon runs for every user. Running Battmon holds abstract Unix socket named after user id, kernel
+# releases the name as soon as Battmon exits or crashes, so there's no stale pid file and the check costs one
+# bind. Second Battmon sends its arguments through the socket, running one restarts with them, or answers
+# it's already running with the same ones. Both sides check the other one runs as the same user.
+
+import errno
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+# local imports
+from values import internal_config
+
+# replies of running Battmon
+RESTARTING = 'restarting'
+RUNNING = 'running'
+# seconds to wait for other Battmon
+TIMEOUT = 2
+MAX_MESSAGE_SIZE = 64 * 1024
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+# script started by this Battmon, restart runs it again, working directory doesn't change until then
+SCRIPT = os.path.abspath(sys.argv[0])
+
+
+# abstract socket name of this user
+def guard_name():
+    return '\0%s-%d' % (internal_config.PROGRAM_NAME, os.getuid())
+
+
+# user id of process on the other side of Unix socket
+def peer_uid(sock):
+    pid, uid, gid = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+
+# read until other side closes its side
+def receive_all(sock):
+    data = b''
+    while len(data) < MAX_MESSAGE_SIZE:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+# replace this process by Battmon with given arguments, started in given directory
+def restart(argv, cwd):
+    sys.stdout.flush()
+    os.chdir(cwd)
+    os.execv(sys.executable, [sys.executable, SCRIPT] + list(argv))
+
+
+class InstanceGuard(object):
+    def __init__(self, argv=None, name=None):
+        self.__argv = sys.argv[1:] if argv is None else argv
+        self.__name = guard_name() if name is None else name
+        self.__socket = None
+        self.__thread = None
+        self.__on_restart = None
+
+    # True when there's no other Battmon of this user, it's held until this process and its forks exit
+    def acquire(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.__name)
+            sock.listen(4)
+        except socket.error as se:
+            sock.close()
+            if se.args[0] == errno.EADDRINUSE:
+                return False
+            raise
+        self.__socket = sock
+        return True
+
+    # wait for other Battmons from own thread, on_restart(argv, cwd) is called after reply with different
+    # arguments was sent, started after fork, so the thread runs in daemon
+    def start(self, on_restart):
+        self.__on_restart = on_restart
+        self.__thread = threading.Thread(target=self.__serve, name='instance guard')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __serve(self):
+        while True:
+            try:
+                client = self.__socket.accept()[0]
+            except socket.error as se:
+                if se.args[0] == errno.EINTR:
+                    continue
+                return
+            try:
+                client.settimeout(TIMEOUT)
+                if peer_uid(client) != os.getuid():
+                    continue
+                message = json.loads(receive_all(client).decode('utf-8'))
+                argv, cwd = list(message['argv']), message['cwd']
+                reply = RUNNING if argv == self.__argv else RESTARTING
+                client.sendall(reply.encode('ascii') + b'\n')
+            except (socket.error, ValueError, KeyError, TypeError) as e:
+                print("Error: bad message from other Battmon: %s" % e)
+                continue
+            finally:
+                client.close()
+            if reply == RESTARTING:
+                self.__on_restart(argv, cwd)
+
+
+# send arguments to running Battmon, its reply or None when it didn't answer
+def send_arguments(argv, cwd, name=None, timeout=TIMEOUT):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(guard_name() if name is None else name)
+        if peer_uid(client) != os.getuid():
+            print("Error: socket of running Battmon is held by other user")
+            return None
+        client.sendall(json.dumps({'argv': list(argv), 'cwd': cwd}).encode('utf-8'))
+        client.shutdown(socket.SHUT_WR)
+        return receive_all(client).decode('utf-8').strip() or None
+    except socket.error:
+        return None
+    finally:
+        client.close()
@@ -0,0 +1,60 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# battery is full from this capacity on, like in BatterySnapshot.fully_charged
+FULL_CAPACITY = 99
+
+
+# decides when to check battery next time, long sleeps far from threshold, short ones close to it
+class PollScheduler(object):
+    def __init__(self, thresholds, min_interval, max_interval):
+        self.__thresholds = sorted(thresholds, reverse=True)
+        self.__min_interval = min_interval
+        self.__max_interval = max_interval
+
+    # highest threshold below given capacity, None when there isn't any
+    def __next_threshold(self, capacity):
+        for threshold in self.__thresholds:
+            if capacity > threshold:
+                return threshold
+        return None
+
+    # seconds until battery reaches next threshold or gets full, None when unknown
+    def time_to_threshold(self, battery):
+        power = battery.average_power or battery.power_now
+        if not battery.battery_present or battery.energy_full <= 0 or power <= 0:
+            return None
+
+        # capacity in percent without rounding and how fast it changes
+        capacity = battery.energy_now * 100.0 / battery.energy_full
+        rate = power * 100.0 / battery.energy_full / 3600
+
+        if battery.discharging:
+            threshold = self.__next_threshold(int(capacity))
+            if threshold is None:
+                return None
+            # capacity is truncated, so threshold is reached below threshold + 1
+            return max(0.0, capacity - (threshold + 1)) / rate
+        elif battery.ac_online and capacity < FULL_CAPACITY:
+            return (FULL_CAPACITY - capacity) / rate
+        return None
+
+    # seconds to sleep before next check, half of the time to threshold keeps off estimation errors
+    def next_interval(self, battery):
+        seconds = self.time_to_threshold(battery)
+        if seconds is None:
+            return self.__max_interval
+        return min(self.__max_interval, max(self.__min_interval, seconds / 2))
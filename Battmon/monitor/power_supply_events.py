@@ -0,0 +1,166 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import collections
+import errno
+import os
+import select
+import socket
+import threading
+import time
+
+# local imports
+from values import read_battery_values
+
+NETLINK_KOBJECT_UEVENT = 15
+# multicast group of uevents send by kernel, udev uses group 2
+KERNEL_UEVENT_GROUP = 1
+UEVENT_BUFFER_SIZE = 16384
+
+
+# power supply device was added, removed or has changed, e.g. ac plugged or battery status changed
+class PowerSupplyEvent(object):
+    __slots__ = ('action', 'name', 'properties')
+
+    def __init__(self, action, name, properties=None):
+        self.action = action
+        self.name = name
+        self.properties = properties or {}
+
+    def __repr__(self):
+        return '%s@%s' % (self.action, self.name)
+
+
+# parse kernel uevent 'change@/devices/...\0ACTION=change\0SUBSYSTEM=power_supply\0...', None for other subsystems
+def parse_uevent(data):
+    fields = data.split(b'\0')
+    properties = {}
+    for field in fields[1:]:
+        key, sep, value = field.partition(b'=')
+        if sep:
+            properties[key.decode('ascii', 'replace')] = value.decode('ascii', 'replace')
+    if properties.get('SUBSYSTEM') != 'power_supply':
+        return None
+    name = properties.get('POWER_SUPPLY_NAME') or os.path.basename(properties.get('DEVPATH', ''))
+    return PowerSupplyEvent(properties.get('ACTION', ''), name, properties)
+
+
+# listens for power supply uevents send by kernel
+class NetlinkEventSource(object):
+    def __init__(self):
+        self.__socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        try:
+            self.__socket.bind((0, KERNEL_UEVENT_GROUP))
+            self.__socket.setblocking(False)
+        except socket.error:
+            self.__socket.close()
+            raise
+
+    def fileno(self):
+        return self.__socket.fileno()
+
+    # read all queued events without blocking
+    def __drain(self):
+        events = []
+        while True:
+            try:
+                data = self.__socket.recv(UEVENT_BUFFER_SIZE)
+            except socket.error as se:
+                if se.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return events
+                # ENOBUFS, kernel dropped events, report it as change of all devices
+                if se.errno == errno.ENOBUFS:
+                    events.append(PowerSupplyEvent('change', ''))
+                    continue
+                raise
+            event = parse_uevent(data)
+            if event is not None:
+                events.append(event)
+
+    # wait for power supply events, return them or empty list after timeout in seconds
+    def wait(self, timeout):
+        deadline = read_battery_values.monotonic() + timeout
+        while True:
+            timeout = max(0, deadline - read_battery_values.monotonic())
+            try:
+                readable = select.select([self.__socket], [], [], timeout)[0]
+            except select.error as se:
+                if se.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not readable:
+                return []
+            # other subsystems send uevents too, so keep waiting when none of power supply came
+            events = self.__drain()
+            if events:
+                return events
+
+    def close(self):
+        self.__socket.close()
+
+
+# events are pushed by hand, e.g. from tests or other thread
+class LocalEventSource(object):
+    def __init__(self):
+        self.__events = collections.deque()
+        self.__lock = threading.Lock()
+        self.__read_fd, self.__write_fd = os.pipe()
+
+    def fileno(self):
+        return self.__read_fd
+
+    # queue event and wake up waiting monitor
+    def push(self, action, name, properties=None):
+        with self.__lock:
+            self.__events.append(PowerSupplyEvent(action, name, properties))
+        os.write(self.__write_fd, b'.')
+
+    def wait(self, timeout):
+        try:
+            readable = select.select([self.__read_fd], [], [], timeout)[0]
+        except select.error as se:
+            if se.args[0] == errno.EINTR:
+                return []
+            raise
+        if not readable:
+            return []
+        os.read(self.__read_fd, UEVENT_BUFFER_SIZE)
+        with self.__lock:
+            events = list(self.__events)
+            self.__events.clear()
+        return events
+
+    def close(self):
+        os.close(self.__read_fd)
+        os.close(self.__write_fd)
+
+
+# no events at all, only sleeps, used when netlink socket isn't available
+class PollingEventSource(object):
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return []
+
+    def close(self):
+        pass
+
+
+# netlink event source if possible, otherwise polling one
+def create_event_source():
+    try:
+        return NetlinkEventSource()
+    except (AttributeError, socket.error):
+        return PollingEventSource()
@@ -0,0 +1,226 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Every command Battmon runs goes through one process manager. Commands are argv lists run without shell and
+# without pipes, only sound player gets its stdin from pipe. Reaper thread reaps children as soon as they
+# exit, so long running Battmon doesn't collect zombies and leaked file descriptors. Commands running longer
+# then their timeout are killed together with their process group and only limited number of them runs at
+# once. Reaper waits on pidfd of every child (python 3.9 and Linux 5.3), otherwise it checks children every
+# REAP_INTERVAL seconds while there are any.
+
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+
+# local imports
+from values import internal_config, read_battery_values
+
+# seconds between checks of children, which have no pidfd
+REAP_INTERVAL = 0.5
+
+
+# running command
+class Child(object):
+    __slots__ = ('process', 'argv', 'deadline', 'pidfd', 'killed', 'done')
+
+    def __init__(self, process, argv, deadline, pidfd):
+        self.process = process
+        self.argv = argv
+        self.deadline = deadline
+        self.pidfd = pidfd
+        self.killed = False
+        # set when child is reaped
+        self.done = threading.Event()
+
+
+# number of open file descriptors of this process, None without /proc
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+# file descriptor becoming readable when process exits, None when kernel or python can't do it
+def open_pidfd(pid):
+    if not hasattr(os, 'pidfd_open'):
+        return None
+    try:
+        return os.pidfd_open(pid)
+    except OSError:
+        return None
+
+
+class ProcessManager(object):
+    def __init__(self, max_children=internal_config.DEFAULT_MAX_CHILDREN, instrumentation=None, debug=False):
+        self.__max_children = max_children
+        self.__instrumentation = instrumentation
+        self.__debug = debug
+        self.__reset()
+
+        self.spawned = 0
+        self.reaped = 0
+        # killed after their timeout, or by kill()
+        self.killed = 0
+        # not started, because too many commands were running
+        self.dropped = 0
+        self.failed = 0
+        self.max_running = 0
+
+    # state of reaper, children of parent process aren't children of forked one, so it starts again after fork
+    def __reset(self):
+        self.__owner = os.getpid()
+        self.__children = {}
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__wakeup = None
+
+    # number of running children
+    def running(self):
+        return len(self.__children)
+
+    # start command without waiting for it, it's killed after timeout seconds, None lets it run until it exits,
+    # e.g. screen locker. Commands over limit of running children are dropped, unless they are required.
+    def spawn(self, argv, timeout=internal_config.DEFAULT_COMMAND_TIMEOUT, required=False):
+        return self.__spawn(argv, timeout, required) is not None
+
+    # start long running command reading from pipe, e.g. sound player, its child with process.stdin open for
+    # writing, None when it couldn't start. It runs until it exits or kill() is called.
+    def spawn_pipe(self, argv, required=False):
+        return self.__spawn(argv, None, required, subprocess.PIPE)
+
+    # kill child started by this manager, e.g. player which stopped reading
+    def kill(self, child):
+        with self.__lock:
+            if not child.done.is_set() and not child.killed:
+                self.__kill(child)
+
+    def __spawn(self, argv, timeout, required, stdin=None):
+        if self.__owner != os.getpid():
+            self.__reset()
+        with self.__lock:
+            if not required and len(self.__children) >= self.__max_children:
+                self.dropped += 1
+                if self.__debug:
+                    print("DEBUG: Dropped '%s', %s commands are running" % (' '.join(argv), len(self.__children)))
+                return None
+            start = read_battery_values.monotonic()
+            try:
+                process = self.__start(argv, stdin)
+            except OSError as e:
+                self.failed += 1
+                print("Error: can't run '%s': %s" % (' '.join(argv), e))
+                return None
+            finally:
+                if self.__instrumentation is not None:
+                    self.__instrumentation.spawned(read_battery_values.monotonic() - start)
+            child = Child(process, argv, None if timeout is None else start + timeout, open_pidfd(process.pid))
+            self.__children[process.pid] = child
+            self.spawned += 1
+            self.max_running = max(self.max_running, len(self.__children))
+            if self.__thread is None:
+                if self.__wakeup is None:
+                    self.__wakeup = os.pipe()
+                self.__thread = threading.Thread(target=self.__reap, name='process reaper')
+                self.__thread.daemon = True
+                self.__thread.start()
+            else:
+                os.write(self.__wakeup[1], b'\0')
+        if self.__debug:
+            print("DEBUG: Spawned '%s' (%s)" % (' '.join(argv), self.summary()))
+        return child
+
+    # child in its own process group, so timeout kills commands it started too, e.g. sudo or shell script
+    @staticmethod
+    def __start(argv, stdin=None):
+        with open(os.devnull, 'r+b') as devnull:
+            stdin = devnull if stdin is None else stdin
+            if sys.version_info[0] < 3:
+                return subprocess.Popen(argv, stdin=stdin, stdout=devnull, close_fds=True, preexec_fn=os.setsid)
+            return subprocess.Popen(argv, stdin=stdin, stdout=devnull, close_fds=True, start_new_session=True)
+
+    # reaper thread, it exits when there are no children and spawn starts it again
+    def __reap(self):
+        poller = select.poll()
+        poller.register(self.__wakeup[0], select.POLLIN)
+        registered = {}
+        while True:
+            with self.__lock:
+                if not self.__children:
+                    self.__thread = None
+                    return
+                timeout = None
+                for child in self.__children.values():
+                    if child.pidfd is None:
+                        timeout = REAP_INTERVAL
+                    elif child.pidfd not in registered:
+                        poller.register(child.pidfd, select.POLLIN)
+                        registered[child.pidfd] = child
+                deadlines = [child.deadline for child in self.__children.values() if child.deadline is not None]
+                if deadlines:
+                    left = max(0.0, min(deadlines) - read_battery_values.monotonic())
+                    timeout = left if timeout is None else min(timeout, left)
+            for fd, event in poller.poll(None if timeout is None else timeout * 1000):
+                if fd == self.__wakeup[0]:
+                    os.read(fd, 4096)
+            self.__collect(poller, registered)
+
+    # reap exited children and kill ones after their timeout
+    def __collect(self, poller, registered):
+        now = read_battery_values.monotonic()
+        finished = []
+        with self.__lock:
+            for pid, child in list(self.__children.items()):
+                if child.process.poll() is None:
+                    if child.deadline is not None and now >= child.deadline:
+                        print("Error: '%s' didn't finish in time, killing it" % ' '.join(child.argv))
+                        self.__kill(child)
+                    continue
+                del self.__children[pid]
+                self.reaped += 1
+                if child.pidfd is not None:
+                    if registered.pop(child.pidfd, None) is not None:
+                        poller.unregister(child.pidfd)
+                    os.close(child.pidfd)
+                child.done.set()
+                finished.append(child)
+        if self.__debug:
+            for child in finished:
+                print("DEBUG: Reaped '%s' with exit status %s (%s)"
+                      % (' '.join(child.argv), 'killed' if child.killed else child.process.returncode,
+                         self.summary()))
+
+    # kill child with its process group, it's reaped as soon as it exits
+    def __kill(self, child):
+        child.deadline = None
+        child.killed = True
+        self.killed += 1
+        try:
+            os.killpg(child.process.pid, signal.SIGKILL)
+        except OSError:
+            try:
+                child.process.kill()
+            except OSError:
+                pass
+
+    # counters as one line
+    def summary(self):
+        return ("children: %s running (max %s), %s spawned, %s reaped, %s killed, %s dropped, %s failed, "
+                "%s open fds" % (self.running(), self.max_running, self.spawned, self.reaped, self.killed,
+                                 self.dropped, self.failed, open_fds()))
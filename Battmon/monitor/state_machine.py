@@ -0,0 +1,83 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# battery states
+NO_BATTERY = 'NO_BATTERY'
+DISCHARGING_OK = 'DISCHARGING_OK'
+LOW = 'LOW'
+CRITICAL = 'CRITICAL'
+MINIMAL = 'MINIMAL'
+CHARGING = 'CHARGING'
+FULL = 'FULL'
+
+# actions, named like BatteryNotifications methods, 'minimal_level_command' locks screen and hibernates
+ENTER_ACTIONS = {NO_BATTERY: (),
+                 DISCHARGING_OK: ('battery_discharging',),
+                 LOW: ('low_capacity_level',),
+                 CRITICAL: ('critical_battery_level',),
+                 MINIMAL: ('minimal_battery_level', 'minimal_level_command'),
+                 CHARGING: ('battery_charging',),
+                 FULL: ('full_battery',)}
+
+# notifications showing capacity and time left
+TIME_LEFT_ACTIONS = ('battery_discharging', 'low_capacity_level', 'critical_battery_level', 'minimal_battery_level',
+                     'battery_charging')
+
+# action starting countdown before system goes down
+COUNTDOWN_ACTION = 'minimal_level_command'
+
+# countdown runs again, when it's over and battery stays in this state, e.g. after resume from hibernation
+# without ac, its notification is sent only on entering the state, warnings come from countdown itself
+COUNTDOWN_STATE = MINIMAL
+
+
+# decides battery state from one sample and which actions come with a state change
+class BatteryStateMachine(object):
+    def __init__(self, low_value, critical_value, minimal_value):
+        self.__low_value = low_value
+        self.__critical_value = critical_value
+        self.__minimal_value = minimal_value
+
+    # state of given battery snapshot
+    def classify(self, battery):
+        if not battery.battery_present:
+            return NO_BATTERY
+        # capacity levels count only when discharging, charger which isn't Mains, e.g. USB-C, sets only status
+        if not battery.discharging:
+            return FULL if battery.fully_charged or battery.status == 'Full' else CHARGING
+        if battery.capacity > self.__low_value:
+            return DISCHARGING_OK
+        if battery.capacity > self.__critical_value:
+            return LOW
+        if battery.capacity > self.__minimal_value:
+            return CRITICAL
+        return MINIMAL
+
+    # new state and actions to run, state is None before first sample
+    def transition(self, state, battery):
+        new_state = self.classify(battery)
+        if new_state == state:
+            return new_state, ()
+
+        actions = ()
+        if new_state == NO_BATTERY:
+            if state is not None and state != NO_BATTERY:
+                actions += ('battery_removed',)
+            if battery.ac_online:
+                actions += ('no_battery',)
+        elif state == NO_BATTERY:
+            actions += ('battery_plugged',)
+        return new_state, actions + ENTER_ACTIONS[new_state]
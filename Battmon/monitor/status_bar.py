@@ -0,0 +1,146 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Battery block of tiling wm bar, written by Battmon itself instead of once per second shell loop.
+# Line is rendered from format on every battery check and written to stdout or fifo only when it differs
+# from the last written one. Plain protocol writes the text, i3bar protocol (also swaybar) writes header
+# once and then one JSON array per change.
+#
+#   ./battmon.py -f -bo - -bp i3bar -bf '{source} {capacity}% {time_left_text}'
+
+import errno
+import json
+import os
+import signal
+
+# local imports
+from monitor import state_machine, status_server
+
+NO_BATTERY_TEXT = 'no battery'
+# i3bar block colors of states, other states use bar color
+STATE_COLORS = {state_machine.LOW: '#ffd700',
+                state_machine.CRITICAL: '#ff0000',
+                state_machine.MINIMAL: '#ff0000'}
+URGENT_STATES = (state_machine.CRITICAL, state_machine.MINIMAL)
+# i3bar stops bar commands with SIGSTOP when bar is hidden, that would stop battery checks too,
+# so ask it to send SIGCONT, which does nothing to running process
+I3BAR_HEADER = json.dumps({'version': 1, 'stop_signal': int(signal.SIGCONT),
+                           'cont_signal': int(signal.SIGCONT)}) + '\n[\n'
+
+
+# fields usable in format, the same as 'battmon status' ones and 'source', 'AC' or 'BAT'
+def format_fields(state, battery):
+    fields = status_server.battery_status(state, battery)
+    fields['source'] = 'AC' if battery.ac_online else 'BAT'
+    fields['batteries'] = ','.join(fields['batteries'])
+    return fields
+
+
+# check format before Battmon starts, error message or None
+def check_format(bar_format):
+    try:
+        bar_format.format(**dict((name, '') for name in status_server.FIELDS + ('source',)))
+    except (KeyError, IndexError, ValueError) as e:
+        return "unknown field or broken format '%s': %s" % (bar_format, e)
+    return None
+
+
+# writes battery block to stdout or fifo, only when it changes
+class BarOutput(object):
+    def __init__(self, path, bar_format, protocol='plain'):
+        self.__path = path
+        self.__format = bar_format
+        self.__protocol = protocol
+        self.__fd = None
+        # last rendered line, written one and if it's first line after header
+        self.__line = None
+        self.__written = None
+        self.__first = True
+
+        if self.__path == '-':
+            # bar reads stdout, so everything else Battmon prints goes to stderr
+            self.__fd = os.dup(1)
+            os.dup2(2, 1)
+            self.__start()
+
+    # header of new reader
+    def __start(self):
+        self.__written = None
+        self.__first = True
+        if self.__protocol == 'i3bar':
+            self.__write_all(I3BAR_HEADER.encode('utf-8'))
+
+    # open fifo without blocking, fails until bar opens its side
+    def __open(self):
+        try:
+            self.__fd = os.open(self.__path, os.O_WRONLY | os.O_NONBLOCK)
+        except (IOError, OSError) as e:
+            if e.errno not in (errno.ENXIO, errno.ENOENT):
+                print("Error: can't open bar output %s: %s" % (self.__path, e))
+            return False
+        self.__start()
+        return True
+
+    # write whole data, lines are shorter than pipe buffer, so they're written at once or not at all
+    def __write_all(self, data):
+        try:
+            os.write(self.__fd, data)
+        except (IOError, OSError) as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return False
+            # reader of fifo is gone, reopen it on next change
+            if self.__path != '-':
+                os.close(self.__fd)
+                self.__fd = None
+                return False
+            raise
+        return True
+
+    # render line of battery snapshot
+    def __render(self, state, battery):
+        if not battery.battery_present:
+            text = NO_BATTERY_TEXT
+        else:
+            text = self.__format.format(**format_fields(state, battery))
+        if self.__protocol != 'i3bar':
+            return text + '\n'
+        block = {'name': 'battery', 'full_text': text}
+        if state in STATE_COLORS:
+            block['color'] = STATE_COLORS[state]
+        if state in URGENT_STATES:
+            block['urgent'] = True
+        return json.dumps([block]) + '\n'
+
+    # write line of new battery snapshot, when it's different than what bar shows
+    def publish(self, state, battery):
+        self.__line = self.__render(state, battery)
+        self.flush()
+
+    # write pending line, e.g. after fifo reader came back
+    def flush(self):
+        if self.__line is None or self.__line == self.__written:
+            return
+        if self.__fd is None and not self.__open():
+            return
+        data = self.__line if self.__first or self.__protocol != 'i3bar' else ',' + self.__line
+        if self.__write_all(data.encode('utf-8')):
+            self.__written = self.__line
+            self.__first = False
+
+    def close(self):
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
@@ -0,0 +1,291 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Latest battery snapshot served on Unix socket, so status bars ask running Battmon instead of reading sysfs
+# or running acpi themselves. Replies are formatted once per battery check, clients only get copy of them,
+# so any number of clients never cause extra sysfs reads. Client sends one request line and gets reply:
+#
+#   'json' (or empty line)  -> {"capacity": 57, "state": "DISCHARGING_OK", ...}
+#   'text'                  -> capacity=57\nstate=DISCHARGING_OK\n...
+#
+#   ./battmon.py status [-ss PATH] [--text] [-k capacity]
+
+import argparse
+import errno
+import json
+import os
+import select
+import socket
+import stat
+import sys
+import threading
+import time
+
+# local imports
+from values import internal_config, read_battery_values
+
+# request line longer than this is broken
+MAX_REQUEST_SIZE = 64
+# clients which don't send request or read reply in this seconds are dropped
+CLIENT_TIMEOUT = 5
+LISTEN_BACKLOG = 64
+# fields of status in order they're printed in text reply
+FIELDS = ('state', 'battery_present', 'ac_online', 'status', 'capacity', 'time_left', 'time_left_text', 'power_now',
+          'average_power', 'energy_now', 'energy_full', 'batteries', 'updated')
+
+
+# status of battery snapshot as dict of FIELDS
+def battery_status(state, battery):
+    return {'state': state,
+            'battery_present': battery.battery_present,
+            'ac_online': battery.ac_online,
+            'status': battery.status,
+            'capacity': battery.capacity,
+            'time_left': battery.time_left if battery.battery_present else -1,
+            'time_left_text': str(battery.battery_time()) if battery.battery_present else 'Unknown',
+            'power_now': battery.power_now,
+            'average_power': battery.average_power,
+            'energy_now': battery.energy_now,
+            'energy_full': battery.energy_full,
+            'batteries': [b.name for b in battery.batteries],
+            'updated': time.time()}
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ','.join(value)
+    return str(value)
+
+
+# status as key=value lines
+def format_text(status):
+    return ''.join('%s=%s\n' % (name, format_value(status[name])) for name in FIELDS)
+
+
+# connected client, request read so far and rest of reply to send
+class StatusClient(object):
+    __slots__ = ('socket', 'request', 'reply', 'deadline')
+
+    def __init__(self, client_socket, deadline):
+        self.socket = client_socket
+        self.request = b''
+        self.reply = None
+        self.deadline = deadline
+
+
+# serves latest published status on Unix socket from its own thread, all sockets are non-blocking and
+# watched by one poll, so slow client never holds others
+class StatusServer(object):
+    def __init__(self, path=internal_config.DEFAULT_STATUS_SOCKET_PATH):
+        self.__path = path
+        self.__replies = {b'json': b'{}\n', b'text': b''}
+        self.__clients = {}
+        self.__socket = None
+        self.__poll = None
+        self.__thread = None
+        self.__wake_read, self.__wake_write = None, None
+        self.__open()
+
+    # bind socket, remove stale one left by Battmon which didn't exit cleanly
+    def __open(self):
+        if os.path.exists(self.__path):
+            if not stat.S_ISSOCK(os.stat(self.__path).st_mode):
+                raise socket.error(errno.EEXIST, 'file exists and it is not socket')
+            if query(self.__path, 'json', 1) is not None:
+                raise socket.error(errno.EADDRINUSE, 'other Battmon is serving status on it')
+            os.remove(self.__path)
+        directory = os.path.dirname(self.__path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only this user can ask for status
+        umask = os.umask(0o177)
+        try:
+            self.__socket.bind(self.__path)
+            self.__socket.listen(LISTEN_BACKLOG)
+            self.__socket.setblocking(False)
+        except socket.error:
+            self.__socket.close()
+            raise
+        finally:
+            os.umask(umask)
+
+        self.__wake_read, self.__wake_write = os.pipe()
+        self.__poll = select.poll()
+        self.__poll.register(self.__socket.fileno(), select.POLLIN)
+        self.__poll.register(self.__wake_read, select.POLLIN)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__serve, name='status server')
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    # format replies of new battery snapshot, clients asking later get them
+    def publish(self, state, battery):
+        status = battery_status(state, battery)
+        # replaced at once, so server thread never sees half of them
+        self.__replies = {b'json': (json.dumps(status, sort_keys=True) + '\n').encode('utf-8'),
+                          b'text': format_text(status).encode('utf-8')}
+
+    def __serve(self):
+        while True:
+            timeout = CLIENT_TIMEOUT * 1000 if self.__clients else None
+            try:
+                ready = self.__poll.poll(timeout)
+            except (IOError, OSError, select.error) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, event in ready:
+                if fd == self.__wake_read:
+                    return
+                if fd == self.__socket.fileno():
+                    self.__accept()
+                elif event & select.POLLOUT:
+                    self.__send(fd)
+                else:
+                    self.__receive(fd)
+            self.__drop_idle()
+
+    def __accept(self):
+        deadline = read_battery_values.monotonic() + CLIENT_TIMEOUT
+        while True:
+            try:
+                client_socket = self.__socket.accept()[0]
+            except socket.error as se:
+                if se.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED, errno.EINTR):
+                    return
+                # out of file descriptors, pending clients wait until some are closed
+                if se.args[0] in (errno.EMFILE, errno.ENFILE):
+                    return
+                raise
+            client_socket.setblocking(False)
+            self.__clients[client_socket.fileno()] = StatusClient(client_socket, deadline)
+            self.__poll.register(client_socket.fileno(), select.POLLIN)
+
+    # read request line, reply as soon as it's complete
+    def __receive(self, fd):
+        client = self.__clients[fd]
+        try:
+            data = client.socket.recv(MAX_REQUEST_SIZE)
+        except socket.error as se:
+            if se.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.__close(fd)
+            return
+        client.request += data
+        if data and b'\n' not in client.request and len(client.request) < MAX_REQUEST_SIZE:
+            return
+        # whole line or client closed its side, empty request is json
+        kind = client.request.split(b'\n', 1)[0].strip() or b'json'
+        reply = self.__replies.get(kind)
+        client.reply = reply if reply is not None else b'error: unknown request, use json or text\n'
+        self.__poll.modify(fd, select.POLLOUT)
+        self.__send(fd)
+
+    def __send(self, fd):
+        client = self.__clients[fd]
+        try:
+            sent = client.socket.send(client.reply)
+        except socket.error as se:
+            if se.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.__close(fd)
+            return
+        client.reply = client.reply[sent:]
+        if not client.reply:
+            self.__close(fd)
+
+    def __drop_idle(self):
+        now = read_battery_values.monotonic()
+        for fd in [fd for fd, client in self.__clients.items() if client.deadline < now]:
+            self.__close(fd)
+
+    def __close(self, fd):
+        client = self.__clients.pop(fd)
+        self.__poll.unregister(fd)
+        client.socket.close()
+
+    def close(self):
+        if self.__socket is None:
+            return
+        if self.__thread is not None:
+            os.write(self.__wake_write, b'.')
+            self.__thread.join()
+        for fd in list(self.__clients):
+            self.__close(fd)
+        self.__socket.close()
+        self.__socket = None
+        os.close(self.__wake_read)
+        os.close(self.__wake_write)
+        try:
+            os.remove(self.__path)
+        except OSError:
+            pass
+
+
+# status server on given path, None when it can't be used, e.g. other Battmon serves on it
+def open_status_server(path=internal_config.DEFAULT_STATUS_SOCKET_PATH):
+    if not path:
+        return None
+    try:
+        server = StatusServer(path)
+    except (IOError, OSError, socket.error) as e:
+        print("Error: can't serve status on %s: %s, status socket disabled" % (path, e))
+        return None
+    server.start()
+    return server
+
+
+# ask running Battmon for status, reply as string or None when it isn't running
+def query(path=internal_config.DEFAULT_STATUS_SOCKET_PATH, kind='json', timeout=CLIENT_TIMEOUT):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        client.sendall(kind.encode('ascii') + b'\n')
+        reply = b''
+        while True:
+            data = client.recv(4096)
+            if not data:
+                return reply.decode('utf-8')
+            reply += data
+    except socket.error:
+        return None
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="battmon status", description="battery status from running Battmon")
+    ap.add_argument("-ss", "--status-socket", default=internal_config.DEFAULT_STATUS_SOCKET_PATH, metavar="<PATH>",
+                    help="status socket of running Battmon")
+    ap.add_argument("--text", action="store_true", help="print key=value lines instead of json")
+    ap.add_argument("-k", "--key", choices=FIELDS, help="print only value of this field")
+    args = ap.parse_args(argv)
+
+    reply = query(args.status_socket, 'text' if args.text or args.key else 'json')
+    if reply is None:
+        print("Error: Battmon isn't running or doesn't serve status on %s" % args.status_socket)
+        sys.exit(1)
+    if args.key:
+        values = dict(line.split('=', 1) for line in reply.splitlines() if '=' in line)
+        print(values.get(args.key, ''))
+    else:
+        sys.stdout.write(reply)
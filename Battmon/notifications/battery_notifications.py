@@ -14,186 +14,88 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
-import os
-import time
+# battery state notifications replace each other, so there's always only one popup about battery
+BATTERY_NOTIFICATION = 'battery'
 
-# local imports
-from values import internal_config
+# notifications shown even with -cn, named like their methods
+CRITICAL_ACTIONS = ('critical_battery_level', 'minimal_battery_level', 'battery_removed', 'battery_plugged',
+                    'no_battery')
+
+# notifications about ac and battery being plugged or removed, they aren't replaced by battery state ones while
+# waiting to be sent
+EVENT_ACTIONS = ('battery_removed', 'battery_plugged')
+
+
+# pending notifications of the same category replace each other, so only the latest battery state is sent
+def notification_category(action):
+    return action if action in EVENT_ACTIONS else BATTERY_NOTIFICATION
+
+
+# current capacity and time left as notification body
+def battery_message(capacity, battery_time):
+    return "current capacity: %s%%\n time left: %s" % (capacity, battery_time)
 
 
 # deal with standard battery notifications
 class BatteryNotifications(object):
-    def __init__(self, disable_notifications, notify_send, critical, sound, sound_command, timeout):
+    def __init__(self, disable_notifications, notifier, critical, sound, play, timeout):
         self.__disable_notifications = disable_notifications
-        self.__notify_send = notify_send
+        # session bus or notify-send notifier, None when there's neither
+        self.__notifier = notifier
         self.__critical = critical
         self.__sound = sound
-        self.__sound_command = sound_command
+        # plays notification sound, in process sound engine or sound command
+        self.__play = play
         self.__timeout = timeout
 
+    # play sound once and show notification, or print it when there's no notifier, with -cn only critical
+    # notifications are shown, with -n only sound is played
+    def __show(self, action, summary, body, timeout, printed=None):
+        shown = not self.__disable_notifications and (action in CRITICAL_ACTIONS or not self.__critical)
+        if self.__sound and (shown or self.__disable_notifications):
+            self.__play()
+        if not shown:
+            return
+        if self.__notifier is not None:
+            self.__notifier.notify(summary, body, timeout, BATTERY_NOTIFICATION)
+        else:
+            print(printed or summary)
+
     # battery discharging notification
     def battery_discharging(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "DISCHARGING\n" "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("DISCHARGING")
+        self.__show('battery_discharging', "DISCHARGING", battery_message(capacity, battery_time), self.__timeout)
 
     # battery low capacity notification
     def low_capacity_level(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "LOW BATTERY LEVEL\n" \
-                                     "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("LOW BATTERY LEVEL")
+        self.__show('low_capacity_level', "LOW BATTERY LEVEL", battery_message(capacity, battery_time), self.__timeout)
 
     # battery critical level notification
     def critical_battery_level(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "CRITICAL BATTERY LEVEL\n" \
-                                     "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("CRITICAL BATTERY LEVEL")
+        self.__show('critical_battery_level', "CRITICAL BATTERY LEVEL", battery_message(capacity, battery_time),
+                    self.__timeout)
 
     # hibernate level notification
     def minimal_battery_level(self, capacity, battery_time, minimal_battery_command, notification_timeout):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            if self.__notify_send:
-                if self.__sound:
-                    os.popen(self.__sound_command)
-                message_string = "system will be %s in %s\n current capacity: %s%s\n time left: %s" \
-                                 % (minimal_battery_command, int(notification_timeout / 1000),
-                                    capacity, '%', battery_time)
-
-                notify_send_string = '''notify-send "!!! MINIMAL BATTERY LEVEL !!!\n" "%s" %s %s''' \
-                                     % (message_string, '-t ' + str(notification_timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("!!! MINIMAL BATTERY LEVEL !!!")
+        message_string = "system will be %s in %s\n current capacity: %s%s\n time left: %s" \
+                         % (minimal_battery_command, int(notification_timeout / 1000), capacity, '%', battery_time)
+        self.__show('minimal_battery_level', "!!! MINIMAL BATTERY LEVEL !!!", message_string, notification_timeout)
 
     # battery full notification
     def full_battery(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "BATTERY FULL" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("BATTERY FULL")
+        self.__show('full_battery', "BATTERY FULL", "", self.__timeout)
 
     # charging notification
     def battery_charging(self, capacity, battery_time):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications and not self.__critical:
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "CHARGING\n" "current capacity: %s%s\n time left: %s" %s %s''' \
-                                     % (capacity, '%', battery_time, '-t ' + str(self.__timeout),
-                                        '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("CHARGING")
+        self.__show('battery_charging', "CHARGING", battery_message(capacity, battery_time), self.__timeout)
 
     # battery removed notification
     def battery_removed(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            time.sleep(1)
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "!!! BATTERY REMOVED !!!" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("!!! BATTERY REMOVED !!!")
+        self.__show('battery_removed', "!!! BATTERY REMOVED !!!", "", self.__timeout)
 
     # battery plugged notification
     def battery_plugged(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            time.sleep(1)
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "BATTERY PLUGGED " %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("Battery plugged !!!")
+        self.__show('battery_plugged', "BATTERY PLUGGED", "", self.__timeout, "Battery plugged !!!")
 
     # no battery notification
     def no_battery(self):
-        # if use sound only
-        if (self.__sound and ((self.__disable_notifications or not self.__critical)
-                              and (self.__disable_notifications or self.__critical))):
-            os.popen(self.__sound_command)
-        # notification
-        if not self.__disable_notifications:
-            time.sleep(1)
-            if self.__sound:
-                os.popen(self.__sound_command)
-            if self.__notify_send:
-                notify_send_string = '''notify-send "!!! NO BATTERY !!!" %s %s''' \
-                                     % ('-t ' + str(self.__timeout), '-a ' + internal_config.PROGRAM_NAME)
-                os.popen(notify_send_string)
-            elif not self.__notify_send:
-                print("!!! NO BATTERY !!!")
+        self.__show('no_battery', "!!! NO BATTERY !!!", "", self.__timeout)
@@ -0,0 +1,280 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Just enough of D-Bus wire protocol to send notifications without any D-Bus library: session bus address,
+# EXTERNAL authentication and marshalling of messages, little endian only when writing.
+# Values of signature types: numbers as int or float, 's', 'o' and 'g' as str, 'a' as list or dict for
+# 'a{..}', structs as tuple and 'v' as (signature, value) pair when writing, only value when reading.
+
+import binascii
+import os
+import socket
+import struct
+
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+# header fields
+PATH = 1
+INTERFACE = 2
+MEMBER = 3
+ERROR_NAME = 4
+REPLY_SERIAL = 5
+DESTINATION = 6
+SENDER = 7
+SIGNATURE = 8
+HEADER_FIELD_TYPES = {PATH: 'o', INTERFACE: 's', MEMBER: 's', ERROR_NAME: 's', REPLY_SERIAL: 'u',
+                      DESTINATION: 's', SENDER: 's', SIGNATURE: 'g'}
+
+# fixed part of header and length of header fields array
+HEADER_START = struct.Struct('<BBBBIII')
+MAX_MESSAGE_SIZE = 128 * 1024 * 1024
+
+ALIGNMENTS = {'y': 1, 'b': 4, 'n': 2, 'q': 2, 'i': 4, 'u': 4, 'x': 8, 't': 8, 'd': 8, 'h': 4,
+              's': 4, 'o': 4, 'g': 1, 'a': 4, '(': 8, '{': 8, 'v': 1}
+FORMATS = {'y': 'B', 'b': 'I', 'n': 'h', 'q': 'H', 'i': 'i', 'u': 'I', 'x': 'q', 't': 'Q', 'd': 'd', 'h': 'I'}
+
+
+class DBusError(Exception):
+    pass
+
+
+# end of single complete type starting at given index of signature
+def type_end(signature, start):
+    if signature[start] == 'a':
+        return type_end(signature, start + 1)
+    if signature[start] in '({':
+        depth = 0
+        for i in range(start, len(signature)):
+            if signature[i] in '({':
+                depth += 1
+            elif signature[i] in ')}':
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        raise DBusError("unbalanced signature '%s'" % signature)
+    return start + 1
+
+
+# signature split into complete types, e.g. 'sa{sv}i' -> ['s', 'a{sv}', 'i']
+def split_signature(signature):
+    types = []
+    start = 0
+    while start < len(signature):
+        end = type_end(signature, start)
+        types.append(signature[start:end])
+        start = end
+    return types
+
+
+# marshals values into buffer, alignment is counted from buffer start, which is message or 8 aligned body start
+class Writer(object):
+    def __init__(self):
+        self.data = bytearray()
+
+    def align(self, alignment):
+        self.data.extend(b'\0' * (-len(self.data) % alignment))
+
+    def write(self, signature, value):
+        code = signature[0]
+        if code in FORMATS:
+            self.align(ALIGNMENTS[code])
+            self.data.extend(struct.pack('<' + FORMATS[code], value))
+        elif code in 'so':
+            encoded = value.encode('utf-8')
+            self.write('u', len(encoded))
+            self.data.extend(encoded + b'\0')
+        elif code == 'g':
+            encoded = value.encode('ascii')
+            self.write('y', len(encoded))
+            self.data.extend(encoded + b'\0')
+        elif code == 'v':
+            self.write('g', value[0])
+            self.write(value[0], value[1])
+        elif code == 'a':
+            self.write('u', 0)
+            length_offset = len(self.data) - 4
+            element = signature[1:]
+            # padding before first element isn't part of array length
+            self.align(ALIGNMENTS[element[0]])
+            start = len(self.data)
+            for item in (value.items() if element[0] == '{' else value):
+                self.write(element, item)
+            struct.pack_into('<I', self.data, length_offset, len(self.data) - start)
+        elif code in '({':
+            self.align(8)
+            for item_signature, item in zip(split_signature(signature[1:-1]), value):
+                self.write(item_signature, item)
+        else:
+            raise DBusError("unsupported type '%s'" % code)
+
+    def write_all(self, signature, values):
+        for item_signature, value in zip(split_signature(signature), values):
+            self.write(item_signature, value)
+
+
+# unmarshals values from buffer of given byte order
+class Reader(object):
+    def __init__(self, data, offset=0, byte_order='<'):
+        self.data = data
+        self.offset = offset
+        self.byte_order = byte_order
+
+    def align(self, alignment):
+        self.offset += -self.offset % alignment
+
+    def read(self, signature):
+        code = signature[0]
+        if code in FORMATS:
+            self.align(ALIGNMENTS[code])
+            value = struct.unpack_from(self.byte_order + FORMATS[code], self.data, self.offset)[0]
+            self.offset += struct.calcsize(FORMATS[code])
+            return value
+        if code in 'so':
+            length = self.read('u')
+            value = bytes(self.data[self.offset:self.offset + length]).decode('utf-8')
+            self.offset += length + 1
+            return value
+        if code == 'g':
+            length = self.read('y')
+            value = bytes(self.data[self.offset:self.offset + length]).decode('ascii')
+            self.offset += length + 1
+            return value
+        if code == 'v':
+            return self.read(self.read('g'))
+        if code == 'a':
+            end = self.read('u')
+            element = signature[1:]
+            self.align(ALIGNMENTS[element[0]])
+            end += self.offset
+            items = []
+            while self.offset < end:
+                items.append(self.read(element))
+            return dict(items) if element[0] == '{' else items
+        if code in '({':
+            self.align(8)
+            return tuple(self.read(item_signature) for item_signature in split_signature(signature[1:-1]))
+        raise DBusError("unsupported type '%s'" % code)
+
+    def read_all(self, signature):
+        return tuple(self.read(item_signature) for item_signature in split_signature(signature))
+
+
+# one D-Bus message, fields by header field code
+class Message(object):
+    __slots__ = ('type', 'flags', 'serial', 'fields', 'body')
+
+    def __init__(self, message_type, serial, fields, body=(), flags=0):
+        self.type = message_type
+        self.flags = flags
+        self.serial = serial
+        self.fields = fields
+        self.body = body
+
+    def encode(self):
+        signature = self.fields.get(SIGNATURE, '')
+        body = Writer()
+        body.write_all(signature, self.body)
+        header = Writer()
+        header.write_all('yyyyuu', (ord('l'), self.type, self.flags, 1, len(body.data), self.serial))
+        header.write('a(yv)', [(code, (HEADER_FIELD_TYPES[code], value))
+                               for code, value in sorted(self.fields.items())])
+        header.align(8)
+        return bytes(header.data + body.data)
+
+    def __repr__(self):
+        return 'Message(%s, %s, %s, %r)' % (self.type, self.serial, self.fields, self.body)
+
+
+# bytes of whole message, given its first HEADER_START.size bytes
+def message_size(start):
+    byte_order = '<' if start[0:1] == b'l' else '>'
+    body_length, serial, fields_length = struct.unpack_from(byte_order + 'III', start, 4)
+    header_length = HEADER_START.size + fields_length
+    size = header_length + (-header_length % 8) + body_length
+    if size > MAX_MESSAGE_SIZE:
+        raise DBusError('message too long')
+    return size
+
+
+def decode_message(data):
+    byte_order = '<' if data[0:1] == b'l' else '>'
+    reader = Reader(data, 1, byte_order)
+    message_type, flags, version, body_length, serial = reader.read_all('yyyuu')
+    fields = dict(reader.read('a(yv)'))
+    reader.align(8)
+    body = reader.read_all(fields.get(SIGNATURE, ''))
+    return Message(message_type, serial, fields, body, flags)
+
+
+# read exactly given number of bytes from blocking socket
+def receive_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise DBusError('connection closed')
+        data += chunk
+    return data
+
+
+def read_message(sock):
+    start = receive_exactly(sock, HEADER_START.size)
+    return decode_message(start + receive_exactly(sock, message_size(start) - len(start)))
+
+
+# socket address of session bus, None when there's no bus
+def session_bus_address(environ=None):
+    environ = os.environ if environ is None else environ
+    for address in environ.get('DBUS_SESSION_BUS_ADDRESS', '').split(';'):
+        transport, sep, options = address.partition(':')
+        if transport != 'unix':
+            continue
+        options = dict(option.partition('=')[::2] for option in options.split(','))
+        if options.get('path'):
+            return options['path']
+        if options.get('abstract'):
+            return '\0' + options['abstract']
+    # systemd user bus
+    runtime_bus = os.path.join(environ.get('XDG_RUNTIME_DIR', '/run/user/%d' % os.getuid()), 'bus')
+    if os.path.exists(runtime_bus):
+        return runtime_bus
+    return None
+
+
+# connect to bus and authenticate as this user
+def connect(address, timeout):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+        uid = binascii.hexlify(str(os.getuid()).encode('ascii'))
+        sock.sendall(b'\0AUTH EXTERNAL ' + uid + b'\r\n')
+        reply = b''
+        while not reply.endswith(b'\r\n'):
+            chunk = sock.recv(256)
+            if not chunk:
+                raise DBusError('connection closed during authentication')
+            reply += chunk
+        if not reply.startswith(b'OK '):
+            raise DBusError('authentication failed: %s' % reply.strip().decode('ascii', 'replace'))
+        sock.sendall(b'BEGIN\r\n')
+    except Exception:
+        sock.close()
+        raise
+    return sock
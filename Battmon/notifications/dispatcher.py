@@ -0,0 +1,164 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Notifications are sent by worker thread, so battery checks never wait for sound or popup. Every category has
+# at most one pending notification, newer one of the same category replaces it, e.g. flapping ac ends as one
+# popup of the latest battery state. Notifications of one category are sent at most once per rate limit
+# interval, ones coming sooner wait for it and are coalesced too. Notification can be queued with delay, e.g.
+# until time left is known, it doesn't hold other categories meanwhile.
+
+import collections
+import threading
+
+# local imports
+from values import internal_config, read_battery_values
+
+
+# pending notification, action of monitor with battery snapshot it was created for, it isn't sent before
+# not_before time
+class PendingNotification(object):
+    __slots__ = ('action', 'battery', 'submitted', 'not_before')
+
+    def __init__(self, action, battery, submitted, not_before):
+        self.action = action
+        self.battery = battery
+        self.submitted = submitted
+        self.not_before = not_before
+
+
+# bounded queue of notifications with one worker thread, started on first notification, so it's
+# started after Battmon forks in background
+class NotificationDispatcher(object):
+    def __init__(self, send, rate_limit=internal_config.DEFAULT_NOTIFICATION_RATE_LIMIT,
+                 max_pending=internal_config.DEFAULT_NOTIFICATION_QUEUE_SIZE, rate_limits=None, critical=(),
+                 category=None, debug=False):
+        # send(action, battery) called from worker thread
+        self.__send = send
+        self.__rate_limit = rate_limit
+        # rate limit of actions, which differ from default one, e.g. minimal level isn't limited
+        self.__rate_limits = {'minimal_battery_level': 0} if rate_limits is None else rate_limits
+        # actions, which full queue drops only when all pending ones are critical
+        self.__critical = critical
+        # category(action) of notifications replacing each other, every action is its own category by default
+        self.__category = category or (lambda action: action)
+        self.__max_pending = max_pending
+        self.__debug = debug
+        self.__pending = collections.OrderedDict()
+        self.__last_sent = {}
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__closed = False
+
+        self.submitted = 0
+        self.sent = 0
+        # replaced by newer notification of the same category before they were sent
+        self.coalesced = 0
+        # thrown away, because queue was full
+        self.dropped = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    # number of notifications waiting to be sent
+    def depth(self):
+        return len(self.__pending)
+
+    # queue notification without waiting, it's sent after delay in seconds at soonest, newer one of the same
+    # category replaces pending one
+    def submit(self, action, battery, delay=0):
+        now = read_battery_values.monotonic()
+        category = self.__category(action)
+        with self.__condition:
+            self.submitted += 1
+            if category in self.__pending:
+                # keeps its place in queue, only content is the latest
+                self.coalesced += 1
+                self.__pending[category] = PendingNotification(action, battery, self.__pending[category].submitted,
+                                                               now + delay)
+            else:
+                if len(self.__pending) >= self.__max_pending:
+                    self.__drop()
+                self.__pending[category] = PendingNotification(action, battery, now, now + delay)
+            self.max_depth = max(self.max_depth, len(self.__pending))
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='notification dispatcher')
+                self.__thread.daemon = True
+                self.__thread.start()
+            self.__condition.notify()
+
+    # drop oldest pending notification, critical one only when there's no other
+    def __drop(self):
+        self.dropped += 1
+        for category, notification in self.__pending.items():
+            if notification.action not in self.__critical:
+                del self.__pending[category]
+                return
+        self.__pending.popitem(last=False)
+
+    # earliest time when pending notification of category can be sent, rate limit of its action is counted from
+    # last notification of the same category
+    def __ready_time(self, category):
+        notification = self.__pending[category]
+        last = self.__last_sent.get(category)
+        if last is None:
+            return notification.not_before
+        return max(notification.not_before, last + self.__rate_limits.get(notification.action, self.__rate_limit))
+
+    # next pending notification, which its delay and rate limit allow to send, None after close
+    def __next(self):
+        with self.__condition:
+            while not self.__closed:
+                now = read_battery_values.monotonic()
+                # the same ready time goes in submit order
+                ready = [(self.__ready_time(category), notification.submitted, category)
+                         for category, notification in self.__pending.items()]
+                if ready:
+                    ready_time, submitted, category = min(ready)
+                    if ready_time <= now:
+                        self.__last_sent[category] = now
+                        return self.__pending.pop(category)
+                    self.__condition.wait(ready_time - now)
+                else:
+                    self.__condition.wait()
+            return None
+
+    def __run(self):
+        while True:
+            notification = self.__next()
+            if notification is None:
+                return
+            if self.__debug:
+                print("DEBUG: Sending '%s' notification %.3f ms after it was queued"
+                      % (notification.action, (read_battery_values.monotonic() - notification.submitted) * 1000))
+            try:
+                self.__send(notification.action, notification.battery)
+                self.sent += 1
+            except Exception as e:
+                # one broken notification mustn't stop all following ones
+                self.failed += 1
+                print("Error: can't send '%s' notification: %s" % (notification.action, e))
+
+    # counters as one line
+    def summary(self):
+        return ("notifications: %s queued, %s sent, %s coalesced, %s dropped, %s failed, queue depth %s (max %s)"
+                % (self.submitted, self.sent, self.coalesced, self.dropped, self.failed, self.depth(), self.max_depth))
+
+    # stop worker, pending notifications are thrown away
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        if self.__thread is not None:
+            self.__thread.join()
@@ -0,0 +1,130 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Popup notifications. Battmon keeps one connection to session bus and calls
+# org.freedesktop.Notifications.Notify itself, notifications with the same replace key replace previous popup
+# instead of stacking up. notify-send is spawned only when there's no bus or notification server.
+
+import socket
+import threading
+
+# local imports
+from values import internal_config
+from notifications import dbus_message
+
+NOTIFICATIONS_NAME = 'org.freedesktop.Notifications'
+NOTIFICATIONS_PATH = '/org/freedesktop/Notifications'
+NOTIFY_SIGNATURE = 'susssasa{sv}i'
+# seconds to wait for bus or notification server
+DBUS_TIMEOUT = 2
+
+
+# notifications by spawning notify-send, can't replace previous popup
+class NotifySendNotifier(object):
+    def __init__(self, command, spawn):
+        # path of notify-send, or function finding it when it's first needed
+        self.__command = command
+        # spawn of process manager
+        self.__spawn = spawn
+
+    def notify(self, summary, body='', timeout=-1, replace=None):
+        if callable(self.__command):
+            self.__command = self.__command()
+        if self.__command is None:
+            print("Error: can't send notification, notify-send wasn't found")
+            return False
+        return self.__spawn([self.__command, summary, body, '-t', str(timeout), '-a', internal_config.PROGRAM_NAME])
+
+
+# notifications over one session bus connection, opened on first notification and again after it breaks
+class DBusNotifier(object):
+    def __init__(self, address, fallback=None, timeout=DBUS_TIMEOUT):
+        self.__address = address
+        self.__fallback = fallback
+        self.__timeout = timeout
+        self.__socket = None
+        self.__serial = 0
+        # notification id of every replace key
+        self.__ids = {}
+        # notifications are sent from executor threads in asyncio runtime
+        self.__lock = threading.Lock()
+
+    def __connect(self):
+        self.__socket = dbus_message.connect(self.__address, self.__timeout)
+        self.__call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'Hello', '', ())
+
+    # call method and wait for its reply, signals and other messages are skipped
+    def __call(self, destination, path, interface, member, signature, body):
+        self.__serial += 1
+        fields = {dbus_message.PATH: path, dbus_message.INTERFACE: interface, dbus_message.MEMBER: member,
+                  dbus_message.DESTINATION: destination}
+        if signature:
+            fields[dbus_message.SIGNATURE] = signature
+        self.__socket.sendall(dbus_message.Message(dbus_message.METHOD_CALL, self.__serial, fields, body).encode())
+        while True:
+            reply = dbus_message.read_message(self.__socket)
+            if reply.fields.get(dbus_message.REPLY_SERIAL) != self.__serial:
+                continue
+            if reply.type == dbus_message.ERROR:
+                raise dbus_message.DBusError('%s: %s' % (reply.fields.get(dbus_message.ERROR_NAME),
+                                                         reply.body[0] if reply.body else ''))
+            return reply.body
+
+    def close(self):
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+    def __notify(self, summary, body, timeout, replace):
+        if self.__socket is None:
+            self.__connect()
+        reply = self.__call(NOTIFICATIONS_NAME, NOTIFICATIONS_PATH, NOTIFICATIONS_NAME, 'Notify', NOTIFY_SIGNATURE,
+                            (internal_config.PROGRAM_NAME, self.__ids.get(replace, 0), '', summary, body, [], {},
+                             timeout))
+        if replace is not None:
+            self.__ids[replace] = reply[0]
+
+    # show notification, replace previous one with the same replace key, timeout in ms, -1 is server default
+    def notify(self, summary, body='', timeout=-1, replace=None):
+        with self.__lock:
+            # connection may be closed by bus restart, so try once more on new one
+            for attempt in range(2):
+                try:
+                    self.__notify(summary, body, timeout, replace)
+                    return True
+                except (socket.error, IOError, OSError, dbus_message.DBusError) as e:
+                    error = e
+                    self.close()
+        if self.__fallback is not None:
+            return self.__fallback.notify(summary, body, timeout, replace)
+        print("Error: can't send notification: %s" % error)
+        return False
+
+
+# session bus notifier falling back to notify-send, only notify-send without bus, None when there's neither,
+# find_notify_send() returns path of notify-send, with session bus it's called only when bus fails
+def create_notifier(find_notify_send=None, spawn=None):
+    address = dbus_message.session_bus_address()
+    if find_notify_send is None or spawn is None:
+        fallback = None
+    elif address is None:
+        notify_send = find_notify_send()
+        fallback = NotifySendNotifier(notify_send, spawn) if notify_send else None
+    else:
+        fallback = NotifySendNotifier(find_notify_send, spawn)
+    if address is None:
+        return fallback
+    return DBusNotifier(address, fallback)
@@ -0,0 +1,267 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Sounds played without spawning player for every beep. Wave files are decoded once, PCM scaled to every used
+# volume level is cached, and beeps are written to one long-lived player reading raw PCM from pipe, which is
+# started by process manager on first beep and again when it dies. Pipe is written without blocking, player
+# which doesn't read beep in time is killed, so stuck sound server never holds minimal level countdown.
+# Volume scaling is done with NumPy when it's installed, with audioop otherwise.
+
+import array
+import errno
+import fcntl
+import math
+import os
+import select
+import socket
+import sys
+import threading
+import warnings
+import wave
+
+# local imports
+from values import internal_config, read_battery_values
+
+# short playback buffer of player, so beep starts at once
+PLAYER_LATENCY_MS = 100
+# silence after every beep, pushes its end through player buffers
+SILENCE_MS = 100
+# seconds player may fall behind beep it's playing, before it's killed
+PLAYER_WRITE_TIMEOUT = 2
+
+
+# decoded wave file, format is (frame rate, channels, sample width)
+class Clip(object):
+    __slots__ = ('format', 'frames')
+
+    def __init__(self, clip_format, frames):
+        self.format = clip_format
+        self.frames = frames
+
+
+def load_clip(path):
+    clip_file = wave.open(path, 'rb')
+    try:
+        if clip_file.getsampwidth() != 2:
+            raise ValueError('only 16 bit wave files are supported')
+        return Clip((clip_file.getframerate(), clip_file.getnchannels(), clip_file.getsampwidth()),
+                    clip_file.readframes(clip_file.getnframes()))
+    finally:
+        clip_file.close()
+
+
+# NumPy takes longer to import than whole Battmon, so it's imported only when sound is scaled, None without it
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+# audioop scales whole PCM at once without NumPy, it's deprecated since python 3.11 and gone in 3.13, None without it
+def import_audioop():
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            import audioop
+    except ImportError:
+        return None
+    return audioop
+
+
+# 16 bit little endian PCM multiplied by factor, rounded down and clipped like audioop does it
+def scale_pcm(frames, factor, use_numpy=True, use_audioop=True):
+    numpy = import_numpy() if use_numpy else None
+    if numpy is not None:
+        samples = numpy.floor(numpy.frombuffer(frames, dtype='<i2') * float(factor))
+        return numpy.clip(samples, -32768, 32767).astype('<i2').tobytes()
+    audioop = import_audioop() if use_audioop and sys.byteorder == 'little' else None
+    if audioop is not None:
+        return audioop.mul(frames, 2, factor)
+    samples = array.array('h')
+    samples.frombytes(frames) if hasattr(samples, 'frombytes') else samples.fromstring(frames)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    scaled = array.array('h', [max(-32768, min(32767, int(math.floor(sample * factor)))) for sample in samples])
+    if sys.byteorder == 'big':
+        scaled.byteswap()
+    return scaled.tobytes() if hasattr(scaled, 'tobytes') else scaled.tostring()
+
+
+# volume level 1-17 as amplitude factor of player, sound command of sox play multiplies amplitude by level
+# (play -v<level>), paplay --volume sets level * 3855 of 65535
+def volume_factor(player, volume):
+    volume = max(0, min(volume, internal_config.MAX_SOUND_VOLUME_LEVEL))
+    if os.path.basename(player) == 'play':
+        return float(volume)
+    return volume / float(internal_config.MAX_SOUND_VOLUME_LEVEL)
+
+
+# pulseaudio (or pipewire-pulse) server of this user accepts connections, paplay can't play without it
+def pulse_server_running(environ=None):
+    environ = os.environ if environ is None else environ
+    if environ.get('PULSE_SERVER'):
+        return True
+    path = os.path.join(environ.get('XDG_RUNTIME_DIR') or '/run/user/%d' % os.getuid(), 'pulse', 'native')
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        client.close()
+
+
+# player command reading raw PCM of given format from stdin, None for unknown players
+def player_command(player, clip_format):
+    rate, channels, width = clip_format
+    name = os.path.basename(player)
+    if name in ('paplay', 'pacat'):
+        return [player, '--raw', '--format=s16le', '--rate=%d' % rate, '--channels=%d' % channels,
+                '--latency-msec=%d' % PLAYER_LATENCY_MS]
+    if name == 'play':
+        return [player, '-q', '-t', 'raw', '-r', str(rate), '-e', 'signed', '-b', '16', '-c', str(channels),
+                '-L', '-']
+    if name == 'aplay':
+        return [player, '-q', '-t', 'raw', '-f', 'S16_LE', '-r', str(rate), '-c', str(channels)]
+    return None
+
+
+# write all data to non-blocking file descriptor, False when it isn't written until deadline
+def write_until(fd, data, deadline):
+    data = memoryview(data)
+    while data:
+        left = deadline - read_battery_values.monotonic()
+        if left <= 0:
+            return False
+        select.select([], [fd], [], left)
+        try:
+            data = data[os.write(fd, data):]
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                raise
+    return True
+
+
+# decoded sounds and one player process for every sound format
+class SoundEngine(object):
+    def __init__(self, player, processes):
+        self.__player = player
+        # players are started by process manager, so they're reaped and killed like every other command
+        self.__processes = processes
+        self.__clips = {}
+        # scaled PCM of (path, volume)
+        self.__buffers = {}
+        self.__players = {}
+        # beeps come from notification worker and minimal level countdown
+        self.__lock = threading.Lock()
+        self.spawns = 0
+
+    # decode sound file, so first beep doesn't wait for it
+    def load(self, path):
+        clip = self.__clips.get(path)
+        if clip is None:
+            clip = load_clip(path)
+            if player_command(self.__player, clip.format) is None:
+                raise ValueError("%s can't play raw sound" % self.__player)
+            self.__clips[path] = clip
+        return clip
+
+    def __buffer(self, path, volume):
+        key = (path, volume)
+        data = self.__buffers.get(key)
+        if data is None:
+            clip = self.load(path)
+            rate, channels, width = clip.format
+            silence = b'\0' * (rate * SILENCE_MS // 1000 * channels * width)
+            data = self.__buffers[key] = scale_pcm(clip.frames, volume_factor(self.__player, volume)) + silence
+        return data
+
+    # running player of sound format, None when it can't be started
+    def __child(self, clip_format):
+        child = self.__players.get(clip_format)
+        if child is not None and child.done.is_set():
+            self.__stop(clip_format)
+            child = None
+        if child is None:
+            # player runs as long as Battmon, so it isn't counted against limit of short commands
+            child = self.__processes.spawn_pipe(player_command(self.__player, clip_format), required=True)
+            if child is None:
+                return None
+            fd = child.process.stdin.fileno()
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+            self.__players[clip_format] = child
+            self.spawns += 1
+        return child
+
+    # close pipe of player and kill it, process manager reaps it
+    def __stop(self, clip_format):
+        child = self.__players.pop(clip_format, None)
+        if child is not None:
+            try:
+                child.process.stdin.close()
+            except (IOError, OSError):
+                pass
+            self.__processes.kill(child)
+
+    # write beep to player, False when it can't be played, e.g. player exits at once without sound server or
+    # doesn't read beep until its length and PLAYER_WRITE_TIMEOUT pass
+    def play(self, path, volume):
+        with self.__lock:
+            try:
+                data = self.__buffer(path, volume)
+            except (IOError, OSError, EOFError, ValueError, wave.Error):
+                return False
+            clip_format = self.__clips[path].format
+            rate, channels, width = clip_format
+            length = len(data) / float(rate * channels * width)
+            deadline = read_battery_values.monotonic() + length + PLAYER_WRITE_TIMEOUT
+            # player may have died since last beep, so try once more with new one
+            for attempt in range(2):
+                child = self.__child(clip_format)
+                if child is None:
+                    return False
+                try:
+                    if write_until(child.process.stdin.fileno(), data, deadline):
+                        return True
+                    print("Error: '%s' doesn't play, killing it" % ' '.join(child.argv))
+                    self.__stop(clip_format)
+                    return False
+                except (IOError, OSError):
+                    self.__stop(clip_format)
+            return False
+
+    def close(self):
+        with self.__lock:
+            for clip_format in list(self.__players):
+                self.__stop(clip_format)
+
+
+# sound engine for player started by process manager, with given sound files decoded, None when player or files
+# can't be used
+def create_sound_engine(player, paths, processes):
+    if not player or player_command(player, (44100, 2, 2)) is None:
+        return None
+    engine = SoundEngine(player, processes)
+    try:
+        for path in paths:
+            engine.load(path)
+    except (IOError, OSError, EOFError, ValueError, wave.Error) as e:
+        print("Error: can't load sound %s: %s, sound command is used instead" % (path, e))
+        return None
+    return engine
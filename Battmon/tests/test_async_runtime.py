@@ -0,0 +1,107 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+# local imports
+from values.read_battery_values import BatterySnapshot
+from monitor import async_runtime, power_supply_events, state_machine
+
+
+class Stop(Exception):
+    pass
+
+
+# battery values returning snapshot set by test
+class FakeBatteryValues(object):
+    def __init__(self, battery):
+        self.battery = battery
+
+    def snapshot(self):
+        return self.battery
+
+
+# run runtime until stop(states) returns True after published state, return notified actions and run steps
+def run_runtime(battery, steps, stop):
+    values = FakeBatteryValues(battery)
+    events = power_supply_events.LocalEventSource()
+    notified = []
+    states = []
+
+    def publish(state, battery):
+        states.append(state)
+        if stop(states):
+            raise Stop()
+
+    runtime = async_runtime.AsyncRuntime(values, events, lambda events: None,
+                                         state_machine.BatteryStateMachine(23, 7, 3), lambda battery: 0.02,
+                                         lambda action, battery: notified.append(action), lambda: steps(values),
+                                         0, 0.01, lambda by_event: None, publish, False)
+    try:
+        with pytest.raises(Stop):
+            runtime.run()
+    finally:
+        events.close()
+    return notified, states
+
+
+# ac plugged after first countdown step, the rest of countdown never runs
+def test_countdown_aborted_when_ac_plugged():
+    done = []
+
+    def plug_ac(battery, values):
+        done.append('warning')
+        values.battery = BatterySnapshot(True, True, 'Charging', 2)
+
+    def steps(values):
+        return [(0, lambda battery: plug_ac(battery, values)), (0.2, lambda battery: done.append('command'))]
+
+    notified, states = run_runtime(BatterySnapshot(True, False, 'Discharging', 2), steps,
+                                   lambda states: states.count(state_machine.CHARGING) >= 5)
+    assert done == ['warning']
+    assert notified == ['minimal_battery_level', 'battery_charging']
+    assert states[0] == state_machine.MINIMAL
+
+
+# charger, which isn't Mains (e.g. USB-C), shows up only as battery status, it stops countdown too
+def test_countdown_aborted_when_charging_without_ac():
+    done = []
+
+    def plug_charger(battery, values):
+        done.append('warning')
+        values.battery = BatterySnapshot(True, False, 'Charging', 2)
+
+    def steps(values):
+        return [(0, lambda battery: plug_charger(battery, values)), (0.2, lambda battery: done.append('command'))]
+
+    notified, states = run_runtime(BatterySnapshot(True, False, 'Discharging', 2), steps,
+                                   lambda states: states.count(state_machine.CHARGING) >= 5)
+    assert done == ['warning']
+    assert notified == ['minimal_battery_level', 'battery_charging']
+
+
+# minimal level notification is queued once, while countdown runs again after it's over
+def test_minimal_notification_sent_once():
+    done = []
+
+    def steps(values):
+        return [(0.01, lambda battery: done.append('command'))]
+
+    notified, states = run_runtime(BatterySnapshot(True, False, 'Discharging', 2), steps,
+                                   lambda states: len(done) >= 3)
+    assert notified == ['minimal_battery_level']
+    assert set(states) == set([state_machine.MINIMAL])
@@ -0,0 +1,168 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+# local imports
+from benchmarks.fake_notification_server import FakeNotificationServer
+from notifications import dbus_message, notifier
+from notifications.dbus_message import Message, Reader, Writer
+
+
+# notification replaced by fallback, instead of spawning notify-send
+class RecordingNotifier(object):
+    def __init__(self):
+        self.notifications = []
+
+    def notify(self, summary, body='', timeout=-1, replace=None):
+        self.notifications.append((summary, body, timeout, replace))
+        return True
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = FakeNotificationServer(str(tmp_path / 'bus'))
+    server.start()
+    yield server
+    server.close()
+
+
+def test_split_signature():
+    assert dbus_message.split_signature(notifier.NOTIFY_SIGNATURE) == ['s', 'u', 's', 's', 's', 'as', 'a{sv}', 'i']
+    assert dbus_message.split_signature('a(yv)ya{s(ii)}') == ['a(yv)', 'y', 'a{s(ii)}']
+
+
+def test_unbalanced_signature():
+    with pytest.raises(dbus_message.DBusError):
+        dbus_message.split_signature('a(yv')
+
+
+# variants are written as (signature, value) pairs and read as plain values
+def test_notify_body_roundtrip():
+    body = ('Battmon', 7, '', 'Battery is low', u'10% – 0:30 left', ['default', 'Open'],
+            {'urgency': ('y', 2), 'category': ('s', 'device')}, -1)
+    writer = Writer()
+    writer.write_all(notifier.NOTIFY_SIGNATURE, body)
+    assert Reader(bytes(writer.data)).read_all(notifier.NOTIFY_SIGNATURE) == (
+        'Battmon', 7, '', 'Battery is low', u'10% – 0:30 left', ['default', 'Open'],
+        {'urgency': 2, 'category': 'device'}, -1)
+
+
+# padding before first 8 aligned element isn't counted in array length
+def test_array_alignment():
+    writer = Writer()
+    writer.write_all('ya(yv)', (1, [(3, ('s', 'x'))]))
+    # byte, padding, array length, struct at offset 8
+    assert bytes(writer.data[:8]) == b'\x01\0\0\0\x0a\0\0\0'
+    assert len(writer.data) == 8 + 10
+    assert Reader(bytes(writer.data)).read_all('ya(yv)') == (1, [(3, 'x')])
+
+
+def test_empty_arrays():
+    writer = Writer()
+    writer.write_all('asa{sv}u', ([], {}, 5))
+    assert Reader(bytes(writer.data)).read_all('asa{sv}u') == ([], {}, 5)
+
+
+def test_message_roundtrip():
+    fields = {dbus_message.PATH: notifier.NOTIFICATIONS_PATH, dbus_message.INTERFACE: notifier.NOTIFICATIONS_NAME,
+              dbus_message.MEMBER: 'Notify', dbus_message.DESTINATION: notifier.NOTIFICATIONS_NAME,
+              dbus_message.SIGNATURE: notifier.NOTIFY_SIGNATURE}
+    data = Message(dbus_message.METHOD_CALL, 3, fields,
+                   ('Battmon', 0, '', 'Charging', '', [], {}, 6000)).encode()
+    assert len(data) == dbus_message.message_size(data[:dbus_message.HEADER_START.size])
+    message = dbus_message.decode_message(data)
+    assert (message.type, message.serial, message.flags) == (dbus_message.METHOD_CALL, 3, 0)
+    assert message.fields == fields
+    assert message.body == ('Battmon', 0, '', 'Charging', '', [], {}, 6000)
+
+
+# messages without body have no signature field
+def test_message_without_body():
+    fields = {dbus_message.PATH: '/org/freedesktop/DBus', dbus_message.MEMBER: 'Hello'}
+    message = dbus_message.decode_message(Message(dbus_message.METHOD_CALL, 1, fields).encode())
+    assert message.fields == fields
+    assert message.body == ()
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('unix:path=/run/user/1000/bus', '/run/user/1000/bus'),
+    ('unix:abstract=/tmp/dbus-abc,guid=0123', '\0/tmp/dbus-abc'),
+    # first unix address is used, other transports are skipped
+    ('tcp:host=localhost,port=1234;unix:path=/tmp/bus', '/tmp/bus'),
+])
+def test_session_bus_address(tmp_path, address, expected):
+    environ = {'DBUS_SESSION_BUS_ADDRESS': address, 'XDG_RUNTIME_DIR': str(tmp_path)}
+    assert dbus_message.session_bus_address(environ) == expected
+
+
+def test_session_bus_address_runtime_dir(tmp_path):
+    (tmp_path / 'bus').write_text(u'')
+    assert dbus_message.session_bus_address({'XDG_RUNTIME_DIR': str(tmp_path)}) == str(tmp_path / 'bus')
+
+
+def test_no_session_bus(tmp_path):
+    assert dbus_message.session_bus_address({'XDG_RUNTIME_DIR': str(tmp_path)}) is None
+    assert dbus_message.session_bus_address({'DBUS_SESSION_BUS_ADDRESS': 'tcp:host=localhost',
+                                             'XDG_RUNTIME_DIR': str(tmp_path)}) is None
+
+
+def test_notify_replaces_by_key(tmp_path, server):
+    dbus_notifier = notifier.DBusNotifier(str(tmp_path / 'bus'))
+    try:
+        assert dbus_notifier.notify('Battery is low', '10%', 6000, replace='level')
+        assert dbus_notifier.notify('Charging', timeout=3000)
+        assert dbus_notifier.notify('Battery is critical', '5%', 6000, replace='level')
+    finally:
+        dbus_notifier.close()
+    low, charging, critical = server.notifications
+    assert (low.id, low.replaced, low.app_name, low.summary, low.body) == (1, False, 'Battmon', 'Battery is low',
+                                                                           '10%')
+    assert (charging.id, charging.replaced, charging.timeout) == (2, False, 3000)
+    assert (critical.id, critical.replaced, critical.summary) == (1, True, 'Battery is critical')
+
+
+# broken connection is opened again on next notification
+def test_notify_reconnects(tmp_path, server):
+    dbus_notifier = notifier.DBusNotifier(str(tmp_path / 'bus'))
+    try:
+        assert dbus_notifier.notify('first')
+        dbus_notifier.close()
+        assert dbus_notifier.notify('second')
+    finally:
+        dbus_notifier.close()
+    assert [n.summary for n in server.notifications] == ['first', 'second']
+
+
+def test_notify_falls_back_without_server(tmp_path):
+    fallback = RecordingNotifier()
+    dbus_notifier = notifier.DBusNotifier(str(tmp_path / 'bus'), fallback, timeout=0.5)
+    assert dbus_notifier.notify('Battery is low', '10%', 6000, replace='level')
+    assert fallback.notifications == [('Battery is low', '10%', 6000, 'level')]
+
+
+def test_notify_without_server_or_fallback(tmp_path, capsys):
+    assert not notifier.DBusNotifier(str(tmp_path / 'bus'), timeout=0.5).notify('Battery is low')
+    assert "Error: can't send notification" in capsys.readouterr().out
+
+
+def test_notify_send_found_on_first_notification():
+    spawned = []
+    notify_send = notifier.NotifySendNotifier(lambda: '/usr/bin/notify-send', lambda argv: spawned.append(argv) or True)
+    assert not spawned
+    assert notify_send.notify('Charging', 'ac adapter plugged', 3000)
+    assert spawned == [['/usr/bin/notify-send', 'Charging', 'ac adapter plugged', '-t', '3000', '-a', 'Battmon']]
@@ -0,0 +1,140 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import threading
+
+# local imports
+from notifications import battery_notifications
+from notifications.dispatcher import NotificationDispatcher
+from values.read_battery_values import monotonic
+
+RATE_LIMIT = 0.3
+
+
+# dispatcher recording (action, battery, send time) of sent notifications
+class Sent(object):
+    def __init__(self):
+        self.sent = []
+        self.condition = threading.Condition()
+
+    def __call__(self, action, battery):
+        with self.condition:
+            self.sent.append((action, battery, monotonic()))
+            self.condition.notify_all()
+
+    # wait until count notifications are sent, return (action, battery) pairs
+    def wait(self, count, timeout=5):
+        deadline = monotonic() + timeout
+        with self.condition:
+            while len(self.sent) < count and monotonic() < deadline:
+                self.condition.wait(deadline - monotonic())
+        return [(action, battery) for action, battery, sent in self.sent]
+
+
+def dispatcher(sent, **kwargs):
+    return NotificationDispatcher(sent, RATE_LIMIT, category=battery_notifications.notification_category, **kwargs)
+
+
+# flapping ac, battery states replace each other while waiting, so stale one isn't sent after newer one
+def test_latest_battery_state_wins():
+    sent = Sent()
+    notifications = dispatcher(sent)
+    try:
+        notifications.submit('battery_discharging', 1)
+        sent.wait(1)
+        notifications.submit('battery_charging', 2)
+        notifications.submit('battery_charging', 3)
+        notifications.submit('battery_discharging', 4)
+        assert sent.wait(2) == [('battery_discharging', 1), ('battery_discharging', 4)]
+        assert notifications.coalesced == 2
+    finally:
+        notifications.close()
+
+
+# plugged and removed aren't replaced by battery states and go in submit order
+def test_events_are_kept():
+    sent = Sent()
+    notifications = dispatcher(sent)
+    try:
+        notifications.submit('battery_discharging', 1)
+        sent.wait(1)
+        notifications.submit('battery_plugged', 2)
+        notifications.submit('battery_charging', 3)
+        notifications.submit('battery_removed', 4)
+        notifications.submit('no_battery', 5)
+        assert sent.wait(4) == [('battery_discharging', 1), ('battery_plugged', 2), ('battery_removed', 4),
+                                ('no_battery', 5)]
+    finally:
+        notifications.close()
+
+
+# notifications of one category are sent at most once per rate limit, other categories don't wait for it
+def test_rate_limit():
+    sent = Sent()
+    notifications = dispatcher(sent)
+    try:
+        notifications.submit('battery_discharging', 1)
+        sent.wait(1)
+        notifications.submit('battery_charging', 2)
+        notifications.submit('battery_plugged', 3)
+        assert sent.wait(3) == [('battery_discharging', 1), ('battery_plugged', 3), ('battery_charging', 2)]
+        times = [sent_time for action, battery, sent_time in sent.sent]
+        assert times[1] - times[0] < RATE_LIMIT
+        assert times[2] - times[0] >= RATE_LIMIT
+    finally:
+        notifications.close()
+
+
+# minimal level isn't rate limited
+def test_minimal_level_not_limited():
+    sent = Sent()
+    notifications = dispatcher(sent)
+    try:
+        notifications.submit('critical_battery_level', 1)
+        sent.wait(1)
+        notifications.submit('minimal_battery_level', 2)
+        sent.wait(2)
+        times = [sent_time for action, battery, sent_time in sent.sent]
+        assert times[1] - times[0] < RATE_LIMIT
+    finally:
+        notifications.close()
+
+
+# delayed notification doesn't hold other categories
+def test_delay():
+    sent = Sent()
+    notifications = dispatcher(sent)
+    try:
+        notifications.submit('battery_charging', 1, RATE_LIMIT)
+        notifications.submit('battery_plugged', 2)
+        assert sent.wait(2) == [('battery_plugged', 2), ('battery_charging', 1)]
+    finally:
+        notifications.close()
+
+
+# full queue drops oldest non-critical notification
+def test_full_queue_drops_non_critical():
+    sent = Sent()
+    notifications = dispatcher(sent, max_pending=2, critical=battery_notifications.CRITICAL_ACTIONS)
+    try:
+        notifications.submit('battery_charging', 1, RATE_LIMIT)
+        notifications.submit('battery_plugged', 2, RATE_LIMIT)
+        notifications.submit('battery_removed', 3, RATE_LIMIT)
+        assert sent.wait(2) == [('battery_plugged', 2), ('battery_removed', 3)]
+        assert notifications.dropped == 1
+    finally:
+        notifications.close()
@@ -0,0 +1,60 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+# local imports
+from values import history_stats, sample_history
+from values.read_battery_values import BatterySnapshot
+
+START_TIME = 1700000000.0
+STEP = 60
+
+
+# two days of samples a minute: discharge, charge and suspend gaps, power not reported for a while, ring wrapped
+def create_history(path):
+    count = 2 * history_stats.DAY // STEP
+    history = sample_history.SampleHistory(path, count - 100)
+    t = START_TIME
+    for i in range(count):
+        phase = i % 300
+        discharging = phase < 200
+        energy_full = 50000000 - i * 100
+        energy_now = energy_full * (1000 - phase * 4) // 1000 if discharging else energy_full * (200 + phase) // 1000
+        power = 0 if 50 <= phase < 60 else 8000000 + (i % 7) * 100000 + (3000000 if i % 40 == 0 else 0)
+        battery = BatterySnapshot(True, not discharging, 'Discharging' if discharging else 'Charging',
+                                  energy_now=energy_now, energy_full=energy_full, power_now=power,
+                                  energy_full_design=60000000, cycle_count=i // 300)
+        # suspended for an hour in the middle of some sessions
+        t += STEP + (3600 if i % 500 == 100 else 0)
+        history.append(t, battery)
+    history.close()
+
+
+# fallback without numpy computes the same statistics
+def test_numpy_and_arrays_agree(tmp_path):
+    if history_stats.numpy is None:
+        pytest.skip('numpy is not installed')
+    path = str(tmp_path / 'history')
+    create_history(path)
+    buffers = sample_history.load_buffers(path)
+    assert len(buffers) == 2
+    with_numpy = history_stats.history_stats(history_stats.load_columns(buffers, True), True)
+    with_arrays = history_stats.history_stats(history_stats.load_columns(buffers, False), False)
+    assert with_numpy['sessions']
+    assert with_numpy['wear']
+    assert with_numpy == with_arrays
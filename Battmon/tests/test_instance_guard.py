@@ -0,0 +1,69 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import itertools
+import os
+import threading
+
+# local imports
+from monitor import instance_guard
+from monitor.instance_guard import InstanceGuard
+
+
+NAMES = itertools.count()
+
+
+# abstract socket name, which no real Battmon uses, guards are held until tests exit, so every test has its own
+def guard_name():
+    return '\0battmon-test-%d-%d' % (os.getpid(), next(NAMES))
+
+
+def test_second_acquire_fails():
+    name = guard_name()
+    first = InstanceGuard(['-f'], name)
+    assert first.acquire()
+    assert not InstanceGuard(['-f'], name).acquire()
+
+
+def test_send_same_arguments():
+    name = guard_name()
+    guard = InstanceGuard(['-sl', '3'], name)
+    assert guard.acquire()
+    restarts = []
+    guard.start(lambda argv, cwd: restarts.append((argv, cwd)))
+    assert instance_guard.send_arguments(['-sl', '3'], '/tmp', name) == instance_guard.RUNNING
+    assert restarts == []
+
+
+def test_send_different_arguments_restarts():
+    name = guard_name()
+    guard = InstanceGuard(['-sl', '3'], name)
+    assert guard.acquire()
+    restarted = threading.Event()
+    restarts = []
+
+    def on_restart(argv, cwd):
+        restarts.append((argv, cwd))
+        restarted.set()
+    guard.start(on_restart)
+    assert instance_guard.send_arguments(['-sl', '8'], '/tmp', name) == instance_guard.RESTARTING
+    assert restarted.wait(2)
+    assert restarts == [(['-sl', '8'], '/tmp')]
+
+
+def test_send_without_running_battmon():
+    assert instance_guard.send_arguments([], '/tmp', guard_name(), 0.5) is None
@@ -0,0 +1,78 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import pytest
+
+# local imports
+from monitor.poll_scheduler import PollScheduler
+from values.read_battery_values import BatterySnapshot
+
+ENERGY_FULL = 100000000
+# 100 W drains 1% of 100 Wh battery in 36 seconds
+POWER = 100000000
+SECONDS_PER_PERCENT = 36.0
+MIN_INTERVAL = 1
+MAX_INTERVAL = 30
+
+
+def scheduler():
+    return PollScheduler((23, 7, 3), MIN_INTERVAL, MAX_INTERVAL)
+
+
+def battery(capacity, status='Discharging', ac_online=False, power=POWER):
+    return BatterySnapshot(True, ac_online, status, int(capacity), int(capacity * ENERGY_FULL / 100), ENERGY_FULL,
+                           power)
+
+
+def test_far_from_threshold_sleeps_longest():
+    assert scheduler().next_interval(battery(80)) == MAX_INTERVAL
+
+
+# interval shrinks while battery comes closer to threshold, half of time left keeps off estimation errors
+@pytest.mark.parametrize('capacity, interval', [(25, SECONDS_PER_PERCENT / 2), (24.5, SECONDS_PER_PERCENT / 4),
+                                                (24.01, MIN_INTERVAL), (24, MIN_INTERVAL)])
+def test_interval_shrinks_close_to_threshold(capacity, interval):
+    assert scheduler().next_interval(battery(capacity)) == pytest.approx(interval)
+
+
+# after threshold is passed, next one decides and interval grows again
+def test_interval_grows_after_threshold():
+    intervals = [scheduler().next_interval(battery(capacity)) for capacity in (24.2, 23.5, 22, 12)]
+    assert intervals[0] < MAX_INTERVAL
+    assert intervals[1] == MAX_INTERVAL
+    assert intervals[2] == MAX_INTERVAL
+    assert intervals[1:] == sorted(intervals[1:])
+    assert scheduler().next_interval(battery(8.5)) == pytest.approx(SECONDS_PER_PERCENT / 2 * 0.5)
+
+
+# no threshold below minimal one
+def test_below_minimal_level():
+    assert scheduler().time_to_threshold(battery(2)) is None
+    assert scheduler().next_interval(battery(2)) == MAX_INTERVAL
+
+
+def test_charging_until_full():
+    sm = scheduler()
+    assert sm.next_interval(battery(50, 'Charging', True)) == MAX_INTERVAL
+    assert sm.next_interval(battery(98.5, 'Charging', True)) == pytest.approx(SECONDS_PER_PERCENT / 4)
+    assert sm.time_to_threshold(battery(99, 'Full', True)) is None
+
+
+# without power time to threshold can't be known
+def test_unknown_power():
+    assert scheduler().time_to_threshold(battery(24.01, power=0)) is None
+    assert scheduler().next_interval(BatterySnapshot(False, True)) == MAX_INTERVAL
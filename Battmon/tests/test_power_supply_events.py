@@ -0,0 +1,73 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+# local imports
+from monitor import power_supply_events
+from monitor.power_supply_events import parse_uevent
+
+
+# kernel uevent datagram, 'action@devpath' header followed by KEY=value properties, all terminated by \0
+def uevent(action, devpath, **properties):
+    fields = ['%s@%s' % (action, devpath), 'ACTION=%s' % action, 'DEVPATH=%s' % devpath]
+    fields += ['%s=%s' % item for item in sorted(properties.items())]
+    return ('\0'.join(fields) + '\0').encode('ascii')
+
+
+def test_parse_power_supply_change():
+    event = parse_uevent(uevent('change', '/devices/LNXSYSTM:00/PNP0C0A:00/power_supply/BAT0',
+                                SUBSYSTEM='power_supply', POWER_SUPPLY_NAME='BAT0', POWER_SUPPLY_STATUS='Charging',
+                                POWER_SUPPLY_CAPACITY='57'))
+    assert event.action == 'change'
+    assert event.name == 'BAT0'
+    assert event.properties['POWER_SUPPLY_STATUS'] == 'Charging'
+    assert event.properties['POWER_SUPPLY_CAPACITY'] == '57'
+    assert repr(event) == 'change@BAT0'
+
+
+# remove events don't carry power supply properties, name comes from device path
+def test_parse_name_from_devpath():
+    event = parse_uevent(uevent('remove', '/devices/platform/test/power_supply/AC', SUBSYSTEM='power_supply'))
+    assert (event.action, event.name) == ('remove', 'AC')
+
+
+def test_parse_other_subsystem():
+    assert parse_uevent(uevent('add', '/devices/virtual/net/tun0', SUBSYSTEM='net', INTERFACE='tun0')) is None
+
+
+def test_parse_without_properties():
+    assert parse_uevent(b'change@/devices/foo') is None
+    assert parse_uevent(b'') is None
+
+
+# values with '=' keep everything after first one
+def test_parse_value_with_separator():
+    event = parse_uevent(uevent('change', '/power_supply/BAT0', SUBSYSTEM='power_supply', POWER_SUPPLY_NAME='BAT0',
+                                POWER_SUPPLY_MODEL_NAME='a=b'))
+    assert event.properties['POWER_SUPPLY_MODEL_NAME'] == 'a=b'
+
+
+def test_local_event_source():
+    source = power_supply_events.LocalEventSource()
+    try:
+        assert source.wait(0) == []
+        source.push('change', 'AC')
+        source.push('add', 'BAT1')
+        events = source.wait(1)
+        assert [(e.action, e.name) for e in events] == [('change', 'AC'), ('add', 'BAT1')]
+        assert source.wait(0) == []
+    finally:
+        source.close()
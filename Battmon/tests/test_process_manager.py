@@ -0,0 +1,97 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import os
+import time
+
+import pytest
+
+# local imports
+from monitor import process_manager
+from monitor.process_manager import ProcessManager
+
+
+# wait until no child runs
+def wait_idle(processes, timeout=5):
+    deadline = time.time() + timeout
+    while processes.running() and time.time() < deadline:
+        time.sleep(0.01)
+    return processes.running() == 0
+
+
+# children with pidfd are reaped as soon as they exit, not after reap interval
+def test_pidfd_reaping(monkeypatch):
+    if process_manager.open_pidfd(os.getpid()) is None:
+        pytest.skip('pidfd is not available')
+    monkeypatch.setattr(process_manager, 'REAP_INTERVAL', 60)
+    processes = ProcessManager()
+    start = time.time()
+    child = processes.spawn_pipe(['sleep', '0.05'])
+    assert child.pidfd is not None
+    assert child.done.wait(5)
+    assert time.time() - start < 2
+    assert child.process.returncode == 0
+    assert wait_idle(processes)
+    assert (processes.spawned, processes.reaped) == (1, 1)
+
+
+# without pidfd children are checked every reap interval
+def test_reaping_without_pidfd(monkeypatch):
+    monkeypatch.setattr(process_manager, 'open_pidfd', lambda pid: None)
+    monkeypatch.setattr(process_manager, 'REAP_INTERVAL', 0.05)
+    processes = ProcessManager()
+    for i in range(3):
+        assert processes.spawn(['sleep', '0.05'])
+    assert wait_idle(processes)
+    assert processes.reaped == 3
+
+
+def test_timeout_kill():
+    processes = ProcessManager()
+    start = time.time()
+    assert processes.spawn(['sleep', '10'], 0.2)
+    assert wait_idle(processes)
+    assert time.time() - start < 5
+    assert (processes.killed, processes.reaped) == (1, 1)
+
+
+# only max children run at once, required ones always start
+def test_children_limit():
+    processes = ProcessManager(max_children=4)
+    assert all(processes.spawn(['sleep', '10'], 0.5) for i in range(4))
+    assert not processes.spawn(['sleep', '10'], 0.5)
+    assert processes.dropped == 1
+    assert processes.spawn(['sleep', '10'], 0.5, required=True)
+    assert processes.running() == 5
+    assert wait_idle(processes)
+    assert processes.max_running == 5
+
+
+def test_kill_pipe_child():
+    processes = ProcessManager()
+    child = processes.spawn_pipe(['sleep', '10'])
+    processes.kill(child)
+    assert child.done.wait(5)
+    assert child.killed
+    assert wait_idle(processes)
+
+
+def test_missing_command():
+    processes = ProcessManager()
+    assert not processes.spawn(['/nonexistent/battmon-test-command'])
+    assert processes.failed == 1
+    assert processes.running() == 0
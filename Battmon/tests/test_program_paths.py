@@ -0,0 +1,71 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import os
+
+# local imports
+from values.program_paths import ProgramPaths
+
+
+def create_program(directory, name):
+    with open(os.path.join(directory, name), 'w'):
+        pass
+
+
+def program_paths(tmp_path):
+    return ProgramPaths([str(tmp_path / 'bin') + '/'], str(tmp_path / 'cache' / 'programs.json'))
+
+
+# next start takes found and missing programs from cache
+def test_cache_reused(tmp_path):
+    (tmp_path / 'bin').mkdir()
+    create_program(str(tmp_path / 'bin'), 'paplay')
+    programs = program_paths(tmp_path)
+    assert programs.find('paplay') == str(tmp_path / 'bin' / 'paplay')
+    assert programs.find('play') is None
+    programs.save()
+
+    programs = program_paths(tmp_path)
+    assert programs.find('paplay') == str(tmp_path / 'bin' / 'paplay')
+    assert programs.find('play') is None
+    assert (programs.cache_hits, programs.searches) == (2, 0)
+
+
+# installed program changes directory, so whole cache is searched again
+def test_cache_invalidated(tmp_path):
+    (tmp_path / 'bin').mkdir()
+    programs = program_paths(tmp_path)
+    assert programs.find('play') is None
+    programs.save()
+    create_program(str(tmp_path / 'bin'), 'play')
+    os.utime(str(tmp_path / 'bin'), (0, 0))
+
+    programs = program_paths(tmp_path)
+    assert programs.find('play') == str(tmp_path / 'bin' / 'play')
+    assert programs.searches == 1
+
+
+# program looked for after startup is saved too, e.g. notify-send when session bus goes away
+def test_later_lookup_saved(tmp_path):
+    (tmp_path / 'bin').mkdir()
+    programs = program_paths(tmp_path)
+    programs.save()
+    assert programs.find('notify-send') is None
+
+    programs = program_paths(tmp_path)
+    assert programs.find('notify-send') is None
+    assert programs.searches == 0
@@ -0,0 +1,76 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import math
+
+import pytest
+
+# local imports
+from values.rate_estimator import RateEstimator, SampleRing
+
+
+def test_ring_wraps():
+    ring = SampleRing(3)
+    for i in range(5):
+        ring.append(float(i), i * 10, i * 100)
+    assert len(ring) == 3
+    assert ring.newest() == (4.0, 40.0, 400.0)
+    assert ring.oldest() == (2.0, 20.0, 200.0)
+    assert [ring.get(age)[0] for age in range(3)] == [4.0, 3.0, 2.0]
+    with pytest.raises(IndexError):
+        ring.get(3)
+    ring.clear()
+    assert len(ring) == 0
+
+
+# smoothed power moves towards new power by 1 - e^(-dt / time constant)
+def test_ewma_step():
+    estimator = RateEstimator(time_constant=100.0)
+    estimator.add(0.0, 1000000, 10000000, True)
+    assert estimator.power() == 10000000
+    estimator.add(100.0, 990000, 20000000, True)
+    assert estimator.power() == pytest.approx(10000000 + (1 - math.exp(-1)) * 10000000)
+
+
+# constant power after jump is reached after few time constants
+def test_ewma_converges():
+    estimator = RateEstimator(time_constant=60.0)
+    estimator.add(0.0, 1000000, 5000000, True)
+    for i in range(1, 61):
+        estimator.add(i * 10.0, 1000000 - i, 15000000, True)
+    assert estimator.power() == pytest.approx(15000000, rel=0.001)
+
+
+# without reported power it's worked out from energy change over whole ring, old samples drop out as it wraps
+def test_power_from_energy_with_ring_wrap():
+    estimator = RateEstimator(size=4, time_constant=1.0)
+    assert estimator.power() is None
+    # 10 W is 10000000 uW, 10000000 uWh an hour is 2777.7 uWh a second
+    for i in range(10):
+        estimator.add(i * 36.0, 1000000 - i * 100000, 0, True)
+    assert estimator.power() == pytest.approx(10000000)
+
+
+def test_switch_to_charging_starts_again():
+    estimator = RateEstimator()
+    estimator.add(0.0, 1000000, 10000000, True)
+    estimator.add(10.0, 990000, 0, False)
+    assert estimator.power() is None
+    estimator.add(20.0, 1000000, 0, False)
+    assert estimator.power() == pytest.approx(10000 * 3600.0 / 10)
+    estimator.reset()
+    assert estimator.power() is None
@@ -0,0 +1,223 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import os
+
+import pytest
+
+# local imports
+from benchmarks import fake_power_supply
+from values import internal_config, read_battery_values
+from values.read_battery_values import ReadPlan
+
+READERS = ('attribute', 'uevent')
+BATTERY = ('present', 'status')
+
+
+# capacity of fake battery, charge ones lose a bit to rounding
+def fake_capacity(units, capacity):
+    values = fake_power_supply.battery_values(units, capacity)
+    return int(values[units + '_now'] * 100.0 / values[units + '_full'])
+
+
+def test_plan_energy():
+    plan = ReadPlan({'present', 'status', 'energy_now', 'energy_full', 'power_now', 'voltage_now', 'capacity'})
+    assert plan.attributes == BATTERY + ('energy_now', 'energy_full', 'power_now')
+    assert (plan.energy_unit, plan.power_unit) == ('energy', 'power')
+
+
+def test_plan_charge_with_design_voltage():
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'current_now', 'voltage_now'}, 11400000)
+    assert plan.attributes == BATTERY + ('charge_now', 'charge_full', 'current_now', 'voltage_now')
+    assert (plan.energy_unit, plan.power_unit) == ('charge', 'current')
+
+
+# voltage is read only when battery has it
+def test_plan_charge_without_voltage():
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'current_now'})
+    assert plan.attributes == BATTERY + ('charge_now', 'charge_full', 'current_now')
+    # power in uW can't be compared with charge in uAh
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'power_now'})
+    assert plan.attributes == BATTERY + ('charge_now', 'charge_full')
+    assert plan.power_unit == ''
+
+
+def test_plan_capacity_only():
+    plan = ReadPlan({'status', 'capacity'})
+    assert plan.attributes == ('status', 'capacity')
+    assert not plan.has_present
+
+
+def test_snapshot_charge_without_voltage():
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'current_now'})
+    battery = plan.snapshot('BAT0', {'present': '1', 'status': 'Discharging', 'charge_now': '2000000',
+                                     'charge_full': '4000000', 'current_now': '-1000000'}, False)
+    assert battery.capacity == 50
+    # 2000 mAh at 1000 mA
+    assert battery.time_left == 2 * 60 * 60
+
+
+def test_snapshot_charge_with_voltage():
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'current_now', 'voltage_now'})
+    battery = plan.snapshot('BAT0', {'present': '1', 'status': 'Discharging', 'charge_now': '2000000',
+                                     'charge_full': '4000000', 'current_now': '1000000', 'voltage_now': '10000000'},
+                            False)
+    assert battery.capacity == 50
+    assert (battery.energy_now, battery.energy_full, battery.power_now) == (20000000, 40000000, 10000000)
+
+
+def charge_values():
+    return {'present': '1', 'status': 'Discharging', 'charge_now': '2000000', 'charge_full': '4000000',
+            'current_now': '1000000', 'voltage_now': '10000000'}
+
+
+# value which couldn't be read is unknown, not 0
+@pytest.mark.parametrize('name', ['present', 'status', 'charge_now', 'charge_full'])
+def test_snapshot_unknown_value(name):
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'current_now', 'voltage_now'})
+    values = charge_values()
+    values[name] = ''
+    assert plan.snapshot('BAT0', values, False) is None
+
+
+# rate values are often unreadable while rate is unknown, sample is kept and rate is worked out later
+@pytest.mark.parametrize('name', ['current_now', 'voltage_now'])
+def test_snapshot_unknown_rate(name):
+    plan = ReadPlan({'present', 'status', 'charge_now', 'charge_full', 'current_now', 'voltage_now'})
+    plan.snapshot('BAT0', charge_values(), False)
+    values = charge_values()
+    values['charge_now'] = '400000'
+    values[name] = ''
+    battery = plan.snapshot('BAT0', values, False)
+    assert battery.capacity == 10
+    # energy keeps its unit with last known voltage
+    assert (battery.energy_now, battery.energy_full) == (4000000, 40000000)
+    if name == 'current_now':
+        assert battery.power_now == 0
+
+
+def test_snapshot_zero_full_is_unknown():
+    plan = ReadPlan({'present', 'status', 'energy_now', 'energy_full'})
+    assert plan.snapshot('BAT0', {'present': '1', 'status': 'Full', 'energy_now': '0', 'energy_full': '0'},
+                         True) is None
+
+
+def test_snapshot_not_present():
+    plan = ReadPlan({'present', 'status', 'energy_now', 'energy_full'})
+    battery = plan.snapshot('BAT0', {'present': '0', 'status': '', 'energy_now': '', 'energy_full': ''}, True)
+    assert not battery.battery_present
+
+
+def battery_values(root, reader):
+    return read_battery_values.BatteryValues(0, reader, str(root))
+
+
+@pytest.mark.parametrize('reader', READERS)
+@pytest.mark.parametrize('units, missing', [
+    ('energy', ()),
+    ('charge', ()),
+    # charge only battery without any voltage
+    ('charge', ('voltage_now', 'voltage_min_design')),
+    ('energy', ('power_now',)),
+    ('charge', ('current_now', 'charge_full_design')),
+])
+def test_fake_tree_layouts(tmp_path, reader, units, missing):
+    fake_power_supply.create_tree(str(tmp_path), 1, units, missing)
+    battery = battery_values(tmp_path, reader).snapshot()
+    assert battery.battery_present
+    assert not battery.ac_online
+    assert battery.discharging
+    assert battery.capacity == fake_capacity(units, 80)
+    if 'power_now' not in missing and 'current_now' not in missing:
+        assert battery.time_left > 0
+
+
+@pytest.mark.parametrize('reader', READERS)
+def test_two_batteries_combined(tmp_path, reader):
+    fake_power_supply.create_tree(str(tmp_path), 2)
+    fake_power_supply.update_battery(str(tmp_path), 'BAT1', capacity=40)
+    battery = battery_values(tmp_path, reader).snapshot()
+    assert battery.capacity == 60
+    assert [b.name for b in battery.batteries] == ['BAT0', 'BAT1']
+
+
+# write battery with given values left empty, like attribute which read failed
+def write_unknown(root, units, unknown, missing=(), capacity=80):
+    values = fake_power_supply.battery_values(units, capacity, missing=missing)
+    values.update(dict.fromkeys(unknown, ''))
+    fake_power_supply.write_device(os.path.join(str(root), 'BAT0'), values)
+
+
+@pytest.mark.parametrize('reader', READERS)
+@pytest.mark.parametrize('units, unknown', [('energy', ('energy_now',)), ('charge', ('charge_now', 'charge_full')),
+                                            ('energy', ('present',))])
+def test_unknown_value_keeps_previous_sample(tmp_path, reader, units, unknown):
+    fake_power_supply.create_tree(str(tmp_path), 1, units)
+    values = battery_values(tmp_path, reader)
+    first = values.snapshot()
+    write_unknown(tmp_path, units, unknown)
+    battery = values.snapshot()
+    assert battery.battery_present
+    assert battery.capacity == first.capacity
+    # next known value is used again, the same as by reader without any previous sample
+    fake_power_supply.update_battery(str(tmp_path), 'BAT0', units, capacity=50)
+    capacity = values.snapshot().capacity
+    assert capacity != first.capacity
+    assert capacity == battery_values(tmp_path, reader).snapshot().capacity
+
+
+# without previous sample unknown battery is read again, then it's left out until it can be read
+@pytest.mark.parametrize('reader', READERS)
+def test_unknown_value_at_startup(tmp_path, reader, monkeypatch):
+    monkeypatch.setattr(read_battery_values, 'UNKNOWN_VALUES_RETRY_DELAY', 0)
+    fake_power_supply.create_tree(str(tmp_path), 1, 'charge', ('voltage_now', 'voltage_min_design'))
+    write_unknown(tmp_path, 'charge', ('charge_now',), ('voltage_now', 'voltage_min_design'))
+    values = battery_values(tmp_path, reader)
+    assert not values.snapshot().battery_present
+    fake_power_supply.update_battery(str(tmp_path), 'BAT0', 'charge', capacity=30,
+                                     missing=('voltage_now', 'voltage_min_design'))
+    battery = values.snapshot()
+    assert battery.battery_present
+    assert battery.capacity == fake_capacity('charge', 30)
+
+
+# capacity keeps changing while battery can't report its rate
+@pytest.mark.parametrize('reader', READERS)
+@pytest.mark.parametrize('units, unknown', [('energy', ('power_now',)), ('charge', ('current_now', 'voltage_now'))])
+def test_unknown_rate_keeps_capacity_current(tmp_path, reader, units, unknown):
+    fake_power_supply.create_tree(str(tmp_path), 1, units)
+    values = battery_values(tmp_path, reader)
+    assert values.snapshot().capacity == fake_capacity(units, 80)
+    write_unknown(tmp_path, units, unknown, capacity=10)
+    battery = values.snapshot()
+    assert battery.battery_present
+    assert battery.capacity == fake_capacity(units, 10)
+
+
+# idle checks at longest poll interval reuse found devices and their open attribute files
+def test_discovery_not_repeated_at_poll_interval(tmp_path, monkeypatch):
+    fake_power_supply.create_tree(str(tmp_path), 1)
+    clock = [1000.0]
+    monkeypatch.setattr(read_battery_values, 'monotonic', lambda: clock[0])
+    values = read_battery_values.BatteryValues(power_supply_path=str(tmp_path))
+    globs = []
+    glob_glob = read_battery_values.glob.glob
+    monkeypatch.setattr(read_battery_values.glob, 'glob', lambda path: globs.append(path) or glob_glob(path))
+    for i in range(20):
+        clock[0] += internal_config.DEFAULT_POLL_INTERVAL
+        assert values.snapshot().battery_present
+    assert len(globs) <= 1
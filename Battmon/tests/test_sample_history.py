@@ -0,0 +1,92 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+# local imports
+from values import sample_history
+from values.read_battery_values import BatterySnapshot
+
+
+def battery(energy_now, status='Discharging', ac_online=False):
+    return BatterySnapshot(True, ac_online, status, energy_now // 1000, energy_now, 100000, 5000,
+                           energy_full_design=120000, cycle_count=42)
+
+
+def history_path(tmp_path):
+    return str(tmp_path / 'state' / 'history')
+
+
+def test_append_and_read(tmp_path):
+    history = sample_history.SampleHistory(history_path(tmp_path), 4)
+    try:
+        history.append(1.0, battery(80000))
+        history.append(2.0, battery(90000, 'Charging', True))
+        assert len(history) == 2
+        assert list(history.records()) == [(1.0, 80000, 100000, 120000, 5000, 42, 'Discharging', False),
+                                           (2.0, 90000, 100000, 120000, 5000, 42, 'Charging', True)]
+    finally:
+        history.close()
+
+
+# oldest records are overwritten, records stay in order across end of ring
+def test_wrap(tmp_path):
+    history = sample_history.SampleHistory(history_path(tmp_path), 3)
+    try:
+        for i in range(7):
+            history.append(float(i), battery(1000 * i))
+        assert len(history) == 3
+        assert [record[0] for record in history.records()] == [4.0, 5.0, 6.0]
+        assert len(sample_history.load_buffers(history_path(tmp_path))) == 2
+    finally:
+        history.close()
+
+
+# records survive restart, file with other capacity starts again
+def test_reopen(tmp_path):
+    history = sample_history.SampleHistory(history_path(tmp_path), 3)
+    for i in range(4):
+        history.append(float(i), battery(1000 * i))
+    history.close()
+
+    history = sample_history.SampleHistory(history_path(tmp_path), 3)
+    try:
+        assert [record[0] for record in history.records()] == [1.0, 2.0, 3.0]
+        history.append(4.0, battery(4000))
+        assert [record[0] for record in history.records()] == [2.0, 3.0, 4.0]
+    finally:
+        history.close()
+
+    history = sample_history.SampleHistory(history_path(tmp_path), 5)
+    try:
+        assert len(history) == 0
+    finally:
+        history.close()
+
+
+# second Battmon can't write to locked history, it runs without it
+def test_locked_by_other_battmon(tmp_path, capsys):
+    history = sample_history.open_history(history_path(tmp_path), 3)
+    try:
+        assert sample_history.open_history(history_path(tmp_path), 3) is None
+        assert 'used by other Battmon' in capsys.readouterr().out
+        # reading doesn't need lock
+        history.append(1.0, battery(1000))
+        assert list(sample_history.iter_records(sample_history.load_buffers(history_path(tmp_path))))[0][0] == 1.0
+    finally:
+        history.close()
+    history = sample_history.open_history(history_path(tmp_path), 3)
+    assert history is not None
+    history.close()
@@ -0,0 +1,76 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import array
+import sys
+
+import pytest
+
+# local imports
+from notifications import sound_engine
+from values import internal_config
+
+SAMPLES = [-32768, -30000, -3, -1, 0, 1, 3, 30000, 32767]
+
+
+def pcm(samples):
+    data = array.array('h', samples)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+# every way of scaling rounds down and clips the same
+@pytest.mark.parametrize('use_numpy, use_audioop', [(True, True), (False, True), (False, False)])
+@pytest.mark.parametrize('factor, expected', [
+    (0.5, [-16384, -15000, -2, -1, 0, 0, 1, 15000, 16383]),
+    (3, [-32768, -32768, -9, -3, 0, 3, 9, 32767, 32767]),
+])
+def test_scale_pcm(use_numpy, use_audioop, factor, expected):
+    if use_numpy and sound_engine.import_numpy() is None:
+        pytest.skip('numpy is not installed')
+    if not use_numpy and use_audioop and sound_engine.import_audioop() is None:
+        pytest.skip('audioop is not available')
+    assert sound_engine.scale_pcm(pcm(SAMPLES), factor, use_numpy, use_audioop) == pcm(expected)
+
+
+# sox play -v multiplies amplitude, paplay --volume is part of 17 levels
+def test_volume_factor():
+    assert sound_engine.volume_factor('/usr/bin/play', 3) == 3
+    assert sound_engine.volume_factor('/usr/bin/paplay', 3) == 3.0 / internal_config.MAX_SOUND_VOLUME_LEVEL
+    assert sound_engine.volume_factor('/usr/bin/paplay', 100) == 1
+
+
+# process manager, which can't start player, so beep is only prepared
+class NoProcesses(object):
+    def spawn_pipe(self, argv, required=False):
+        return None
+
+
+# PCM is scaled once for every volume
+def test_scaled_pcm_cached(monkeypatch):
+    scaled = []
+    scale_pcm = sound_engine.scale_pcm
+
+    def count_scale(frames, factor, *args):
+        scaled.append(factor)
+        return scale_pcm(frames, factor, *args)
+    monkeypatch.setattr(sound_engine, 'scale_pcm', count_scale)
+    engine = sound_engine.create_sound_engine('paplay', [internal_config.DEFAULT_SOUND_FILE_PATH], NoProcesses())
+    for volume in (3, 3, 10, 3):
+        assert not engine.play(internal_config.DEFAULT_SOUND_FILE_PATH, volume)
+    assert scaled == [3.0 / internal_config.MAX_SOUND_VOLUME_LEVEL, 10.0 / internal_config.MAX_SOUND_VOLUME_LEVEL]
@@ -0,0 +1,121 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+# local imports
+from values.read_battery_values import BatterySnapshot
+from monitor import state_machine
+from monitor.state_machine import (BatteryStateMachine, CHARGING, CRITICAL, DISCHARGING_OK, FULL, LOW, MINIMAL,
+                                   NO_BATTERY)
+
+LOW_VALUE = 23
+CRITICAL_VALUE = 7
+MINIMAL_VALUE = 3
+
+
+def machine():
+    return BatteryStateMachine(LOW_VALUE, CRITICAL_VALUE, MINIMAL_VALUE)
+
+
+def discharging(capacity):
+    return BatterySnapshot(True, False, 'Discharging', capacity)
+
+
+def charging(capacity):
+    return BatterySnapshot(True, True, 'Charging', capacity)
+
+
+# run samples through state machine, list of (state, actions) after every one
+def run(samples, state=None):
+    results = []
+    sm = machine()
+    for battery in samples:
+        state, actions = sm.transition(state, battery)
+        results.append((state, actions))
+    return results
+
+
+def test_classify_levels():
+    sm = machine()
+    assert sm.classify(discharging(80)) == DISCHARGING_OK
+    assert sm.classify(discharging(LOW_VALUE)) == LOW
+    assert sm.classify(discharging(CRITICAL_VALUE)) == CRITICAL
+    assert sm.classify(discharging(MINIMAL_VALUE)) == MINIMAL
+    assert sm.classify(discharging(0)) == MINIMAL
+    assert sm.classify(charging(50)) == CHARGING
+    assert sm.classify(charging(100)) == FULL
+    assert sm.classify(BatterySnapshot(False, True)) == NO_BATTERY
+
+
+def test_first_sample_runs_enter_actions():
+    assert run([discharging(80)]) == [(DISCHARGING_OK, ('battery_discharging',))]
+
+
+def test_same_state_has_no_actions():
+    assert run([discharging(80), discharging(70)])[1] == (DISCHARGING_OK, ())
+
+
+def test_discharging_down_to_minimal():
+    results = run([discharging(80), discharging(20), discharging(5), discharging(2)])
+    assert results == [(DISCHARGING_OK, ('battery_discharging',)),
+                       (LOW, ('low_capacity_level',)),
+                       (CRITICAL, ('critical_battery_level',)),
+                       (MINIMAL, ('minimal_battery_level', state_machine.COUNTDOWN_ACTION))]
+
+
+# minimal level notification and countdown come only once, countdown warns by itself
+def test_minimal_actions_are_not_repeated():
+    results = run([discharging(3), discharging(2), discharging(1)])
+    assert results[0] == (MINIMAL, ('minimal_battery_level', state_machine.COUNTDOWN_ACTION))
+    assert results[1:] == [(MINIMAL, ()), (MINIMAL, ())]
+    assert state_machine.COUNTDOWN_STATE == MINIMAL
+
+
+# plugging ac during countdown leaves MINIMAL, so countdown is stopped
+def test_minimal_aborted_by_ac():
+    results = run([discharging(2), charging(2)])
+    assert results[1] == (CHARGING, ('battery_charging',))
+    assert results[1][0] != state_machine.COUNTDOWN_STATE
+
+
+def test_charging_to_full():
+    assert run([charging(98), charging(100)]) == [(CHARGING, ('battery_charging',)), (FULL, ('full_battery',))]
+
+
+def test_battery_removed_and_plugged_with_ac():
+    results = run([charging(50), BatterySnapshot(False, True), charging(50)])
+    assert results == [(CHARGING, ('battery_charging',)),
+                       (NO_BATTERY, ('battery_removed', 'no_battery')),
+                       (CHARGING, ('battery_plugged', 'battery_charging'))]
+
+
+def test_no_battery_at_start():
+    assert run([BatterySnapshot(False, True)]) == [(NO_BATTERY, ('no_battery',))]
+    assert run([BatterySnapshot(False, False)]) == [(NO_BATTERY, ())]
+
+
+# charger, which isn't Mains (e.g. USB-C), shows up only in battery status, low capacity isn't discharging then
+def test_charging_without_ac():
+    sm = machine()
+    assert sm.classify(BatterySnapshot(True, False, 'Charging', 2)) == CHARGING
+    assert sm.classify(BatterySnapshot(True, False, 'Not charging', 2)) == CHARGING
+    assert sm.classify(BatterySnapshot(True, False, 'Unknown', 2)) == CHARGING
+    assert sm.classify(BatterySnapshot(True, False, 'Full', 97)) == FULL
+
+
+def test_minimal_aborted_by_charger_without_ac():
+    results = run([discharging(2), BatterySnapshot(True, False, 'Charging', 2)])
+    assert results[1] == (CHARGING, ('battery_charging',))
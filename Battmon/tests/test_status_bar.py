@@ -0,0 +1,100 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import errno
+import json
+import os
+import subprocess
+import sys
+
+# local imports
+from monitor import state_machine, status_bar
+from values import internal_config
+from values.read_battery_values import BatterySnapshot
+
+BAR_FORMAT = '{source} {capacity}%'
+
+
+def discharging(capacity):
+    return BatterySnapshot(True, False, 'Discharging', capacity)
+
+
+# bar reading fifo, opened before Battmon writes to it
+def open_fifo(tmp_path):
+    path = str(tmp_path / 'bar')
+    os.mkfifo(path)
+    return path, os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+
+
+def read_lines(fd):
+    try:
+        return os.read(fd, 65536).decode('utf-8').splitlines()
+    except OSError as e:
+        if e.errno != errno.EAGAIN:
+            raise
+        return []
+
+
+def test_plain_writes_only_changes(tmp_path):
+    path, fd = open_fifo(tmp_path)
+    bar = status_bar.BarOutput(path, BAR_FORMAT)
+    try:
+        bar.publish(state_machine.DISCHARGING_OK, discharging(80))
+        bar.publish(state_machine.DISCHARGING_OK, discharging(80))
+        bar.publish(state_machine.LOW, discharging(20))
+        bar.publish(state_machine.NO_BATTERY, BatterySnapshot(False, True))
+        assert read_lines(fd) == ['BAT 80%', 'BAT 20%', status_bar.NO_BATTERY_TEXT]
+    finally:
+        bar.close()
+        os.close(fd)
+
+
+def test_i3bar_header_and_blocks(tmp_path):
+    path, fd = open_fifo(tmp_path)
+    bar = status_bar.BarOutput(path, BAR_FORMAT, 'i3bar')
+    try:
+        bar.publish(state_machine.DISCHARGING_OK, discharging(80))
+        bar.publish(state_machine.CRITICAL, discharging(5))
+        lines = read_lines(fd)
+    finally:
+        bar.close()
+        os.close(fd)
+    header = json.loads(lines[0])
+    assert header['version'] == 1
+    assert lines[1] == '['
+    assert json.loads(lines[2]) == [{'name': 'battery', 'full_text': 'BAT 80%'}]
+    assert lines[3].startswith(',')
+    block = json.loads(lines[3][1:])[0]
+    assert block['full_text'] == 'BAT 5%'
+    assert block['color'] == status_bar.STATE_COLORS[state_machine.CRITICAL]
+    assert block['urgent']
+
+
+# with '-' bar reads stdout, so everything Battmon prints goes to stderr
+def test_stdout_has_only_bar_lines():
+    code = ("from monitor import status_bar, state_machine\n"
+            "from values.read_battery_values import BatterySnapshot\n"
+            "bar = status_bar.BarOutput('-', %r)\n"
+            "print('BATTMON IS ALREADY RUNNING')\n"
+            "bar.publish(state_machine.DISCHARGING_OK, BatterySnapshot(True, False, 'Discharging', 41))\n"
+            % BAR_FORMAT)
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=internal_config.PROGRAM_PATH,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    assert process.returncode == 0
+    assert out.decode('utf-8').splitlines() == ['BAT 41%']
+    assert 'BATTMON IS ALREADY RUNNING' in err.decode('utf-8')
@@ -0,0 +1,103 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+# local imports
+from benchmarks import fake_power_supply
+from monitor import state_machine, status_server
+from values import internal_config
+from values.read_battery_values import BatterySnapshot
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = status_server.open_status_server(str(tmp_path / 'battmon.sock'))
+    yield server
+    server.close()
+
+
+def socket_path(tmp_path):
+    return str(tmp_path / 'battmon.sock')
+
+
+def test_request_reply(tmp_path, server):
+    assert json.loads(status_server.query(socket_path(tmp_path))) == {}
+    server.publish(state_machine.LOW, BatterySnapshot(True, False, 'Discharging', 20, time_left=3600, name='BAT0'))
+    status = json.loads(status_server.query(socket_path(tmp_path)))
+    assert (status['state'], status['capacity'], status['time_left']) == (state_machine.LOW, 20, 3600)
+    text = status_server.query(socket_path(tmp_path), 'text')
+    assert 'capacity=20\n' in text
+    assert 'ac_online=false\n' in text
+    assert status_server.query(socket_path(tmp_path), 'bogus').startswith('error:')
+
+
+def test_status_command(tmp_path, server, capsys):
+    server.publish(state_machine.CHARGING, BatterySnapshot(True, True, 'Charging', 55))
+    status_server.main(['-ss', socket_path(tmp_path), '-k', 'capacity'])
+    assert capsys.readouterr().out == '55\n'
+    status_server.main(['-ss', socket_path(tmp_path), '--text'])
+    assert 'state=CHARGING\n' in capsys.readouterr().out
+
+
+def test_status_command_without_battmon(tmp_path):
+    with pytest.raises(SystemExit):
+        status_server.main(['-ss', socket_path(tmp_path)])
+
+
+# socket left by Battmon which didn't exit cleanly is taken over, one of running Battmon isn't
+def test_stale_socket(tmp_path, server):
+    assert status_server.open_status_server(socket_path(tmp_path)) is None
+    server.close()
+    stale = status_server.StatusServer(socket_path(tmp_path))
+    stale.close()
+    open(socket_path(tmp_path), 'w').close()
+    assert status_server.open_status_server(socket_path(tmp_path)) is None
+
+
+# wait until check passes, its result
+def wait_for(check, timeout=10):
+    deadline = time.time() + timeout
+    while not check() and time.time() < deadline:
+        time.sleep(0.05)
+    return check()
+
+
+# Battmon killed by SIGTERM removes its socket
+def test_socket_removed_on_sigterm(tmp_path):
+    power_supply = str(tmp_path / 'power_supply')
+    fake_power_supply.create_tree(power_supply)
+    process = subprocess.Popen([sys.executable, 'battmon.py', '-f', '-dr', '-n', '-pp', power_supply,
+                                '-ss', socket_path(tmp_path), '-hr', '0'], cwd=internal_config.PROGRAM_PATH,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               env=dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'cache')))
+    try:
+        assert wait_for(lambda: status_server.query(socket_path(tmp_path)) not in (None, '{}\n'))
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(10) == 0
+        assert not os.path.exists(socket_path(tmp_path))
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
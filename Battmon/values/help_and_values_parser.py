@@ -28,6 +28,7 @@ except ImportError:
 
 # local imports
 from values import internal_config
+from monitor import status_bar
 import config
 
 # Default values parser and command line parameters parser
@@ -44,6 +45,8 @@ defaultOptions = {"debug": False,
                   "test": False,
                   "foreground": False,
                   "more_then_one_instance": False,
+                  "asyncio_runtime": config.ASYNCIO_RUNTIME,
+                  "stats": False,
                   "lock_command": config.SCREEN_LOCK_COMMAND,
                   "disable_notifications": config.DISABLE_NOTIFICATIONS,
                   "critical": config.CRITICAL_NOTIFICATIONS,
@@ -52,6 +55,17 @@ defaultOptions = {"debug": False,
                   "sound_volume": config.SOUND_VOLUME,
                   "timeout": config.NOTIFICATION_TIMEOUT,
                   "battery_update_timeout": config.BATTERY_UPDATE_INTERVAL,
+                  "poll_interval": config.POLL_INTERVAL,
+                  "min_poll_interval": config.MIN_POLL_INTERVAL,
+                  "device_discovery_ttl": config.DEVICE_DISCOVERY_TTL,
+                  "sysfs_reader": config.SYSFS_READER,
+                  "power_supply_path": internal_config.POWER_SUPPLY_PATH,
+                  "history_path": config.HISTORY_PATH,
+                  "history_records": config.HISTORY_RECORDS,
+                  "status_socket": config.STATUS_SOCKET_PATH,
+                  "bar_output": config.BAR_OUTPUT,
+                  "bar_format": config.BAR_FORMAT,
+                  "bar_protocol": config.BAR_PROTOCOL,
                   "battery_low_value": config.BATTERY_LOW_LEVEL_VALUE,
                   "battery_critical_value": config.BATTERY_CRITICAL_LEVEL_VALUE,
                   "battery_minimal_value": config.BATTERY_MINIMAL_LEVEL_VALUE,
@@ -91,6 +105,22 @@ ap.add_argument("-i", "--run-more-instances",
                 default=defaultOptions['more_then_one_instance'],
                 help="run more then one instance")
 
+# count what Battmon itself costs
+ap.add_argument("-st", "--stats",
+                action="store_true",
+                dest="stats",
+                default=defaultOptions['stats'],
+                help="count sysfs reads, spawned commands, wakeups and sample latency, "
+                     "print them on SIGUSR1 and every 10 minutes in debug mode")
+
+# run on asyncio event loop
+ap.add_argument("-as", "--asyncio",
+                action="store_true",
+                dest="asyncio_runtime",
+                default=defaultOptions['asyncio_runtime'],
+                help="run battery checks, notifications and minimal level countdown as asyncio tasks, "
+                     "so slow notification or sound command doesn't delay noticing plugged ac (python 3 only)")
+
 # lock command setter
 file_group.add_argument("-lp", "--lock-command-path",
                         action="store",
@@ -115,6 +145,15 @@ notification_group.add_argument("-cn", "--critical-notifications",
                                 default=defaultOptions['critical'],
                                 help="show only critical battery notifications")
 
+# power supply devices directory, e.g. fake tree for testing
+file_group.add_argument("-pp", "--power-supply-path",
+                        action="store",
+                        dest="power_supply_path",
+                        type=str,
+                        metavar="<PATH>",
+                        default=defaultOptions['power_supply_path'],
+                        help="path to directory with battery and ac-adapter devices")
+
 # set sound file path
 file_group.add_argument("-sp", "--sound-file-path",
                         action="store",
@@ -136,10 +175,10 @@ sound_group.add_argument("-ns", "--no-sound",
 def set_sound_volume_level(volume_value):
     volume_value = int(volume_value)
     if volume_value < 1:
-        raise argparse.ArgumentError(volume_value, "Sound level must be greater then 1")
+        raise argparse.ArgumentTypeError("Sound level must be greater then 1")
     if volume_value > internal_config.MAX_SOUND_VOLUME_LEVEL:
-        raise argparse.ArgumentError(volume_value,
-                                     "Sound level can't be greater then %s" % internal_config.MAX_SOUND_VOLUME_LEVEL)
+        raise argparse.ArgumentTypeError("Sound level can't be greater then %s"
+                                         % internal_config.MAX_SOUND_VOLUME_LEVEL)
     return volume_value
 
 
@@ -156,7 +195,7 @@ sound_group.add_argument("-sl", "--set-sound-loudness",
 def set_timeout(timeout):
     timeout = int(timeout)
     if timeout < 0:
-        raise argparse.ArgumentError(timeout, "Notification timeout should be 0 or positive number")
+        raise argparse.ArgumentTypeError("Notification timeout should be 0 or positive number")
     return timeout
 
 
@@ -173,7 +212,7 @@ notification_group.add_argument("-t", "--timeout",
 def set_battery_update_interval(update_value):
     update_value = int(update_value)
     if update_value <= 0:
-        raise argparse.ArgumentError(update_value, "Battery update interval should be positive number")
+        raise argparse.ArgumentTypeError("Battery update interval should be positive number")
     return update_value
 
 
@@ -185,6 +224,137 @@ battery_group.add_argument("-bu", "--battery-update-interval",
                            default=defaultOptions['battery_update_timeout'],
                            help="battery values update interval")
 
+
+# check if poll interval is correct > 0
+def set_poll_interval(interval):
+    interval = int(interval)
+    if interval <= 0:
+        raise argparse.ArgumentTypeError("Poll interval should be positive number")
+    return interval
+
+
+# battery poll interval
+battery_group.add_argument("-pi", "--poll-interval",
+                           dest="poll_interval",
+                           type=set_poll_interval,
+                           metavar="<SECONDS>",
+                           default=defaultOptions['poll_interval'],
+                           help="longest time between battery checks, when kernel uevents wake Battmon up "
+                                "on ac and battery changes, without uevents battery is checked every second")
+
+# shortest battery poll interval
+battery_group.add_argument("-mi", "--min-poll-interval",
+                           dest="min_poll_interval",
+                           type=set_poll_interval,
+                           metavar="<SECONDS>",
+                           default=defaultOptions['min_poll_interval'],
+                           help="shortest time between battery checks, used close to low, critical "
+                                "and minimal battery level")
+
+
+# check if device discovery ttl is correct >= 0
+def set_device_discovery_ttl(ttl):
+    ttl = int(ttl)
+    if ttl < 0:
+        raise argparse.ArgumentTypeError("Device discovery ttl should be 0 or positive number")
+    return ttl
+
+
+# power supply devices discovery ttl
+battery_group.add_argument("-dt", "--device-discovery-ttl",
+                           dest="device_discovery_ttl",
+                           type=set_device_discovery_ttl,
+                           metavar="<SECONDS>",
+                           default=defaultOptions['device_discovery_ttl'],
+                           help="search for new battery and ac-adapter devices after this time, "
+                                "0 means only on SIGHUP or when device is gone")
+
+# battery sample history file
+file_group.add_argument("-hp", "--history-path",
+                        action="store",
+                        dest="history_path",
+                        type=str,
+                        metavar="<PATH>",
+                        default=defaultOptions['history_path'],
+                        help="file where battery samples are kept between restarts")
+
+# socket serving battery status
+file_group.add_argument("-ss", "--status-socket",
+                        action="store",
+                        dest="status_socket",
+                        type=str,
+                        metavar="<PATH>",
+                        default=defaultOptions['status_socket'],
+                        help="Unix socket serving battery status to status bars and 'battmon status', "
+                             "empty path disables it")
+
+# bar block output
+file_group.add_argument("-bo", "--bar-output",
+                        action="store",
+                        dest="bar_output",
+                        type=str,
+                        metavar="<PATH>",
+                        default=defaultOptions['bar_output'],
+                        help="write battery block of tiling wm bar to this fifo or '-' for stdout, "
+                             "only when it changes")
+
+
+# check if bar format has only known fields
+def set_bar_format(bar_format):
+    error = status_bar.check_format(bar_format)
+    if error:
+        raise argparse.ArgumentTypeError(error)
+    return bar_format
+
+
+# bar block format
+ap.add_argument("-bf", "--bar-format",
+                dest="bar_format",
+                type=set_bar_format,
+                metavar='''"<FORMAT>"''',
+                default=defaultOptions['bar_format'],
+                help="format of bar block with fields of 'battmon status' and {source}, e.g. "
+                     "'{capacity}%% {time_left_text}'")
+
+# bar protocol
+ap.add_argument("-bp", "--bar-protocol",
+                action="store",
+                dest="bar_protocol",
+                type=str,
+                metavar="<ARG>",
+                choices=['plain', 'i3bar'],
+                default=defaultOptions['bar_protocol'],
+                help="'plain' writes text lines, 'i3bar' writes i3bar and swaybar JSON protocol")
+
+
+# check if history records number is correct >= 0
+def set_history_records(records):
+    records = int(records)
+    if records < 0:
+        raise argparse.ArgumentTypeError("Number of history records should be 0 or positive number")
+    return records
+
+
+# number of kept battery samples
+battery_group.add_argument("-hr", "--history-records",
+                           dest="history_records",
+                           type=set_history_records,
+                           metavar="<NUMBER>",
+                           default=defaultOptions['history_records'],
+                           help="how many battery samples are kept in history file, 48 bytes each, "
+                                "0 disables history")
+
+# sysfs reader
+battery_group.add_argument("-sr", "--sysfs-reader",
+                           action="store",
+                           dest="sysfs_reader",
+                           type=str,
+                           metavar="<ARG>",
+                           choices=['attribute', 'uevent'],
+                           default=defaultOptions['sysfs_reader'],
+                           help="how to read battery values, 'attribute' reads every value from its own file, "
+                                "'uevent' reads all values of device at once")
+
 # battery low level value
 battery_group.add_argument("-ll", "--low-level-value",
                            dest="battery_low_value",
@@ -225,7 +395,7 @@ battery_group.add_argument("-mc", "--minimal-level-command",
 def set_no_battery_remainder(remainder):
     remainder = int(remainder)
     if remainder < 0:
-        raise argparse.ArgumentError(remainder, "'no battery' remainder value must be greater or equal 0")
+        raise argparse.ArgumentTypeError("'no battery' remainder value must be greater or equal 0")
     return remainder
 
 
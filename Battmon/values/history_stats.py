@@ -0,0 +1,286 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Statistics of battery sample history: discharge sessions with their rate, average and peak power,
+# how long sessions on battery take and battery wear. History is loaded at once, with NumPy when it's
+# installed, otherwise into arrays, which is much slower with long history.
+#
+#   ./battmon.py stats [-hp PATH] [-s 10] [--json] [--no-numpy]
+
+import argparse
+import array
+import bisect
+import json
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# local imports
+from values import internal_config, sample_history
+
+# samples further apart in seconds belong to different sessions, e.g. system was suspended between them
+MAX_SAMPLE_GAP = 600
+# session length histogram bins in seconds
+SESSION_BINS = (0, 15 * 60, 30 * 60, 60 * 60, 2 * 60 * 60, 4 * 60 * 60, 8 * 60 * 60)
+# wear trend is shown per this number of days
+WEAR_TREND_DAYS = 30
+DAY = 24 * 60 * 60
+
+DISCHARGING = sample_history.STATUS_CODES['Discharging']
+# array typecodes of record fields for loading without numpy
+ARRAY_TYPES = ('d', 'q', 'q', 'q', 'q', 'H', 'B', 'B')
+
+
+# record type matching sample_history.RECORD, with status and ac online also as one 16 bit 'state' field, so
+# both are checked in one pass over history
+def record_dtype():
+    return numpy.dtype({'names': list(sample_history.RECORD_FIELDS) + ['state'],
+                        'formats': ['<f8', '<i8', '<i8', '<i8', '<i8', '<u2', 'u1', 'u1', '<u2'],
+                        'offsets': [0, 8, 16, 24, 32, 40, 42, 43, 42],
+                        'itemsize': sample_history.RECORD.size})
+
+
+# history columns by field name, numpy arrays or arrays
+def load_columns(buffers, use_numpy=True):
+    if use_numpy:
+        dtype = record_dtype()
+        parts = [numpy.frombuffer(data, dtype=dtype) for data in buffers]
+        records = numpy.concatenate(parts) if len(parts) > 1 else parts[0]
+        return dict((name, records[name]) for name in records.dtype.names)
+
+    columns = [array.array(typecode) for typecode in ARRAY_TYPES]
+    appends = [column.append for column in columns]
+    for data in buffers:
+        for offset in range(0, len(data), sample_history.RECORD.size):
+            for append, value in zip(appends, sample_history.RECORD.unpack_from(data, offset)):
+                append(value)
+    return dict(zip(sample_history.RECORD_FIELDS, columns))
+
+
+# first and last index of every discharge session, power sum, number of power samples and peak power of it
+def sessions_numpy(columns):
+    t = columns['time']
+    power = columns['power_now']
+    # discharging status in low byte and ac offline in high byte
+    on_battery = columns['state'] == DISCHARGING
+
+    # session starts after sample not on battery or after gap and ends before them
+    gap = numpy.diff(t) > MAX_SAMPLE_GAP
+    starts = on_battery.copy()
+    starts[1:] &= gap | ~on_battery[:-1]
+    ends = on_battery.copy()
+    ends[:-1] &= gap | ~on_battery[1:]
+    starts = numpy.flatnonzero(starts)
+    ends = numpy.flatnonzero(ends)
+    if not len(starts):
+        return starts, ends, starts, starts, starts
+
+    # sum up every [start, end] range at once, extra element keeps end + 1 inside of array
+    bounds = numpy.column_stack((starts, ends + 1)).ravel()
+    positive = numpy.append(numpy.maximum(power, 0), 0)
+    sums = numpy.add.reduceat(positive, bounds)[::2]
+    counts = numpy.add.reduceat(numpy.append(power > 0, False).astype(numpy.int64), bounds)[::2]
+    peaks = numpy.maximum.reduceat(positive, bounds)[::2]
+    return starts, ends, sums, counts, peaks
+
+
+def sessions_arrays(columns):
+    t = columns['time']
+    power = columns['power_now']
+    starts, ends, sums, counts, peaks = [], [], [], [], []
+    in_session = False
+    for i in range(len(t)):
+        on_battery = columns['status'][i] == DISCHARGING and not columns['ac_online'][i]
+        if in_session and (not on_battery or t[i] - t[i - 1] > MAX_SAMPLE_GAP):
+            ends.append(i - 1)
+            in_session = False
+        if on_battery:
+            if not in_session:
+                starts.append(i)
+                sums.append(0)
+                counts.append(0)
+                peaks.append(0)
+                in_session = True
+            if power[i] > 0:
+                sums[-1] += power[i]
+                counts[-1] += 1
+                peaks[-1] = max(peaks[-1], power[i])
+    if in_session:
+        ends.append(len(t) - 1)
+    return starts, ends, sums, counts, peaks
+
+
+# last sample of every day, days without design energy are left out
+def wear_points(columns, use_numpy=True):
+    t = columns['time']
+    if use_numpy:
+        if not len(t):
+            return []
+        # history is in time order, so last sample of day is the one before next midnight
+        midnights = numpy.arange(t[0] // DAY + 1, t[-1] // DAY + 1) * DAY
+        last = numpy.unique(numpy.append(numpy.searchsorted(t, midnights) - 1, len(t) - 1))
+        return [int(i) for i in last[columns['energy_full_design'][last] > 0]]
+
+    last = []
+    for i in range(len(t)):
+        if last and t[last[-1]] // DAY == t[i] // DAY:
+            last[-1] = i
+        else:
+            last.append(i)
+    return [i for i in last if columns['energy_full_design'][i] > 0]
+
+
+# change of y per unit of x, least squares
+def slope(x, y):
+    if len(x) < 2:
+        return 0.0
+    mean_x = sum(x) / float(len(x))
+    mean_y = sum(y) / float(len(y))
+    variance = sum((a - mean_x) ** 2 for a in x)
+    if variance == 0:
+        return 0.0
+    return sum((a - mean_x) * (b - mean_y) for a, b in zip(x, y)) / variance
+
+
+# compute all statistics of history columns
+def history_stats(columns, use_numpy=True):
+    t = columns['time']
+    energy_now = columns['energy_now']
+    energy_full = columns['energy_full']
+    if use_numpy:
+        starts, ends, sums, counts, peaks = sessions_numpy(columns)
+    else:
+        starts, ends, sums, counts, peaks = sessions_arrays(columns)
+
+    sessions = []
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        duration = float(t[end] - t[start])
+        used = int(energy_now[start] - energy_now[end])
+        full = int(energy_full[start]) or 1
+        sessions.append({'start': float(t[start]),
+                         'duration': duration,
+                         'energy_used': used,
+                         'percent_per_hour': used * 100.0 / full / duration * 3600 if duration > 0 else 0.0,
+                         'average_power': int(sums[i] // counts[i]) if counts[i] else 0,
+                         'peak_power': int(peaks[i]),
+                         'power_sum': int(sums[i]),
+                         'power_samples': int(counts[i])})
+
+    histogram = [[SESSION_BINS[i], 0, 0.0] for i in range(len(SESSION_BINS))]
+    for session in sessions:
+        row = histogram[bisect.bisect_right(SESSION_BINS, session['duration']) - 1]
+        row[1] += 1
+        row[2] += session['duration']
+
+    wear = []
+    for i in wear_points(columns, use_numpy):
+        wear.append({'time': float(t[i]),
+                     'health': int(energy_full[i]) * 100.0 / int(columns['energy_full_design'][i]),
+                     'cycle_count': int(columns['cycle_count'][i])})
+
+    on_battery = sum(s['duration'] for s in sessions)
+    used = sum(s['energy_used'] for s in sessions)
+    power_samples = sum(s['power_samples'] for s in sessions)
+    return {'samples': len(t),
+            'first': float(t[0]) if len(t) else 0.0,
+            'last': float(t[-1]) if len(t) else 0.0,
+            'sessions': sessions,
+            'time_on_battery': on_battery,
+            'average_rate': used / on_battery * 3600 if on_battery > 0 else 0.0,
+            'average_percent_per_hour': (sum(s['percent_per_hour'] * s['duration'] for s in sessions) / on_battery
+                                         if on_battery > 0 else 0.0),
+            'average_power': sum(s['power_sum'] for s in sessions) // power_samples if power_samples else 0,
+            'peak_power': max([s['peak_power'] for s in sessions] or [0]),
+            'histogram': [{'from': row[0], 'sessions': row[1], 'time': row[2]} for row in histogram],
+            'wear': wear,
+            'wear_trend': slope([w['time'] / DAY for w in wear], [w['health'] for w in wear]) * WEAR_TREND_DAYS}
+
+
+def format_duration(seconds):
+    minutes = int(seconds) // 60
+    return '%dh %02dmin' % (minutes // 60, minutes % 60)
+
+
+def format_time(seconds):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(seconds))
+
+
+# print statistics as text
+def print_stats(stats, path, last_sessions):
+    print("History: %s, %s samples" % (path, stats['samples']))
+    if not stats['samples']:
+        return
+    print("  from %s to %s\n" % (format_time(stats['first']), format_time(stats['last'])))
+
+    print("Discharge sessions: %s, %s on battery" % (len(stats['sessions']), format_duration(stats['time_on_battery'])))
+    print("  average discharge rate: %.1f %%/h, %.2f W" % (stats['average_percent_per_hour'],
+                                                           stats['average_rate'] / 1000000.0))
+    print("  average power: %.2f W, peak power: %.2f W\n" % (stats['average_power'] / 1000000.0,
+                                                             stats['peak_power'] / 1000000.0))
+
+    print("Time on battery by session length:")
+    for i, row in enumerate(stats['histogram']):
+        label = ('>= %s' % format_duration(row['from']) if i == len(stats['histogram']) - 1
+                 else '< %s' % format_duration(stats['histogram'][i + 1]['from']))
+        print("  %-14s %5s sessions %12s" % (label, row['sessions'], format_duration(row['time'])))
+
+    if stats['sessions'] and last_sessions:
+        print("\nLast sessions:")
+        print("  %-16s %10s %8s %8s %8s" % ('start', 'length', '%/h', 'avg W', 'peak W'))
+        for session in stats['sessions'][-last_sessions:]:
+            print("  %-16s %10s %8.1f %8.2f %8.2f" % (format_time(session['start']),
+                                                      format_duration(session['duration']),
+                                                      session['percent_per_hour'],
+                                                      session['average_power'] / 1000000.0,
+                                                      session['peak_power'] / 1000000.0))
+
+    if stats['wear']:
+        first, last = stats['wear'][0], stats['wear'][-1]
+        print("\nWear:")
+        print("  full capacity: %.1f%% -> %.1f%% of design, %+.2f%% per %s days"
+              % (first['health'], last['health'], stats['wear_trend'], WEAR_TREND_DAYS))
+        print("  cycle count: %s -> %s" % (first['cycle_count'], last['cycle_count']))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="battmon stats", description="battery history statistics")
+    ap.add_argument("-hp", "--history-path", default=internal_config.DEFAULT_HISTORY_PATH, metavar="<PATH>",
+                    help="history file written by Battmon")
+    ap.add_argument("-s", "--sessions", type=int, default=10, metavar="<NUMBER>",
+                    help="number of last discharge sessions to show")
+    ap.add_argument("--json", action="store_true", help="print all statistics as json")
+    ap.add_argument("--no-numpy", action="store_true", help="don't use numpy even if it's installed")
+    args = ap.parse_args(argv)
+
+    use_numpy = numpy is not None and not args.no_numpy
+    start = time.time()
+    try:
+        buffers = sample_history.load_buffers(args.history_path)
+    except (IOError, OSError, ValueError) as e:
+        print("Error: can't read history file %s: %s" % (args.history_path, e))
+        sys.exit(1)
+    stats = history_stats(load_columns(buffers, use_numpy), use_numpy)
+    elapsed = time.time() - start
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_stats(stats, args.history_path, args.sessions)
+        print("\n(computed in %.1f ms%s)" % (elapsed * 1000, ' with numpy' if use_numpy else ''))
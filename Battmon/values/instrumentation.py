@@ -0,0 +1,111 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# What Battmon itself costs: sysfs reads, spawned commands, wakeups and how long battery sample takes.
+# Counters exist only with --stats, without it readers aren't wrapped at all.
+
+import array
+
+# local imports
+from values import read_battery_values
+
+# number of recent sample latencies kept for percentiles
+LATENCY_SAMPLES = 1024
+
+
+# reader wrapper counting read attribute values
+class CountingReader(object):
+    def __init__(self, reader, stats):
+        self.__reader = reader
+        self.__stats = stats
+
+    def read_device(self, device_path, names):
+        self.__stats.sysfs_reads += len(names)
+        return self.__reader.read_device(device_path, names)
+
+    def read(self, path):
+        self.__stats.sysfs_reads += 1
+        return self.__reader.read(path)
+
+    def attributes(self, device_path):
+        return self.__reader.attributes(device_path)
+
+    def open_files(self):
+        return self.__reader.open_files()
+
+    def close(self):
+        self.__reader.close()
+
+
+# counters and timers of Battmon itself
+class Instrumentation(object):
+    def __init__(self):
+        self.start_time = read_battery_values.monotonic()
+        self.sysfs_reads = 0
+        self.spawns = 0
+        self.spawn_time = 0.0
+        self.event_wakeups = 0
+        self.timeout_wakeups = 0
+        self.samples = 0
+        self.__latencies = array.array('d', [0.0] * LATENCY_SAMPLES)
+        self.__report_time = self.start_time
+
+    # wrap sysfs reader, so its reads are counted
+    def reader(self, reader):
+        return CountingReader(reader, self)
+
+    # process manager spawned command, spawning took given seconds
+    def spawned(self, seconds):
+        self.spawns += 1
+        self.spawn_time += seconds
+
+    # monitor woke up by power supply event or after timeout
+    def wakeup(self, by_event):
+        if by_event:
+            self.event_wakeups += 1
+        else:
+            self.timeout_wakeups += 1
+
+    # battery snapshot took given seconds
+    def sample(self, seconds):
+        self.__latencies[self.samples % LATENCY_SAMPLES] = seconds
+        self.samples += 1
+
+    # latency percentile of recent samples in seconds
+    def latency(self, percentile):
+        latencies = sorted(self.__latencies[:min(self.samples, LATENCY_SAMPLES)])
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100.0))]
+
+    # all counters as one line
+    def summary(self):
+        elapsed = max(read_battery_values.monotonic() - self.start_time, 1e-9)
+        hours = elapsed / 3600
+        return ("uptime %.0fs, %.2f sysfs reads/s, %.1f spawns/h (%.1f ms each), "
+                "%.1f wakeups/h (%.1f by event, %.1f by timeout), %s samples, latency p50 %.3f ms, p99 %.3f ms"
+                % (elapsed, self.sysfs_reads / elapsed, self.spawns / hours,
+                   self.spawn_time * 1000 / self.spawns if self.spawns else 0.0,
+                   (self.event_wakeups + self.timeout_wakeups) / hours, self.event_wakeups / hours,
+                   self.timeout_wakeups / hours, self.samples, self.latency(50) * 1000, self.latency(99) * 1000))
+
+    # true once every given seconds, for periodic summaries
+    def report_due(self, interval):
+        now = read_battery_values.monotonic()
+        if now - self.__report_time < interval:
+            return False
+        self.__report_time = now
+        return True
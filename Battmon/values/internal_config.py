@@ -31,10 +31,66 @@ EXTRA_PROGRAMS_PATH = ['/usr/bin/',
                        '/usr/share/sounds/',
                        PROGRAM_PATH + "/bin/"]
 
+# directory with battery and ac-adapter devices
+POWER_SUPPLY_PATH = '/sys/class/power_supply'
+
+# seconds after found power supply devices are searched again, when no hotplug event was seen, much longer than
+# DEFAULT_POLL_INTERVAL, as every search reopens attribute files and rebuilds read plans, hotplug events and gone
+# devices start search at once anyway
+DEFAULT_DEVICE_DISCOVERY_TTL = 600
+
+# longest and shortest time between battery checks in seconds, when power supply uevents
+# wake Battmon up on ac and battery changes
+DEFAULT_POLL_INTERVAL = 30
+DEFAULT_MIN_POLL_INTERVAL = 1
+
+# time between battery checks in seconds, when kernel uevents aren't available, ac plug is seen only by
+# polling then, so it's used instead of poll intervals
+POLLING_FALLBACK_INTERVAL = 1
+
+# how battery and ac values are read from sysfs, 'attribute' or 'uevent'
+DEFAULT_SYSFS_READER = 'attribute'
+
+# battery sample history, ring file of fixed number of records, about 12MB and 3 months of 30 seconds checks,
+# written back to disk at least every flush interval in seconds
+DEFAULT_HISTORY_PATH = os.path.join(os.environ.get('XDG_STATE_HOME') or os.path.expanduser('~/.local/state'),
+                                    'battmon', 'history')
+DEFAULT_HISTORY_RECORDS = 262144
+DEFAULT_HISTORY_FLUSH_INTERVAL = 600
+
+# paths of external programs found in EXTRA_PROGRAMS_PATH, valid until some of its directories changes
+DEFAULT_PROGRAM_CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                                          'battmon', 'programs.json')
+
+# Unix socket serving latest battery status to status bars and 'battmon status'
+if os.environ.get('XDG_RUNTIME_DIR'):
+    DEFAULT_STATUS_SOCKET_PATH = os.path.join(os.environ['XDG_RUNTIME_DIR'], 'battmon.sock')
+else:
+    DEFAULT_STATUS_SOCKET_PATH = '/tmp/battmon-%d.sock' % os.getuid()
+
+# battery block of tiling wm bar, fields are the same as 'battmon status' ones, 'plain' or 'i3bar' protocol
+DEFAULT_BAR_FORMAT = '{source} {capacity}% {time_left_text}'
+DEFAULT_BAR_PROTOCOL = 'plain'
+
+# seconds between summaries of Battmon own costs in debug mode with --stats
+DEFAULT_STATS_INTERVAL = 600
+
+# notifications of one action are sent at most once per this seconds, newer ones replace pending one,
+# queue holds at most this number of pending notifications
+DEFAULT_NOTIFICATION_RATE_LIMIT = 2
+DEFAULT_NOTIFICATION_QUEUE_SIZE = 8
+
+# spawned commands, at most this many run at once and they're killed after timeout seconds
+DEFAULT_MAX_CHILDREN = 4
+DEFAULT_COMMAND_TIMEOUT = 30
+
 # default play command
 DEFAULT_PLAYER_COMMAND = ['paplay', 'play']
 MAX_SOUND_VOLUME_LEVEL = 17
 DEFAULT_SOUND_FILE_PATH = PROGRAM_PATH + "/sounds/info.wav"
+# minimal battery level countdown beeps with louder warning sound
+WARNING_SOUND_FILE_PATH = PROGRAM_PATH + "/sounds/warning.wav"
+LOUD_SOUND_VOLUME = 10
 
 # screenlock commands first found in this list will be used as default
 SCREEN_LOCK_COMMANDS = ['i3lock -c 000000', 'xlock', 'xtrlock -b', 'xscreensaver-command -lock']
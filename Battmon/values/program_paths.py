@@ -0,0 +1,107 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Paths of external programs Battmon uses. Players, screen lockers and minimal level commands are looked for at
+# startup, as startup notifications tell which of them are used or missing, notify-send only when there's no
+# session bus. Result, found or not, is cached in $XDG_CACHE_HOME/battmon/programs.json together with mtimes of
+# searched directories. Next start takes paths from cache until some directory changes, e.g. package gets
+# installed or removed, then whole cache is thrown away.
+
+import json
+import os
+
+# local imports
+from values import internal_config
+
+CACHE_VERSION = 1
+
+
+# mtime of directory, None when it doesn't exist
+def directory_mtime(directory):
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return None
+    return getattr(st, 'st_mtime_ns', st.st_mtime)
+
+
+class ProgramPaths(object):
+    def __init__(self, directories=internal_config.EXTRA_PROGRAMS_PATH,
+                 cache_path=internal_config.DEFAULT_PROGRAM_CACHE_PATH):
+        self.__directories = list(directories)
+        self.__cache_path = cache_path
+        # path of every program looked for, None when it wasn't found, loaded on first lookup
+        self.__paths = None
+        self.__mtimes = None
+        self.__changed = False
+        # after first save every newly searched program is saved at once, e.g. notify-send looked for later
+        self.__saved = False
+        self.cache_hits = 0
+        self.searches = 0
+
+    def __load(self):
+        self.__mtimes = dict((directory, directory_mtime(directory)) for directory in self.__directories)
+        self.__paths = {}
+        if not self.__cache_path:
+            return
+        try:
+            with open(self.__cache_path) as cache_file:
+                cache = json.load(cache_file)
+            if cache.get('version') == CACHE_VERSION and cache.get('directories') == self.__mtimes:
+                self.__paths = dict(cache['programs'])
+                return
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+        # missing or stale cache is written again
+        self.__changed = True
+
+    def __search(self, name):
+        self.searches += 1
+        for directory in self.__directories:
+            if os.path.isfile(directory + name):
+                return directory + name
+        return None
+
+    # full path of program, None when it isn't in any directory
+    def find(self, name):
+        if self.__paths is None:
+            self.__load()
+        if name in self.__paths:
+            self.cache_hits += 1
+        else:
+            self.__paths[name] = self.__search(name)
+            self.__changed = True
+            if self.__saved:
+                self.save()
+        return self.__paths[name]
+
+    # write cache when some program was searched, it's replaced at once, so other Battmon never reads half of it
+    def save(self):
+        self.__saved = True
+        if not self.__changed or not self.__cache_path:
+            return
+        temporary_path = '%s.%d' % (self.__cache_path, os.getpid())
+        try:
+            directory = os.path.dirname(self.__cache_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(temporary_path, 'w') as cache_file:
+                json.dump({'version': CACHE_VERSION, 'directories': self.__mtimes, 'programs': self.__paths},
+                          cache_file, sort_keys=True)
+            os.rename(temporary_path, self.__cache_path)
+            self.__changed = False
+        except (IOError, OSError) as e:
+            print("Error: can't write program cache %s: %s" % (self.__cache_path, e))
@@ -0,0 +1,110 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import array
+import math
+
+# number of samples kept in history
+DEFAULT_RING_SIZE = 64
+# seconds after which old power samples have weight 1/e
+DEFAULT_TIME_CONSTANT = 120.0
+
+
+# fixed size history of (monotonic time, energy in uWh, power in uW) samples
+class SampleRing(object):
+    def __init__(self, size=DEFAULT_RING_SIZE):
+        self.__size = size
+        self.__times = array.array('d', [0.0] * size)
+        self.__energies = array.array('d', [0.0] * size)
+        self.__powers = array.array('d', [0.0] * size)
+        self.__next = 0
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    # add sample, overwrite oldest one when ring is full
+    def append(self, sample_time, energy, power):
+        self.__times[self.__next] = sample_time
+        self.__energies[self.__next] = energy
+        self.__powers[self.__next] = power
+        self.__next = (self.__next + 1) % self.__size
+        self.__count = min(self.__count + 1, self.__size)
+
+    # sample by age, 0 is the newest one
+    def get(self, age):
+        if age >= self.__count:
+            raise IndexError('sample ring index out of range')
+        i = (self.__next - 1 - age) % self.__size
+        return self.__times[i], self.__energies[i], self.__powers[i]
+
+    def newest(self):
+        return self.get(0)
+
+    def oldest(self):
+        return self.get(self.__count - 1)
+
+    def clear(self):
+        self.__next = 0
+        self.__count = 0
+
+
+# exponentially weighted power draw, from reported power or from energy change when power isn't reported
+class RateEstimator(object):
+    def __init__(self, size=DEFAULT_RING_SIZE, time_constant=DEFAULT_TIME_CONSTANT):
+        self.__samples = SampleRing(size)
+        self.__time_constant = time_constant
+        self.__power = None
+        self.__power_time = 0.0
+        self.__discharging = None
+
+    # power from energy difference to oldest sample in history, None when energy hasn't changed yet
+    def __power_from_energy(self, sample_time, energy):
+        if not len(self.__samples):
+            return None
+        oldest_time, oldest_energy, oldest_power = self.__samples.oldest()
+        if sample_time <= oldest_time or energy == oldest_energy:
+            return None
+        return abs(oldest_energy - energy) * 3600.0 / (sample_time - oldest_time)
+
+    # add new sample, history starts again when battery switches between charging and discharging
+    def add(self, sample_time, energy, power, discharging):
+        if discharging != self.__discharging:
+            self.__samples.clear()
+            self.__power = None
+            self.__discharging = discharging
+
+        if power <= 0:
+            power = self.__power_from_energy(sample_time, energy)
+        self.__samples.append(sample_time, energy, power or 0)
+        if power is None:
+            return
+
+        if self.__power is None:
+            self.__power = float(power)
+        else:
+            weight = 1.0 - math.exp(-max(0.0, sample_time - self.__power_time) / self.__time_constant)
+            self.__power += weight * (power - self.__power)
+        self.__power_time = sample_time
+
+    # smoothed power in uW, None when still unknown
+    def power(self):
+        return self.__power
+
+    def reset(self):
+        self.__samples.clear()
+        self.__power = None
+        self.__discharging = None
@@ -14,61 +14,300 @@ along with this program; if not, write to the Free Software
 Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 """
 
+import errno
 import glob
+import os
 import sys
+import threading
+import time
+
+# local imports
+from values import internal_config, rate_estimator, sysfs_reader
+
+# monotonic clock if available, time.time() for older pythons
+monotonic = getattr(time, 'monotonic', time.time)
+
+# attributes read from ac-adapter on every snapshot, battery attributes are chosen by ReadPlan
+AC_ATTRIBUTES = ('online',)
+# battery values, which couldn't be read at startup, are read again this many times after delay in seconds
+UNKNOWN_VALUES_RETRIES = 3
+UNKNOWN_VALUES_RETRY_DELAY = 0.1
+
+
+# convert remaining time
+def convert_time(battery_time):
+    if battery_time <= 0:
+        return 'Unknown'
+
+    minutes = battery_time // 60
+    hours = minutes // 60
+    minutes %= 60
+
+    if hours == 0 and minutes == 0:
+        return 'Less then minute'
+    elif hours == 0 and minutes > 1:
+        return '%smin' % minutes
+    elif hours >= 1 and minutes == 0:
+        return '%sh' % hours
+    elif hours >= 1 and minutes > 1:
+        return '%sh %smin' % (hours, minutes)
+
+
+# remaining time in seconds to empty when discharging or to full otherwise, -1 when unknown
+def remaining_time(energy_now, energy_full, power_now, discharging):
+    if power_now <= 0:
+        return -1
+    if discharging:
+        return (energy_now * 60 * 60) // power_now
+    else:
+        return ((energy_full - energy_now) * 60 * 60) // power_now
+
+
+# status of all batteries together, one discharging battery is enough to discharge
+def combined_status(statuses):
+    for status in ('Discharging', 'Charging'):
+        if status in statuses:
+            return status
+    if statuses and statuses.count('Full') == len(statuses):
+        return 'Full'
+    return statuses[0] if statuses else ''
+
+
+# battery and ac values read at once, so all checks made on it agree with each other
+class BatterySnapshot(object):
+    __slots__ = ('battery_present', 'ac_online', 'status', 'capacity', 'energy_now', 'energy_full', 'power_now',
+                 'time_left', 'name', 'batteries', 'average_power', 'energy_full_design', 'cycle_count')
+
+    def __init__(self, battery_present=False, ac_online=False, status='', capacity=0, energy_now=0, energy_full=0,
+                 power_now=0, time_left=-1, name='', batteries=(), energy_full_design=0, cycle_count=0):
+        self.battery_present = battery_present
+        self.ac_online = ac_online
+        self.status = status
+        self.capacity = capacity
+        self.energy_now = energy_now
+        self.energy_full = energy_full
+        self.power_now = power_now
+        # remaining time in seconds, -1 when unknown
+        self.time_left = time_left
+        # device name e.g. 'BAT0', empty for all batteries together
+        self.name = name
+        # snapshots of every present battery, when this one is for all batteries together
+        self.batteries = batteries
+        # power smoothed over recent snapshots, 0 when unknown
+        self.average_power = 0
+        # battery wear, 0 when unknown
+        self.energy_full_design = energy_full_design
+        self.cycle_count = cycle_count
+
+    # sum up all batteries, capacity is weighted by energy of every battery
+    @classmethod
+    def combine(cls, batteries, ac_online):
+        batteries = tuple(b for b in batteries if b.battery_present)
+        if not batteries:
+            return cls(False, ac_online)
+
+        status = combined_status([b.status for b in batteries])
+        energy_now = sum(b.energy_now for b in batteries)
+        energy_full = sum(b.energy_full for b in batteries)
+        power_now = sum(b.power_now for b in batteries)
+        capacity = int(energy_now * 100.0 / energy_full) if energy_full > 0 else 0
+        discharging = not ac_online and status.find("Discharging") != -1
+        return cls(True, ac_online, status, capacity, energy_now, energy_full, power_now,
+                   remaining_time(energy_now, energy_full, power_now, discharging), batteries=batteries,
+                   energy_full_design=sum(b.energy_full_design for b in batteries),
+                   cycle_count=max(b.cycle_count for b in batteries))
+
+    # check if battery discharging
+    @property
+    def discharging(self):
+        return self.battery_present and not self.ac_online and self.status.find("Discharging") != -1
+
+    # check if battery is fully charged
+    @property
+    def fully_charged(self):
+        return self.battery_present and self.capacity >= 99
+
+    # remaining time as readable string
+    def battery_time(self):
+        if self.battery_present:
+            return convert_time(self.time_left)
+        else:
+            return -1
+
+
+# integer value of sysfs attribute, 0 when it's empty
+def to_int(value):
+    return int(value) if value else 0
+
+
+# attributes read from battery on every snapshot and their unit conversions, chosen once when battery is found
+class ReadPlan(object):
+    __slots__ = ('attributes', 'required', 'energy_unit', 'power_unit', 'has_present', 'voltage', 'last_voltage',
+                 'energy_full_design', 'cycle_count')
+
+    def __init__(self, available, design_voltage=0, full_design=0, cycle_count=0):
+        # batteries without 'present' attribute are always present
+        self.has_present = 'present' in available
+        attributes = [name for name in ('present', 'status') if name in available]
+
+        # energy in uWh, charge in uAh, or only capacity in percent
+        if 'energy_now' in available and 'energy_full' in available:
+            self.energy_unit = 'energy'
+            attributes += ['energy_now', 'energy_full']
+        elif 'charge_now' in available and 'charge_full' in available:
+            self.energy_unit = 'charge'
+            attributes += ['charge_now', 'charge_full']
+        else:
+            self.energy_unit = 'capacity'
+            attributes.append('capacity')
+
+        # charge is converted to energy with design voltage, with current voltage when design one is unknown.
+        # Without any voltage charge and current stay in uAh and uA, capacity and time left don't need it.
+        self.voltage = design_voltage
+        has_voltage = bool(design_voltage) or 'voltage_now' in available
+
+        # power in uW or current in uA, without energy values time left stays unknown anyway
+        if self.energy_unit == 'capacity':
+            self.power_unit = ''
+        elif 'power_now' in available and (self.energy_unit == 'energy' or has_voltage):
+            self.power_unit = 'power'
+            attributes.append('power_now')
+        elif 'current_now' in available and (self.energy_unit == 'charge' or has_voltage):
+            self.power_unit = 'current'
+            attributes.append('current_now')
+        else:
+            self.power_unit = ''
+
+        if 'voltage_now' in available and (self.power_unit == 'current' or
+                                           (self.energy_unit == 'charge' and not design_voltage)):
+            attributes.append('voltage_now')
+
+        self.attributes = tuple(attributes)
+        # without these values sample is unknown, rate values are often unreadable while rate is unknown, then
+        # rate is worked out from energy change
+        self.required = tuple(name for name in attributes
+                              if name in ('present', 'status', 'energy_now', 'charge_now', 'capacity'))
+        # last read voltage, charge is converted with it while current voltage can't be read
+        self.last_voltage = 0
+
+        # wear values change slowly, so they are read only when battery is found
+        if self.energy_unit == 'charge':
+            self.energy_full_design = full_design * design_voltage // 1000000
+        elif self.energy_unit == 'energy':
+            self.energy_full_design = full_design
+        else:
+            self.energy_full_design = 0
+        self.cycle_count = cycle_count
+
+    # build plan for battery in given device directory
+    @classmethod
+    def for_device(cls, reader, path):
+        available = reader.attributes(path)
+        names = [name for name in ('voltage_min_design', 'energy_full_design', 'charge_full_design', 'cycle_count')
+                 if name in available]
+        values = reader.read_device(path, names) if names else {}
+        return cls(available, to_int(values.get('voltage_min_design')),
+                   to_int(values.get('energy_full_design') or values.get('charge_full_design')),
+                   to_int(values.get('cycle_count')))
+
+    # create snapshot of one battery from values read by this plan, None when some required value couldn't be
+    # read, e.g. driver was busy, such value is unknown, not 0. Unreadable power, current or voltage is 0.
+    def snapshot(self, name, values, ac_online):
+        if self.has_present and values.get('present') and values['present'].find("1") == -1:
+            return BatterySnapshot(False, ac_online, name=name)
+        if not all(values.get(attribute) for attribute in self.required):
+            return None
+        voltage_now = to_int(values.get('voltage_now'))
+        if voltage_now:
+            self.last_voltage = voltage_now
+
+        status = values.get('status', '')
+        if self.energy_unit == 'capacity':
+            # without energy values capacity is used as energy
+            energy_now = to_int(values['capacity'])
+            energy_full = 100
+        else:
+            energy_now = to_int(values[self.energy_unit + '_now'])
+            energy_full = to_int(values[self.energy_unit + '_full'])
+        if energy_full <= 0:
+            return None
+        capacity = int(energy_now * 100.0 / energy_full)
+
+        # some drivers report negative power and current when discharging
+        if self.power_unit == 'power':
+            power_now = abs(to_int(values['power_now']))
+        elif self.power_unit == 'current':
+            power_now = abs(to_int(values['current_now']))
+            voltage = voltage_now or self.voltage
+            if voltage:
+                power_now = power_now * voltage // 1000000
+        else:
+            power_now = 0
+
+        if self.energy_unit == 'charge':
+            voltage = self.voltage or voltage_now or self.last_voltage
+            if voltage:
+                energy_now = energy_now * voltage // 1000000
+                energy_full = energy_full * voltage // 1000000
+
+        discharging = not ac_online and status.find("Discharging") != -1
+        return BatterySnapshot(True, ac_online, status, capacity, energy_now, energy_full, power_now,
+                               remaining_time(energy_now, energy_full, power_now, discharging), name,
+                               energy_full_design=self.energy_full_design, cycle_count=self.cycle_count)
 
 
 # battery values class
 class BatteryValues(object):
-    def __init__(self):
+    def __init__(self, discovery_ttl=internal_config.DEFAULT_DEVICE_DISCOVERY_TTL,
+                 reader=internal_config.DEFAULT_SYSFS_READER, power_supply_path=internal_config.POWER_SUPPLY_PATH,
+                 history=None, instrumentation=None):
+        self.__path = os.path.join(power_supply_path, '*', '')
+        # how long found devices are trusted in seconds, 0 means until invalidated
+        self.__discovery_ttl = discovery_ttl
+        self.__discovery_time = None
+        # 'attribute' keeps attribute files open, 'uevent' reads all device values from one file
+        self.__reader = sysfs_reader.READERS[reader]()
+        # counts reads and times snapshots only with --stats, None otherwise
+        self.__instrumentation = instrumentation
+        if instrumentation is not None:
+            self.__reader = instrumentation.reader(self.__reader)
+        # history of recent snapshots, time left is estimated from it
+        self.__rate_estimator = rate_estimator.RateEstimator()
+        # samples kept on disk between restarts, None disables it
+        self.__history = history
+        # last known snapshot of every battery, it's used while battery values can't be read, None before first
+        # snapshot
+        self.__last_batteries = None
+        # notification worker takes fresh snapshot too, when time left isn't known yet
+        self.__lock = threading.Lock()
         self.__find_battery_and_ac()
 
-    __path = "/sys/class/power_supply/*/"
-    __battery_path = ''
+    __battery_plans = []
     __ac_path = ''
     __is_battery_found = False
     __is_ac_found = False
 
-    # get battery, ac values status
+    # check if device powers only itself, e.g. wireless mouse
     @staticmethod
-    def __get_value(v):
+    def __is_peripheral(device_path):
         try:
-            with open(v) as value:
-                return value.read().strip()
-        except IOError as ioerr:
-            print('Error: ' + str(ioerr))
-            return ''
+            with open(device_path + 'scope') as scope:
+                return scope.read().strip() == 'Device'
+        except IOError:
+            return False
 
-    # convert remaining time
-    @staticmethod
-    def __convert_time(battery_time):
-        if battery_time <= 0:
-            return 'Unknown'
-
-        minutes = battery_time // 60
-        hours = minutes // 60
-        minutes %= 60
-
-        if hours == 0 and minutes == 0:
-            return 'Less then minute'
-        elif hours == 0 and minutes > 1:
-            return '%smin' % minutes
-        elif hours >= 1 and minutes == 0:
-            return '%sh' % hours
-        elif hours >= 1 and minutes > 1:
-            return '%sh %smin' % (hours, minutes)
-
-    # find battery and ac-adapter
+    # find batteries and ac-adapter
     def __find_battery_and_ac(self):
 
         # set values to default
-        self.__battery_path = ''
+        self.__reader.close()
+        self.__battery_plans = []
         self.__ac_path = ''
         self.__is_battery_found = False
         self.__is_ac_found = False
 
         try:
-            devices = (glob.glob(self.__path))
+            devices = sorted(glob.glob(self.__path))
         except IOError as ioe:
             print('''Error in '__find_battery_and_ac function': find devices glob''' + str(ioe))
             sys.exit()
@@ -78,8 +317,10 @@ class BatteryValues(object):
                 with open(i + '/type') as d:
                     d = d.read().split('\n')[0]
                     # set battery and ac path
-                    if d == 'Battery':
-                        self.__battery_path = i
+                    # skip batteries of peripherals like mouse or keyboard
+                    if d == 'Battery' and not self.__is_peripheral(i):
+                        name = os.path.basename(os.path.dirname(i))
+                        self.__battery_plans.append((i, name, ReadPlan.for_device(self.__reader, i)))
                         self.__is_battery_found = True
 
                     if d == 'Mains':
@@ -90,73 +331,93 @@ class BatteryValues(object):
                 print('''Error in '__find_battery_and_ac in devices' devices iteration problem: ''' + str(ioe))
                 sys.exit()
 
-    # get battery time in seconds
-    def __get_battery_times(self):
-        bat_energy_full = 0
-        bat_energy_now = 0
-        bat_power_now = 0
-
-        # get battery values
-        if self.is_battery_present():
-            bat_energy_now = int(self.__get_value(self.__battery_path + 'energy_now'))
-            bat_energy_full = int(self.__get_value(self.__battery_path + 'energy_full'))
-            bat_power_now = int(self.__get_value(self.__battery_path + 'power_now'))
-        if bat_power_now > 0:
-            if self.is_battery_discharging():
-                remaining_time = (bat_energy_now * 60 * 60) // bat_power_now
-                return remaining_time
-            else:
-                remaining_time = ((bat_energy_full - bat_energy_now) * 60 * 60) // bat_power_now
-                return remaining_time
-        else:
-            return -1
+        self.__discovery_time = monotonic()
 
-    # check if battery is present
-    def is_battery_present(self):
-        self.__find_battery_and_ac()
-        if self.__is_battery_found:
-            status = self.__get_value(self.__battery_path + 'present')
-            if status.find("1") != -1:
-                return True
-        else:
-            return False
+    # forget found devices, next query will look for batteries and ac-adapter again
+    def invalidate_devices(self):
+        self.__discovery_time = None
 
-    # check if ac is present
-    def is_ac_present(self):
-        self.__find_battery_and_ac()
-        if self.__is_ac_found:
-            status = self.__get_value(self.__ac_path + 'online')
-            if status.find("1") != -1:
-                return True
-        else:
-            return False
+    # find devices again only when cache was invalidated or discovery ttl expired
+    def __update_devices(self):
+        if self.__discovery_time is None:
+            self.__find_battery_and_ac()
+        elif self.__discovery_ttl and monotonic() - self.__discovery_time >= self.__discovery_ttl:
+            self.__find_battery_and_ac()
 
-    # return battery values
-    def battery_time(self):
-        if self.is_battery_present():
-            return self.__convert_time(self.__get_battery_times())
-        else:
-            return -1
+    # read device values, device without any value is gone
+    def __read_device(self, path, names):
+        values = self.__reader.read_device(path, names)
+        if not any(values.values()):
+            raise IOError(errno.ENODEV, 'No such device', path)
+        return values
 
-    # get current battery capacity
-    def battery_current_capacity(self):
-        if self.is_battery_present():
-            battery_now = float(self.__get_value(self.__battery_path + 'energy_now'))
-            battery_full = float(self.__get_value(self.__battery_path + 'energy_full'))
-            return int("%d" % (battery_now / battery_full * 100.0))
+    # read ac-adapter and all batteries in one pass, look for devices again when one of them is gone
+    def __read_devices(self):
+        self.__update_devices()
+        for rediscover in (True, False):
+            ac_values = dict.fromkeys(AC_ATTRIBUTES, '')
+            batteries_values = []
+            try:
+                if self.__is_ac_found:
+                    ac_values = self.__read_device(self.__ac_path, AC_ATTRIBUTES)
+                for path, name, plan in self.__battery_plans:
+                    batteries_values.append((name, plan, self.__read_device(path, plan.attributes)))
+                break
+            except IOError:
+                # device was removed, refresh cached paths and try once again
+                if rediscover:
+                    self.__find_battery_and_ac()
+        return ac_values['online'].find("1") != -1, batteries_values
 
-    # check if battery is fully charged
-    def is_battery_fully_charged(self):
-        if self.is_battery_present() and self.battery_current_capacity() >= 99:
-            return True
-        else:
-            return False
+    # names of found batteries
+    def battery_names(self):
+        self.__update_devices()
+        return [name for path, name, plan in self.__battery_plans]
 
-    # check if battery discharging
-    def is_battery_discharging(self):
-        if self.is_battery_present() and not self.is_ac_present():
-            status = self.__get_value(self.__battery_path + 'status')
-            if status.find("Discharging") != -1:
-                return True
+    # read all battery and ac values once
+    def snapshot(self):
+        with self.__lock:
+            if self.__instrumentation is None:
+                return self.__snapshot()
+            start = monotonic()
+            battery = self.__snapshot()
+            self.__instrumentation.sample(monotonic() - start)
+            return battery
+
+    # snapshots of read batteries, previous snapshot is used for battery with unknown values, None when it has
+    # no previous one
+    def __battery_snapshots(self, batteries_values, ac_online):
+        last_batteries = self.__last_batteries or {}
+        batteries = []
+        for name, plan, values in batteries_values:
+            battery = plan.snapshot(name, values, ac_online)
+            batteries.append(last_batteries.get(name) if battery is None else battery)
+        return batteries
+
+    def __snapshot(self):
+        # at startup there's no previous snapshot yet, so unknown values are read again, new battery found later
+        # is left out until its values are known
+        retries = UNKNOWN_VALUES_RETRIES if self.__last_batteries is None else 0
+        while True:
+            ac_online, batteries_values = self.__read_devices()
+            batteries = self.__battery_snapshots(batteries_values, ac_online)
+            if None not in batteries or retries == 0:
+                break
+            retries -= 1
+            time.sleep(UNKNOWN_VALUES_RETRY_DELAY)
+        batteries = [b for b in batteries if b is not None]
+        self.__last_batteries = dict((b.name, b) for b in batteries)
+        battery = BatterySnapshot.combine(batteries, ac_online)
+
+        # smoothed power gives stable time left, even when battery doesn't report power for a while
+        if battery.battery_present:
+            self.__rate_estimator.add(monotonic(), battery.energy_now, battery.power_now, battery.discharging)
+            battery.average_power = int(self.__rate_estimator.power() or 0)
+            if battery.average_power > 0:
+                battery.time_left = remaining_time(battery.energy_now, battery.energy_full, battery.average_power,
+                                                   battery.discharging)
+            if self.__history is not None:
+                self.__history.append(time.time(), battery)
         else:
-            return False
+            self.__rate_estimator.reset()
+        return battery
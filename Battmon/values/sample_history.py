@@ -0,0 +1,166 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+# Battery samples kept on disk in fixed size ring file, which is memory mapped, so appending sample is
+# only copying bytes into page cache. Kernel writes pages back by itself and they survive crash of Battmon
+# and suspend, file is synced only every flush interval and on close.
+#
+# File layout: header, then ring of records, all little endian
+#   header: magic, version, record size, capacity, index of next record, number of records
+#   record: wall time, energy_now, energy_full and energy_full_design in uWh, power_now in uW, cycle count,
+#           status, ac online
+
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import time
+
+# local imports
+from values import internal_config
+
+MAGIC = b'BATTMON\0'
+VERSION = 2
+HEADER = struct.Struct('<8sIIIQQ')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<dqqqqHBB4x')
+RECORD_FIELDS = ('time', 'energy_now', 'energy_full', 'energy_full_design', 'power_now', 'cycle_count', 'status',
+                 'ac_online')
+# offset of (next, count) pair in header
+POSITION = struct.Struct('<QQ')
+POSITION_OFFSET = HEADER.size - POSITION.size
+
+# battery status saved as its index, unknown statuses as 0
+STATUSES = ('Unknown', 'Charging', 'Discharging', 'Not charging', 'Full')
+STATUS_CODES = dict((status, code) for code, status in enumerate(STATUSES))
+
+
+# fixed size history of battery samples in memory mapped file
+class SampleHistory(object):
+    def __init__(self, path=internal_config.DEFAULT_HISTORY_PATH, capacity=internal_config.DEFAULT_HISTORY_RECORDS,
+                 flush_interval=internal_config.DEFAULT_HISTORY_FLUSH_INTERVAL):
+        self.__path = path
+        self.__capacity = capacity
+        self.__flush_interval = flush_interval
+        self.__flush_time = time.time()
+        self.__file = None
+        self.__map = None
+        self.__open()
+
+    # open and lock history file, create it or start it again when it has other layout
+    def __open(self):
+        directory = os.path.dirname(self.__path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__file = os.open(self.__path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # only one Battmon can write to history
+            fcntl.flock(self.__file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            size = HEADER_SIZE + self.__capacity * RECORD.size
+            if not self.__has_layout(size):
+                os.ftruncate(self.__file, 0)
+                os.ftruncate(self.__file, size)
+            self.__map = mmap.mmap(self.__file, size)
+            if self.__map[:len(MAGIC)] != MAGIC:
+                HEADER.pack_into(self.__map, 0, MAGIC, VERSION, RECORD.size, self.__capacity, 0, 0)
+        except (IOError, OSError):
+            os.close(self.__file)
+            raise
+
+    # check if file was written with the same version, record size and capacity
+    def __has_layout(self, size):
+        if os.fstat(self.__file).st_size != size:
+            return False
+        os.lseek(self.__file, 0, os.SEEK_SET)
+        header = os.read(self.__file, HEADER.size)
+        magic, version, record_size, capacity, next_record, count = HEADER.unpack(header)
+        return (magic == MAGIC and version == VERSION and record_size == RECORD.size and
+                capacity == self.__capacity and next_record < capacity and count <= capacity)
+
+    def __len__(self):
+        return POSITION.unpack_from(self.__map, POSITION_OFFSET)[1]
+
+    # add battery snapshot, overwrite oldest one when ring is full
+    def append(self, sample_time, battery):
+        next_record, count = POSITION.unpack_from(self.__map, POSITION_OFFSET)
+        RECORD.pack_into(self.__map, HEADER_SIZE + next_record * RECORD.size, sample_time, battery.energy_now,
+                         battery.energy_full, battery.energy_full_design, battery.power_now,
+                         min(battery.cycle_count, 0xffff), STATUS_CODES.get(battery.status, 0), battery.ac_online)
+        # record is written before position, so it's never pointing at half written record
+        POSITION.pack_into(self.__map, POSITION_OFFSET, (next_record + 1) % self.__capacity,
+                           min(count + 1, self.__capacity))
+        if sample_time - self.__flush_time >= self.__flush_interval:
+            self.flush()
+
+    # records from oldest to newest as tuples of RECORD_FIELDS
+    def records(self):
+        return iter_records(record_buffers(self.__map))
+
+    # write changed pages to disk
+    def flush(self):
+        self.__map.flush()
+        self.__flush_time = time.time()
+
+    def close(self):
+        if self.__map is not None:
+            self.flush()
+            self.__map.close()
+            self.__map = None
+            os.close(self.__file)
+
+
+# records in ring from oldest to newest as one or two buffers, ring wraps around between them
+def record_buffers(data):
+    magic, version, record_size, capacity, next_record, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError('unknown history file format')
+    if len(data) < HEADER_SIZE + capacity * record_size or next_record >= capacity or count > capacity:
+        raise ValueError('broken history file header')
+    records = memoryview(data)[HEADER_SIZE:HEADER_SIZE + capacity * record_size]
+    first = (next_record - count) % capacity
+    if first + count <= capacity:
+        return [records[first * record_size:(first + count) * record_size]]
+    return [records[first * record_size:], records[:next_record * record_size]]
+
+
+# unpack records from buffers, one by one
+def iter_records(buffers):
+    for data in buffers:
+        for offset in range(0, len(data), RECORD.size):
+            record = RECORD.unpack_from(data, offset)
+            yield record[:6] + (STATUSES[record[6]] if record[6] < len(STATUSES) else STATUSES[0], bool(record[7]))
+
+
+# map history file read only, without locking it, so it can be read while Battmon writes to it
+def load_buffers(path=internal_config.DEFAULT_HISTORY_PATH):
+    with open(path, 'rb') as history:
+        data = mmap.mmap(history.fileno(), 0, access=mmap.ACCESS_READ)
+    return record_buffers(data)
+
+
+# history in given file, None when it can't be used, e.g. other Battmon writes to it
+def open_history(path=internal_config.DEFAULT_HISTORY_PATH, capacity=internal_config.DEFAULT_HISTORY_RECORDS):
+    if not path or capacity <= 0:
+        return None
+    try:
+        return SampleHistory(path, capacity)
+    except (IOError, OSError) as e:
+        if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+            print("Error: history file %s is used by other Battmon, history disabled" % path)
+        else:
+            print("Error: can't open history file %s: %s, history disabled" % (path, e))
+        return None
@@ -0,0 +1,138 @@
+"""
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""
+
+import errno
+import os
+
+# errors which mean that device behind open file descriptor is gone
+REOPEN_ERRNOS = (errno.ENODEV, errno.ESTALE, errno.ENOENT, errno.EBADF)
+
+# sysfs attribute values are never longer than one page
+ATTRIBUTE_BUFFER_SIZE = 4096
+
+
+# keeps sysfs attribute files open and re-reads them from offset 0
+class AttributeReader(object):
+    def __init__(self, buffer_size=ATTRIBUTE_BUFFER_SIZE):
+        self.__fds = {}
+        self.__buffer = bytearray(buffer_size)
+        self.__buffers = [self.__buffer]
+
+    # read whole attribute into reused buffer, sysfs regenerates value on every read at offset 0
+    if hasattr(os, 'preadv'):
+        def __pread(self, fd):
+            return self.__buffer[:os.preadv(fd, self.__buffers, 0)]
+    elif hasattr(os, 'pread'):
+        def __pread(self, fd):
+            return os.pread(fd, len(self.__buffer), 0)
+    else:
+        def __pread(self, fd):
+            os.lseek(fd, 0, os.SEEK_SET)
+            return os.read(fd, len(self.__buffer))
+
+    # close attribute file descriptor, if it was opened
+    def __close(self, path):
+        fd = self.__fds.pop(path, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    # get attribute value, reopen attribute file once when device has disappeared
+    def read(self, path):
+        for retry in (True, False):
+            try:
+                fd = self.__fds.get(path)
+                if fd is None:
+                    fd = os.open(path, os.O_RDONLY)
+                    self.__fds[path] = fd
+                return self.__pread(fd).decode('ascii', 'replace').strip()
+            except OSError as ose:
+                self.__close(path)
+                if not retry or ose.errno not in REOPEN_ERRNOS:
+                    raise IOError(ose.errno, ose.strerror, path)
+
+    # get values of given attributes from device directory as dictionary, missing attributes are empty
+    def read_device(self, device_path, names):
+        values = {}
+        for name in names:
+            try:
+                values[name] = self.read(device_path + name)
+            except IOError:
+                values[name] = ''
+        return values
+
+    # names of attributes which device has
+    def attributes(self, device_path):
+        return set(os.listdir(device_path))
+
+    # number of currently open attribute files
+    def open_files(self):
+        return len(self.__fds)
+
+    # close all open attribute files, e.g. after devices have changed
+    def close(self):
+        for path in list(self.__fds):
+            self.__close(path)
+
+
+# reads all device properties at once from its 'uevent' file
+class UeventReader(object):
+    __prefix = 'POWER_SUPPLY_'
+
+    def __init__(self, buffer_size=ATTRIBUTE_BUFFER_SIZE):
+        self.__uevent_reader = AttributeReader(buffer_size)
+
+    # parse 'POWER_SUPPLY_ENERGY_NOW=123' lines into {'energy_now': '123'}
+    def __parse(self, uevent):
+        values = {}
+        prefix_length = len(self.__prefix)
+        for line in uevent.splitlines():
+            key, sep, value = line.partition('=')
+            if sep and key.startswith(self.__prefix):
+                values[key[prefix_length:].lower()] = value
+        return values
+
+    # get values of given attributes from device directory as dictionary, missing attributes are empty
+    def read_device(self, device_path, names):
+        properties = self.__parse(self.__uevent_reader.read(device_path + 'uevent'))
+        values = {}
+        for name in names:
+            values[name] = properties.get(name, '')
+        return values
+
+    # get single attribute value, given as path to attribute file
+    def read(self, path):
+        device_path, name = os.path.split(path)
+        return self.read_device(device_path + '/', (name,))[name]
+
+    # names of properties which device has
+    def attributes(self, device_path):
+        return set(self.__parse(self.__uevent_reader.read(device_path + 'uevent')))
+
+    # number of currently open uevent files
+    def open_files(self):
+        return self.__uevent_reader.open_files()
+
+    # close all open uevent files
+    def close(self):
+        self.__uevent_reader.close()
+
+
+# available readers, selectable with --sysfs-reader
+READERS = {'attribute': AttributeReader,
+           'uevent': UeventReader}